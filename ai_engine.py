@@ -2,11 +2,13 @@
 import base64
 import json
 import io
+import os
 import typing_extensions as typing
 from PIL import Image
 import google.generativeai as genai
 from openai import OpenAI
 from utils import extract_json
+from tracing import span
 
 # --- DEFINISI SCHEMA OUTPUT ---
 # Ini digunakan untuk model yang support (Gemini 1.5/2.0)
@@ -18,11 +20,23 @@ class StockMetadata(typing.TypedDict):
     safety_check: str
     quality_score: float
 
-def run_gemini_engine(model_name, api_key, image_input, prompt):
+def _record_usage(usage, tokens_in, tokens_out, bytes_uploaded):
+    """Isi dict `usage` milik pemanggil (opsional) dengan token & byte yang dikirim."""
+    if usage is None: return
+    usage["tokens_in"] = int(tokens_in or 0)
+    usage["tokens_out"] = int(tokens_out or 0)
+    usage["bytes_uploaded"] = int(bytes_uploaded or 0)
+
+def _gemini_usage(response, usage, bytes_uploaded):
+    meta = getattr(response, "usage_metadata", None)
+    _record_usage(usage, getattr(meta, "prompt_token_count", 0), getattr(meta, "candidates_token_count", 0), bytes_uploaded)
+
+def run_gemini_engine(model_name, api_key, image_input, prompt, usage=None):
     """
     Menjalankan Gemini/Gemma engine.
     Memiliki fitur FALLBACK: Jika JSON Mode gagal (error 400),
     otomatis beralih ke mode teks biasa + parsing manual.
+    usage (opsional): dict yang diisi tokens_in, tokens_out, bytes_uploaded.
     """
     genai.configure(api_key=api_key)
     
@@ -37,6 +51,7 @@ def run_gemini_engine(model_name, api_key, image_input, prompt):
             raise ValueError("Format gambar tidak dikenali.")
     except Exception as e:
         raise ValueError(f"Gagal membuka gambar: {str(e)}")
+    bytes_uploaded = len(image_input) if isinstance(image_input, bytes) else os.path.getsize(image_input)
 
     # 2. STRATEGI UTAMA: Strict JSON Mode (Khusus Gemini)
     try:
@@ -45,7 +60,9 @@ def run_gemini_engine(model_name, api_key, image_input, prompt):
             response_schema=StockMetadata
         )
         model = genai.GenerativeModel(model_name, generation_config=generation_config)
-        response = model.generate_content([prompt, img_object])
+        with span("api_request", cat="api", model=model_name, mode="json"):
+            response = model.generate_content([prompt, img_object])
+        _gemini_usage(response, usage, bytes_uploaded)
         return json.loads(response.text)
 
     except Exception as e:
@@ -62,7 +79,9 @@ def run_gemini_engine(model_name, api_key, image_input, prompt):
                 # Tambahkan penekanan ekstra di prompt
                 fallback_prompt = prompt + "\n\nIMPORTANT: You must return ONLY raw JSON text. Do not wrap in markdown blocks."
                 
-                response = model_plain.generate_content([fallback_prompt, img_object])
+                with span("api_request", cat="api", model=model_name, mode="fallback"):
+                    response = model_plain.generate_content([fallback_prompt, img_object])
+                _gemini_usage(response, usage, bytes_uploaded * 2)  # gambar terkirim dua kali
                 
                 # Parsing manual menggunakan regex (mengandalkan utils.py)
                 return extract_json(response.text)
@@ -74,9 +93,10 @@ def run_gemini_engine(model_name, api_key, image_input, prompt):
         # Jika error bukan karena JSON mode (misal API Key salah / Quota habis), lempar errornya
         raise e
 
-def run_openai_compatible_engine(model_name, api_key, base_url, image_input, prompt):
+def run_openai_compatible_engine(model_name, api_key, base_url, image_input, prompt, usage=None):
     """
     Engine untuk OpenAI, Groq, OpenRouter, dll.
+    usage (opsional): dict yang diisi tokens_in, tokens_out, bytes_uploaded.
     """
     base64_image = ""
     try:
@@ -90,23 +110,59 @@ def run_openai_compatible_engine(model_name, api_key, base_url, image_input, pro
 
         client = OpenAI(api_key=api_key, base_url=base_url)
         
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url", 
-                            "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}
-                        },
-                    ],
-                }
-            ],
-            max_tokens=1000,
-        )
+        with span("api_request", cat="api", model=model_name):
+            response = client.chat.completions.create(
+                model=model_name,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": prompt},
+                            {
+                                "type": "image_url", 
+                                "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}
+                            },
+                        ],
+                    }
+                ],
+                max_tokens=1000,
+            )
+        u = getattr(response, "usage", None)
+        _record_usage(usage, getattr(u, "prompt_tokens", 0), getattr(u, "completion_tokens", 0), len(base64_image))
         return extract_json(response.choices[0].message.content)
 
     except Exception as e:
-        raise e
\ No newline at end of file
+        raise e
+
+def run_text_engine(provider, model_name, api_key, base_url, prompt, usage=None):
+    """
+    Panggilan teks saja (tanpa gambar) untuk koreksi metadata yang sudah ada.
+    Return dict hasil parsing JSON. usage (opsional): diisi tokens_in, tokens_out, bytes_uploaded.
+    """
+    if provider == "Google Gemini (Native)":
+        genai.configure(api_key=api_key)
+        try:
+            model = genai.GenerativeModel(model_name, generation_config=genai.GenerationConfig(response_mime_type="application/json"))
+            with span("api_request", cat="api", model=model_name, mode="text"):
+                response = model.generate_content(prompt)
+            _gemini_usage(response, usage, len(prompt.encode("utf-8")))
+            return json.loads(response.text)
+        except Exception as e:
+            err_msg = str(e)
+            if "400" in err_msg or "JSON mode" in err_msg or "not enabled" in err_msg:
+                with span("api_request", cat="api", model=model_name, mode="text_fallback"):
+                    response = genai.GenerativeModel(model_name).generate_content(prompt + "\n\nIMPORTANT: You must return ONLY raw JSON text. Do not wrap in markdown blocks.")
+                _gemini_usage(response, usage, len(prompt.encode("utf-8")))
+                return extract_json(response.text)
+            raise e
+
+    client = OpenAI(api_key=api_key, base_url=base_url)
+    with span("api_request", cat="api", model=model_name, mode="text"):
+        response = client.chat.completions.create(
+            model=model_name,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=4000,
+        )
+    u = getattr(response, "usage", None)
+    _record_usage(usage, getattr(u, "prompt_tokens", 0), getattr(u, "completion_tokens", 0), len(prompt.encode("utf-8")))
+    return extract_json(response.choices[0].message.content)
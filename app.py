@@ -17,6 +17,7 @@ from dotenv import load_dotenv
 
 # Import Custom Modules
 from database import init_db
+from metrics import start_server as start_metrics_server
 from app_helpers import init_session_state
 from views import (
     render_sidebar, render_gallery_page, 
@@ -26,6 +27,7 @@ from views import (
 # 1. SETUP AWAL
 load_dotenv(override=True)
 init_db()
+start_metrics_server()  # [BARU] endpoint Prometheus /metrics (sekali per proses)
 
 # 2. PAGE CONFIG
 st.set_page_config(page_title="Gemini Studio", page_icon="✨", layout="wide", initial_sidebar_state="expanded")
@@ -3,19 +3,28 @@ import streamlit as st
 import os
 import json
 import shutil
-import datetime
-import exiftool
 import math
 import platform
 import subprocess
+import re
 from dotenv import load_dotenv
 
 # Import Config & Modules
-from config import BASE_WORK_DIR, EXIFTOOL_PATH, PROMPT_PRESETS, PROVIDERS
+from config import BASE_WORK_DIR, EXIFTOOL_PATH, PROMPT_PRESETS, PROVIDERS, NATIVE_JPEG_WRITER, VIDEO_METADATA_MODES
 from utils import select_folder_from_wsl, construct_prompt_template
-from processor import process_single_file
+from processor import process_single_file, build_metadata_tags, build_success_result, determine_file_type
+from ai_engine import run_text_engine
 from image_ops import create_xmp_sidecar, compute_dhash
+import fs_cache
+from preview_store import preview_key, carry_over
 from database import update_history_entry
+from compute_backend import warmup as warmup_compute_backend, summarize_decisions
+from exiftool_pool import get_shared_pool, size_shared_pool
+from jpeg_metadata import can_write_natively, write_jpeg_metadata
+from video_metadata import resolve_mode, apply_video_metadata, EMBED as VIDEO_EMBED
+from tracing import span
+from rate_limiter import is_rate_limit_error
+import metrics
 
 # Load Env
 load_dotenv(override=True)
@@ -25,6 +34,19 @@ SETTINGS_FILE = "user_settings.json"
 # --- HARDWARE DETECTION (NEW) ---
 @st.cache_resource
 def get_hardware_status():
+    """
+    Status hardware + keputusan backend komputasi (hasil micro-benchmark CPU vs GPU).
+    Di-cache per proses, jadi benchmark hanya jalan sekali.
+    """
+    hw_text, hw_status = _detect_accelerator()
+    try:
+        warmup_compute_backend()
+        hw_text = f"{hw_text} · Compute: {summarize_decisions()}"
+    except Exception as e:
+        print(f"Compute backend benchmark error: {e}")
+    return hw_text, hw_status
+
+def _detect_accelerator():
     """Mendeteksi Hardware Akselerasi (NVIDIA/AMD/Intel/Apple Silicon)."""
     system = platform.system()
     
@@ -75,8 +97,12 @@ def init_session_state():
     """Inisialisasi semua variabel session state default."""
     defaults = {
         'menu_index': 0,
-        'gallery_page': 1,
+        'gallery_cursors': [None],
         'gallery_search': "",
+        'bulk_selection': set(),
+        'bulk_local_pending': None,
+        'ai_num_workers': 1,
+        'ai_request_delay': 2.5,
         'watching': False,
         'nav_key': 0,
         'processed_session_count': 0,
@@ -87,7 +113,8 @@ def init_session_state():
         'active_desc_rule': PROMPT_PRESETS["Commercial (Standard) - BEST SELLER"]['desc'],
         'active_global_api_key': "",
         'active_api_key_for_correction': "",
-        'active_model_for_correction': ""
+        'active_model_for_correction': "",
+        'active_provider_for_correction': "Google Gemini (Native)"
     }
 
     for key, val in defaults.items():
@@ -166,53 +193,121 @@ def get_file_hash_wrapper(fpath):
     try: return fpath, compute_dhash(fpath)
     except: return fpath, None
 
+def get_exiftool_pool(target_dir=None):
+    """Pool ExifTool stay-open milik aplikasi; ukurannya disesuaikan dengan disk tujuan (sekali per batch)."""
+    return size_shared_pool(target_dir)
+
 def flush_metadata_queue(queue_list):
-    if not queue_list: return
-    et_path = EXIFTOOL_PATH 
-    if not et_path and os.name != 'nt': et_path = "exiftool"
-    try:
-        with exiftool.ExifToolHelper(executable=et_path) as et:
-            for item in queue_list:
-                src_file = item.pop('SourceFile') 
-                try: et.set_tags(src_file, tags=item, params=["-overwrite_original", "-codedcharacterset=utf8", "-sep", ", "])
-                except Exception as e: print(f"Meta error {src_file}: {e}")
-    except Exception as e: print(f"Exiftool error: {e}")
-
-def prepare_csv_rows(res):
-    today = datetime.date.today().strftime("%Y-%m-%d")
-    now = datetime.datetime.now().strftime("%H:%M:%S")
-    is_ill = "Yes" if res.get('file_type') == "Vector" else "No"
-    
-    rm = {"Filename": res['new_name'], "Original": res['file'], "Title": res['meta_title'], "Description": res['meta_desc'], "Keywords": res['meta_kw'], "Category": res['category'], "Type": res.get('file_type'), "Date": today, "Time": now, "Releases": "", "Country": "", "Editorial": "No", "Mature Content": "No", "Illustration": is_ill}
-    ra = {"Filename": res['new_name'], "Title": res['meta_title'], "Keywords": res['meta_kw'], "Category": res['category'], "Releases": ""}
-    rg = {"file name": res['new_name'], "created date": today, "description": res['meta_desc'], "country": "", "brief code": "", "title": res['meta_title'], "keywords": res['meta_kw']}
-    rs = {"Filename": res['new_name'], "Description": res['meta_desc'], "Keywords": res['meta_kw'], "Categories": res['category'], "Editorial": "No", "Mature content": "No", "illustration": is_ill}
-    return rm, ra, rg, rs
+    """
+    Tulis metadata untuk banyak file sekaligus. JPEG biasa ditulis in-process (jpeg_metadata),
+    sisanya (atau JPEG yang ditolak fast path) lewat pool ExifTool (satu argfile per batch).
+    Item boleh berisi 'TargetFile': metadata ditulis ke file baru itu (sumber tidak diubah).
+    Return list hasil per file: {"path", "ok", "msg"} dengan urutan sama seperti input.
+    """
+    if not queue_list: return []
+    results = [None] * len(queue_list)
+    fallback = []
+    for idx, item in enumerate(queue_list):
+        src_file = item.pop('SourceFile')
+        target = item.pop('TargetFile', None)
+        if NATIVE_JPEG_WRITER and can_write_natively(src_file, item):
+            with span("metadata_native", cat="metadata", file=os.path.basename(src_file)):
+                ok, info = write_jpeg_metadata(src_file, item, dst_path=target)
+            if ok:
+                results[idx] = {"path": src_file, "target": target, "ok": True, "msg": "native"}
+                continue
+        fallback.append((idx, {"path": src_file, "tags": item, "target": target}))
+
+    if fallback:
+        items = [it for _, it in fallback]
+        try:
+            with span("exiftool_batch", cat="metadata", files=len(items)):
+                et_results = get_shared_pool().write_batch(items)
+        except Exception as e:
+            print(f"Exiftool error: {e}")
+            et_results = [{"path": it["path"], "target": it["target"], "ok": False, "msg": str(e)} for it in items]
+        for (idx, _), r in zip(fallback, et_results): results[idx] = r
+
+    for r in results:
+        if not r["ok"]: print(f"Meta error {r['path']}: {r['msg']}")
+    return results
 
-def regenerate_metadata_and_rename(file_path, correction_prompt, api_key, model_name, active_rules):
+def get_video_modes():
+    """Mode metadata video efektif: default config + pilihan di sidebar (user_settings.json)."""
+    return {**VIDEO_METADATA_MODES, **load_settings().get("video_modes", {})}
+
+def write_metadata_in_place(updates, video_modes=None):
+    """
+    Tulis metadata ke file yang sudah ada. Foto/vektor lewat flush_metadata_queue (native JPEG / pool ExifTool);
+    video mengikuti mode per tipe (sidecar / box XMP in-place), hanya mode "embed" yang di-rewrite ExifTool.
+    updates: list dict {path, title, desc, keywords (list)}. Return list {"path", "ok", "msg"} (urutan sama).
+    """
+    modes = video_modes if video_modes is not None else get_video_modes()
+    kinds = [resolve_mode(u['path'], modes) if determine_file_type(u['path']) == "Video" else VIDEO_EMBED for u in updates]
+    results = [None] * len(updates)
+    embed_idx = [i for i, k in enumerate(kinds) if k == VIDEO_EMBED]
+    queue_items = [{'SourceFile': updates[i]['path'], **build_metadata_tags(updates[i]['title'], updates[i]['desc'], updates[i]['keywords'])} for i in embed_idx]
+    for i, r in zip(embed_idx, flush_metadata_queue(queue_items)): results[i] = r
+    for i, kind in enumerate(kinds):
+        if kind == VIDEO_EMBED: continue
+        u = updates[i]
+        with span("video_metadata", cat="metadata", file=os.path.basename(u['path'])):
+            used_mode, _ = apply_video_metadata(u['path'], u['title'], u['desc'], u['keywords'], kind)
+        # Mode sidecar: isi metadata ada di .xmp yang dibuat pemanggil
+        results[i] = {"path": u['path'], "target": None, "ok": True, "msg": used_mode}
+    return results
+
+def apply_metadata_updates(updates, video_modes=None):
+    """
+    Tulis ulang metadata (in-place) + sidecar XMP untuk banyak file sekaligus, tanpa AI.
+    updates: list dict {path, title, desc, keywords (list)}. Return list {"path", "ok", "msg"} (urutan sama).
+    """
+    pkeys = [preview_key(u['path']) for u in updates]  # rewrite mengubah hash file -> preview perlu di-alias
+    results = write_metadata_in_place(updates, video_modes=video_modes)
+    for u, r, pk in zip(updates, results, pkeys):
+        fs_cache.invalidate(u['path'])
+        if r['ok']:
+            create_xmp_sidecar(os.path.splitext(u['path'])[0], u['title'], u['desc'], u['keywords'])
+            carry_over(pk, u['path'])
+    return results
+
+def regenerate_metadata_and_rename(file_path, correction_prompt, api_key, model_name, active_rules, temp_dir=None, limiter=None, provider="Google Gemini (Native)"):
+    """temp_dir wajib diisi jika dipanggil dari worker thread (session_state tidak tersedia di sana).
+    limiter: limiter bersama (bulk regenerate) agar retry ikut antre & backoff."""
     try:
         source_dir = os.path.dirname(file_path)
         filename = os.path.basename(file_path)
         
         # Setup Processor
-        provider = "Google Gemini (Native)"
+        base_url = PROVIDERS.get(provider, {}).get("base_url")
         base_prompt = construct_prompt_template(active_rules['title'], active_rules['desc'])
         opts = {"rename": True, "blur_check": False} 
 
         # AI Process
         res = process_single_file(
-            filename=filename, provider=provider, model=model_name, api_key=api_key, base_url=None, max_retries=1,
+            filename=filename, provider=provider, model=model_name, api_key=api_key, base_url=base_url, max_retries=1,
             options=opts, full_prompt=base_prompt, source_dir=source_dir,
-            custom_temp_dir=st.session_state.get('temp_folder_path', BASE_WORK_DIR), blur_threshold=0.0,
-            user_correction=correction_prompt 
+            custom_temp_dir=temp_dir or st.session_state.get('temp_folder_path', BASE_WORK_DIR), blur_threshold=0.0,
+            user_correction=correction_prompt, limiter=limiter
         )
 
         if res['status'] == 'error': return False, f"AI Error: {res['msg']}", None
+        return _apply_regenerated_result(file_path, res)
         
-        # Write Metadata
-        et_path = EXIFTOOL_PATH if EXIFTOOL_PATH else ("exiftool" if os.name!='nt' else None)
-        with exiftool.ExifToolHelper(executable=et_path) as et:
-            et.set_tags(file_path, tags=res['tags_data'], params=["-overwrite_original", "-codedcharacterset=utf8", "-sep", ", "])
+    except Exception as e: return False, str(e), None
+
+def _apply_regenerated_result(file_path, res):
+    """Tulis metadata hasil regenerate, rename file, sidecar, update DB. Return (ok, info|pesan, path_baru)."""
+    try:
+        source_dir = os.path.dirname(file_path)
+        filename = os.path.basename(file_path)
+        pkey = res.get('preview_key') or preview_key(file_path)
+
+        # Write Metadata (pool stay-open, tanpa startup Perl baru)
+        kw_list = res['tags_data'].get('XMP:Subject', [])
+        meta_res = write_metadata_in_place([{"path": file_path, "title": res['meta_title'], "desc": res['meta_desc'], "keywords": kw_list}])[0]
+        if not meta_res['ok']: return False, f"Metadata Error: {meta_res['msg']}", None
+        fs_cache.invalidate(file_path)
 
         # Rename File
         new_filename = res['new_name']
@@ -220,18 +315,84 @@ def regenerate_metadata_and_rename(file_path, correction_prompt, api_key, model_
         if filename != new_filename:
             try:
                 shutil.move(file_path, new_file_path)
+                fs_cache.invalidate(file_path, new_file_path)
                 old_xmp = os.path.splitext(file_path)[0] + ".xmp"
                 if os.path.exists(old_xmp): os.remove(old_xmp)
             except Exception as e:
                 print(f"Rename failed: {e}"); new_file_path = file_path
+        carry_over(pkey, new_file_path)
 
         # Create Sidecar
-        kw_list = res['tags_data'].get('XMP:Subject', [])
         create_xmp_sidecar(os.path.splitext(new_file_path)[0], res['meta_title'], res['meta_desc'], kw_list)
         
         # Update DB
-        update_history_entry(old_filename_in_db=filename, new_filename=new_filename, title=res['meta_title'], desc=res['meta_desc'], keywords=res['meta_kw'])
+        update_history_entry(old_filename_in_db=filename, new_filename=new_filename, title=res['meta_title'], desc=res['meta_desc'], keywords=res['meta_kw'], keyword_list=kw_list)
         
         return True, {"title": res['meta_title'], "desc": res['meta_desc'], "kw": kw_list}, new_file_path
         
-    except Exception as e: return False, str(e), None
\ No newline at end of file
+    except Exception as e: return False, str(e), None
+
+# --- TEXT-ONLY REGENERATION ---
+# Koreksi yang murni tekstual (terjemah, perpendek, ubah gaya) cukup mengirim metadata
+# yang tersimpan di history, tanpa gambar. Beberapa asset digabung dalam satu request.
+
+VISUAL_HINTS = (
+    "image", "photo", "picture", "visual", "look", "see", "color", "colour", "background", "object",
+    "subject", "wrong", "incorrect", "actually", "describe", "detail", "accurate",
+    "gambar", "foto", "warna", "latar", "objek", "lihat", "salah", "sebenarnya", "akurat",
+)
+
+def needs_visual_context(instruction):
+    """Heuristik: instruksi yang menyinggung isi visual/ketepatan konten -> perlu gambar; sisanya text-only."""
+    words = set(re.findall(r"[a-z]+", (instruction or "").lower()))
+    return any(h in words for h in VISUAL_HINTS)
+
+def build_text_correction_prompt(rows, instruction, active_rules):
+    items = [{"id": r['id'], "title": r['title'] or "", "description": r['description'] or "",
+              "keywords": [k.strip() for k in (r['keywords'] or "").split(",") if k.strip()]} for r in rows]
+    return f"""
+    Role: Stock Metadata Editor. You are editing EXISTING metadata; there is no image.
+    Title rule: {active_rules.get('title', '')}
+    Description rule: {active_rules.get('desc', '')}
+    
+    [INSTRUCTION FROM USER]:
+    "{instruction}"
+    
+    Apply the instruction to EVERY item below. Keep facts unchanged unless the instruction says otherwise.
+    Keep each item's meaning unique; do not merge items.
+    
+    ITEMS (JSON):
+    {json.dumps(items, ensure_ascii=False)}
+    
+    Return strictly JSON: {{"items": [{{"id": <same id>, "title": "...", "description": "...", "keywords": ["..."]}}]}}
+    """
+
+def regenerate_text_only(rows, correction_prompt, api_key, model_name, active_rules, provider="Google Gemini (Native)", base_url=None):
+    """
+    Satu request teks untuk sekumpulan baris history (maks TEXT_REGEN_BATCH_SIZE per panggilan oleh pemanggil).
+    Return list (row, ok, info|pesan, path_baru) dengan urutan sama seperti rows.
+    """
+    try:
+        usage = {}
+        # Dicatat seperti panggilan gambar di processor: span trace + counter Prometheus per request
+        with span("ai_call", model=model_name, files=len(rows), mode="text"), metrics.inflight("ai_inflight"):
+            response = run_text_engine(provider, model_name, api_key, base_url, build_text_correction_prompt(rows, correction_prompt, active_rules), usage=usage)
+        metrics.record_request(model_name, ok=bool(response))
+    except Exception as e:
+        metrics.record_request(model_name, ok=False, rate_limited=is_rate_limit_error(e))
+        return [(r, False, f"AI Error: {e}", None) for r in rows]
+    by_id = {}
+    for item in (response.get("items") if isinstance(response, dict) else None) or []:
+        try: by_id[int(item.get("id"))] = item
+        except (TypeError, ValueError): continue
+
+    out = []
+    for r in rows:
+        item = by_id.get(r['id'])
+        file_path = os.path.join(r['output_path'], r['new_filename'])
+        if not item:
+            out.append((r, False, "Missing in AI response", None)); continue
+        item.setdefault("category", r['category'])
+        res = build_success_result(item, r['new_filename'], file_path, None, rename=True)
+        out.append((r,) + _apply_regenerated_result(file_path, res))
+    return out
\ No newline at end of file
@@ -0,0 +1,266 @@
+# batch_runner.py
+"""
+Pipeline batch Metadata Auto (dan regenerate Bulk Actions gallery) yang dijalankan sebagai
+job latar belakang (job_manager).
+
+Tidak ada pemanggilan Streamlit di sini: semua parameter (folder, prompt, settings) diambil
+dari session_state oleh UI sebelum job dimulai, dan progres/log dilaporkan lewat objek job.
+"""
+import os
+import time
+import shutil
+import datetime
+from collections import Counter
+
+from config import METADATA_BATCH_SIZE, PROVIDERS, TEXT_REGEN_BATCH_SIZE
+from database import add_history_entry, add_history_entries, add_file_telemetry, flush_writes, pending_writes, get_history_rows
+from processor import process_single_file
+from image_ops import create_xmp_sidecar
+from rate_limiter import run_concurrent, get_limiter, rate_from_settings, is_rate_limit_error
+from finalize import plan_finalize, place_output, relocate_original, unique_output_name, describe as describe_finalize
+from thumbnails import ensure_thumbnail
+from preview_store import carry_over
+import fs_cache
+from video_metadata import resolve_mode, apply_video_metadata, EMBED as VIDEO_EMBED, INPLACE as VIDEO_INPLACE
+from app_helpers import flush_metadata_queue, get_exiftool_pool, regenerate_metadata_and_rename, regenerate_text_only, needs_visual_context
+from report_writer import ReportWriter, record_from_result
+from metadata_import import split_complete, history_entry
+import tracing
+from tracing import span
+import metrics
+
+def run_metadata_batch(job):
+    """
+    job.params: files, in_dir, out_dir, temp_dir, prompt, opts, settings (dict sidebar).
+    Hasil akhir (ringkasan, path report, statistik pool) disimpan di job.result.
+    """
+    p = job.params
+    settings, opts, prompt = p['settings'], p['opts'], p['prompt']
+    IN_DIR, OUT_DIR, TEMP_DIR = p['in_dir'], p['out_dir'], p['temp_dir']
+    DONE_DIR = os.path.join(IN_DIR, "done"); os.makedirs(DONE_DIR, exist_ok=True)
+    SKIP_DIR = os.path.join(IN_DIR, "skipped"); os.makedirs(SKIP_DIR, exist_ok=True)
+    # Report agency ditulis inkremental (.part) sejak hasil pertama, bukan dikumpulkan di memori
+    report = ReportWriter(os.path.join(OUT_DIR, "_Reports"), f"Batch_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{job.id}")
+
+    def _process_item(fpath):
+        # Rate limit (anti 429): limiter bersama di run_concurrent, retry & backoff per percobaan di process_single_file
+        return process_single_file(
+            os.path.basename(fpath), settings['provider'], settings['model'], settings['api_key'], None,
+            settings['retry_count'], opts, prompt, IN_DIR, custom_temp_dir=TEMP_DIR, blur_threshold=settings['blur_limit'],
+            limiter=limiter
+        )
+
+    # Metadata ditulis per batch (pool ExifTool / native JPEG) langsung ke folder tujuan.
+    # Tidak ada lagi copy ke TEMP_DIR -> rewrite -> move: sumber dibaca, output ditulis sekali.
+    pool = get_exiftool_pool(OUT_DIR)   # ukuran pool mengikuti disk tujuan, ditentukan sekali per batch
+    pending = []
+    bytes_total = [0]
+    claimed = set()   # path output yang dipesan run ini (hanya file ini yang boleh dihapus saat gagal)
+
+    def _finalize_pending():
+        """Flush metadata seluruh antrian ke tujuan, lalu pindahkan original. Return (ok, fail)."""
+        if not pending: return 0, 0
+        ok, fail = 0, 0
+        # Video dengan mode sidecar/inplace tidak masuk antrian rewrite ExifTool
+        modes = [resolve_mode(r['original_path'], settings.get('video_modes')) if r.get('file_type') == "Video" else VIDEO_EMBED for r, _ in pending]
+        embed_idx = [i for i, m in enumerate(modes) if m == VIDEO_EMBED]
+        queue_items = [{'SourceFile': pending[i][0]['original_path'], 'TargetFile': os.path.join(pending[i][1], pending[i][0]['new_name']), **pending[i][0]['tags_data']} for i in embed_idx]
+        with span("metadata_flush", cat="metadata", files=len(queue_items)):
+            meta_results = dict(zip(embed_idx, flush_metadata_queue(queue_items)))
+        for i, (res, tdir) in enumerate(pending):
+            t_fin = time.perf_counter()
+            final_path = os.path.join(tdir, res['new_name'])
+            done_path = os.path.join(DONE_DIR, res['file'])
+            try:
+                if modes[i] == VIDEO_EMBED:
+                    meta = meta_results[i]
+                    if not meta['ok']:
+                        if final_path in claimed and os.path.exists(final_path): os.remove(final_path)
+                        job.log("error", f"Metadata Error: {res['file']} - {meta['msg']}"); fail += 1
+                        add_file_telemetry(res.get('telemetry'), "error")
+                        metrics.record_file(res.get('telemetry'), "error", settings['model'])
+                        continue
+                    plan = plan_finalize(res['original_path'], final_path, done_path, rewrite=True)
+                    fin = {"output": plan["output"], "original": plan["original"], "bytes_written": os.path.getsize(final_path)}
+                else:
+                    # Hardlink hanya aman jika output tidak akan diubah in-place
+                    plan = plan_finalize(res['original_path'], final_path, done_path, rewrite=False, allow_hardlink=modes[i] != VIDEO_INPLACE)
+                    try:
+                        with span("place_output", cat="finalize", file=res['file']):
+                            out_strategy, written = place_output(res['original_path'], final_path, plan)
+                        with span("video_metadata", cat="metadata", file=res['file']):
+                            used_mode, meta_written = apply_video_metadata(final_path, res['meta_title'], res['meta_desc'], res['tags_data'].get('XMP:Subject', []), modes[i])
+                    except Exception:
+                        # Salinan/clone setengah jadi milik run ini jangan ditinggal di tujuan
+                        if final_path in claimed and os.path.exists(final_path): os.remove(final_path)
+                        raise
+                    fin = {"output": f"{out_strategy}/{used_mode}", "original": plan["original"], "bytes_written": written + meta_written}
+                with span("move_original", cat="finalize", file=res['file']):
+                    fin["bytes_written"] += relocate_original(res['original_path'], done_path, plan)
+                fs_cache.invalidate(final_path, res['original_path'], done_path)
+                bytes_total[0] += fin["bytes_written"]
+
+                kw = res['tags_data'].get('XMP:Subject', [])
+                with span("sidecar_thumbnail", cat="finalize", file=res['file']):
+                    create_xmp_sidecar(os.path.splitext(final_path)[0], res['meta_title'], res['meta_desc'], kw)
+                    ensure_thumbnail(final_path)
+                    carry_over(res.get('preview_key'), final_path)
+
+                job.log("success", f"✅ {res['new_name']} ({describe_finalize(fin)})")
+                tel = res.get('telemetry')
+                if tel:
+                    tel["finalize_ms"] = (time.perf_counter() - t_fin) * 1000
+                    tel["total_ms"] = tel.get("total_ms", 0) + tel["finalize_ms"]
+                add_history_entry(res['file'], res['new_name'], res['meta_title'], res['meta_desc'], res['meta_kw'], res['category'], tdir, keyword_list=res.get('keyword_list'), telemetry=tel, batch_id=job.id)
+                report.add(record_from_result(res, job.id))
+                metrics.record_file(tel, "success", settings['model'])
+                ok += 1
+            except Exception as e:
+                job.log("error", f"IO Error: {e}"); fail += 1
+                add_file_telemetry(res.get('telemetry'), "error")
+                metrics.record_file(res.get('telemetry'), "error", settings['model'])
+        pending.clear()
+        return ok, fail
+
+    files = p['files']
+    skipped_by = Counter()   # alasan skip -> jumlah (duplicate / embedded / blurry)
+    if opts.get('skip_existing'):
+        # [BARU] File yang sudah punya metadata lengkap tidak dikirim ke API: dicatat ke history lalu dipindah ke skipped/
+        complete, files = split_complete(files)
+        if complete:
+            entries = []
+            for path, meta in complete.items():
+                shutil.move(path, os.path.join(SKIP_DIR, os.path.basename(path)))
+                fs_cache.invalidate(path)
+                entries.append(history_entry(path, meta, output_path=SKIP_DIR))
+            add_history_entries(entries, batch_id=job.id)
+            job.count(skipped=len(entries))
+            skipped_by["embedded"] += len(entries)
+            job.log("info", f"⏭️ {len(entries):,} file sudah punya metadata lengkap → skipped/ (tidak dikirim ke API)")
+
+    limiter = get_limiter(settings['provider'], rate_from_settings(settings['num_workers'], settings.get('request_delay', 0)))
+    # Hasil error 429 sudah memicu backoff per percobaan di process_single_file; di sini cukup exception tak tertangkap
+    throttled = lambda r, e: is_rate_limit_error(e)
+    results = run_concurrent(_process_item, files, settings['num_workers'], limiter, throttled,
+                             cancel_event=job.cancel_event, pause_event=job.pause_event)
+    # Sesi trace selalu dibuka; span hanya tercatat selama tracing di-ON-kan (toggle sidebar, bisa di tengah batch)
+    trace = tracing.start_session(job.id)
+    try:
+        for fpath, res, err in results:
+            if err is not None:
+                if job.cancelled and str(err) == "cancelled": continue  # belum dimulai saat cancel -> tetap di folder input
+                res = {"status": "error", "file": os.path.basename(fpath), "msg": str(err)}
+
+            if res["status"] == "success":
+                ftype = res.get('file_type', 'Other')
+                tdir = os.path.join(OUT_DIR, ftype, res['category']) if settings['opt_folder'] else os.path.join(OUT_DIR, ftype)
+                os.makedirs(tdir, exist_ok=True)
+                # Jangan menimpa output lama (Auto Rename off / nama bertabrakan): pilih nama yang belum ada
+                name = unique_output_name(tdir, res['new_name'], claimed)
+                if name != res['new_name']:
+                    job.log("warning", f"{res['new_name']} sudah ada di {tdir} → disimpan sebagai {name}")
+                    res['new_name'] = name
+                claimed.add(os.path.join(tdir, name))
+                pending.append((res, tdir))
+                job.count(done=1)
+
+                if len(pending) >= METADATA_BATCH_SIZE:
+                    ok, fail = _finalize_pending(); job.count(ok=ok, failed=fail, done=0)
+            elif res["status"] == "skipped":
+                add_file_telemetry(res.get('telemetry'), "skipped")
+                metrics.record_file(res.get('telemetry'), "skipped", settings['model'])
+                shutil.move(os.path.join(IN_DIR, res['file']), os.path.join(SKIP_DIR, res['file']))
+                job.log("warning", f"Skipped: {res['file']} - {res.get('msg', '')}")
+                job.count(skipped=1)
+                skipped_by[res.get("reason", "other")] += 1
+            else:
+                add_file_telemetry(res.get('telemetry'), "error")
+                metrics.record_file(res.get('telemetry'), "error", settings['model'])
+                job.log("error", f"Failed: {res.get('file', '?')} - {res['msg']}")
+                job.count(failed=1)
+
+            metrics.set_queue("finalize_pending", len(pending))
+            metrics.set_queue("batch_remaining", max(0, job.total - job.done))
+            metrics.set_queue("db_writes", pending_writes())
+
+        # Hasil yang sudah selesai (termasuk request in-flight saat cancel) tetap difinalisasi
+        ok, fail = _finalize_pending(); job.count(ok=ok, failed=fail, done=0)
+        with span("db_flush", cat="db"):
+            flush_writes()  # pastikan semua insert history (group commit) sudah tersimpan
+    finally:
+        paths = report.finalize()
+        if paths:
+            job.result["reports"] = paths
+            job.log("info", f"📄 Report ({report.rows_written} baris): {os.path.dirname(next(iter(paths.values())))}")
+        metrics.set_queue("finalize_pending", 0); metrics.set_queue("batch_remaining", 0)
+        trace_path, trace_summary = tracing.finish_session(trace)
+        if trace_path:
+            job.result["trace"] = trace_path
+            job.result["trace_summary"] = trace_summary
+            job.log("info", f"🔬 Trace ({len(trace.events):,} span): {trace_path}")
+
+    job.result["bytes_written"] = bytes_total[0]
+    job.result["exiftool"] = pool.get_stats()
+    job.result["skipped_by"] = dict(skipped_by)
+    reasons = ", ".join(f"{k} {v}" for k, v in skipped_by.most_common())
+    job.message = f"OK: {job.ok} | Skipped: {job.skipped}{f' ({reasons})' if reasons else ''} | Failed: {job.failed}"
+
+def run_bulk_regenerate(job):
+    """
+    Regenerate metadata asset gallery dengan instruksi AI (Bulk Actions), lewat executor + limiter
+    provider yang sama dengan batch. job.params: ids, instruction, provider, model, rules, temp_dir,
+    num_workers, request_delay, api_key. job.result: ok_ids, failures [(nama, pesan)].
+    """
+    p = job.params
+    instr, provider, model = p['instruction'], p['provider'], p['model']
+    rows = get_history_rows(p['ids'])
+    paths = {r['id']: os.path.join(r['output_path'], r['new_filename']) for r in rows}
+    present = fs_cache.check_paths(list(paths.values()))
+    todo = [r for r in rows if present.get(paths[r['id']]) is not None]
+    failures = [(r['new_filename'], "Moved/Deleted") for r in rows if present.get(paths[r['id']]) is None]
+    for name, msg in failures: job.log("error", f"❌ {name}: {msg}")
+    job.count(failed=len(failures))
+
+    limiter = get_limiter(provider, rate_from_settings(p['num_workers'], p.get('request_delay', 0)))
+    throttled = lambda r, e: is_rate_limit_error(e) or (r is not None and not r[0] and is_rate_limit_error(r[1]))
+    if needs_visual_context(instr):
+        # Per file dengan gambar (instruksi butuh konteks visual)
+        units = [[r] for r in todo]
+        fn = lambda unit: [(unit[0],) + tuple(regenerate_metadata_and_rename(paths[unit[0]['id']], instr, p['api_key'], model, p['rules'],
+                                                                             temp_dir=p['temp_dir'], limiter=limiter, provider=provider))]
+        # 429 per percobaan sudah memicu backoff di process_single_file
+        throttled_unit = lambda r, e: is_rate_limit_error(e)
+    else:
+        # Text-only: metadata tersimpan, beberapa asset per request, tanpa token gambar
+        units = [todo[i:i + TEXT_REGEN_BATCH_SIZE] for i in range(0, len(todo), TEXT_REGEN_BATCH_SIZE)]
+        base_url = PROVIDERS.get(provider, {}).get("base_url")
+        fn = lambda unit: regenerate_text_only(unit, instr, p['api_key'], model, p['rules'], provider=provider, base_url=base_url)
+        job.log("info", f"Text-only mode: {len(todo)} files in {len(units)} requests")
+        throttled_unit = lambda r, e: is_rate_limit_error(e) or (r is not None and any(throttled(x[1:], None) for x in r))
+
+    ok_ids = []
+    trace = tracing.start_session(job.id)
+    try:
+        for unit, results, err in run_concurrent(fn, units, p['num_workers'], limiter, throttled_unit,
+                                                 cancel_event=job.cancel_event, pause_event=job.pause_event):
+            if err is not None and job.cancelled and str(err) == "cancelled": continue  # belum dimulai saat cancel
+            results = results if err is None else [(r, False, str(err), None) for r in unit]
+            ok = fail = 0
+            for row, success, info, new_path in results:
+                if success:
+                    ok_ids.append(row['id']); ok += 1
+                    job.log("success", f"✅ {row['new_filename']} → {os.path.basename(new_path or '')}")
+                else:
+                    failures.append((row['new_filename'], info)); fail += 1
+                    job.log("error", f"❌ {row['new_filename']}: {info}")
+            job.count(ok=ok, failed=fail)
+        with span("db_flush", cat="db"):
+            flush_writes()
+    finally:
+        trace_path, trace_summary = tracing.finish_session(trace)
+        if trace_path:
+            job.result["trace"] = trace_path
+            job.result["trace_summary"] = trace_summary
+    job.result["ok_ids"] = ok_ids
+    job.result["failures"] = failures
+    job.message = f"Updated: {len(ok_ids)} | Failed: {len(failures)}"
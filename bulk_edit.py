@@ -0,0 +1,169 @@
+# bulk_edit.py
+"""
+Bulk edit metadata lokal (deterministik, tanpa LLM).
+
+Edit mekanis seperti tambah/hapus/ganti keyword, template title/deskripsi, atau ganti
+kategori tidak perlu decode gambar dan panggilan API. Spec edit diterapkan ke baris DB,
+lalu metadata file ditulis lewat satu pass batch (native JPEG / pool ExifTool; video mengikuti
+mode sidecar / in-place per tipe, tanpa rewrite penuh).
+
+Spec (dict, semua opsional):
+    add_keywords: [..]          remove_keywords: [..]       replace_keywords: {lama: baru}
+    title_template: "{title} 4K"  desc_template: "{description} Shot in {category}."
+    category: "Nature"
+Placeholder template: {title} {description} {category} {filename} {keywords}
+"""
+import os
+import re
+import time
+
+from database import get_history_rows, update_history_rows, normalize_keywords
+from app_helpers import apply_metadata_updates, get_exiftool_pool
+import fs_cache
+from config import STOCK_CATEGORIES
+
+MAX_KEYWORDS = 49      # sama dengan batas clean_kw di processor
+MAX_DESC_CHARS = 200
+WRITE_CHUNK = 200      # file per flush metadata
+
+class _Blank(dict):
+    def __missing__(self, key): return "{" + key + "}"
+
+def _render(template, row, keywords):
+    values = _Blank(title=row['title'] or "", description=row['description'] or "", category=row['category'] or "",
+                    filename=os.path.splitext(row['new_filename'] or "")[0], keywords=", ".join(keywords))
+    return " ".join(template.format_map(values).split())
+
+# --- 1. SPEC ---
+
+def apply_spec_to_row(row, spec):
+    """Hitung nilai baru untuk satu baris history. Return dict update, atau None jika tidak ada perubahan."""
+    kws = normalize_keywords(row['keywords'])
+    replace = {k.lower().strip(): v for k, v in (spec.get("replace_keywords") or {}).items()}
+    if replace:
+        kws = normalize_keywords([replace.get(k, k) for k in kws])
+    remove = set(normalize_keywords(spec.get("remove_keywords")))
+    if remove:
+        kws = [k for k in kws if k not in remove]
+    for k in normalize_keywords(spec.get("add_keywords")):
+        if k not in kws: kws.append(k)
+    kws = kws[:MAX_KEYWORDS]
+
+    title = row['title'] or ""
+    desc = row['description'] or ""
+    if spec.get("title_template"): title = _render(spec["title_template"], row, kws)
+    if spec.get("desc_template"): desc = _render(spec["desc_template"], row, kws)[:MAX_DESC_CHARS]
+    category = spec.get("category") or row['category']
+
+    if (title, desc, kws, category) == (row['title'] or "", row['description'] or "", normalize_keywords(row['keywords']), row['category']):
+        return None
+    return {"id": row['id'], "title": title, "description": desc, "keywords": kws, "category": category}
+
+_QUOTED = r"['\"]([^'\"]+)['\"]"
+_PLAIN_ITEM = re.compile(r"^[\w][\w &-]*$")
+MAX_ITEM_WORDS = 3
+# Kata penghubung kalimat: tail yang memuat ini adalah instruksi untuk AI, bukan daftar keyword
+_PROSE_WORDS = {"related", "relevant", "irrelevant", "that", "which", "who", "based", "about", "matching", "match",
+                "more", "less", "any", "all", "some", "every", "better", "similar", "the", "to", "for", "from", "with",
+                "yang", "sesuai", "terkait", "tidak", "semua", "lebih"}
+
+def _items(text):
+    """
+    Ambil daftar item: 'a', 'b' (ber-quote) atau a, b (daftar koma polos, item pendek).
+    Return None jika tail berupa kalimat bebas (mis. "related to the season").
+    """
+    text = text.strip().rstrip(".")
+    quoted = re.findall(_QUOTED, text)
+    if quoted:
+        # Semua isi harus ber-quote; sisa di luar quote hanya pemisah
+        rest = re.sub(_QUOTED, "", text)
+        return quoted if not re.sub(r",|\band\b|\bdan\b|\s", "", rest) else None
+    items = [t.strip() for t in re.split(r",|\band\b|\bdan\b", text) if t.strip()]
+    if not items: return None
+    # Tanpa koma hanya satu kata yang diterima ("add keyword 4k"); frasa tanpa koma -> AI
+    if len(items) == 1 and "," not in text and len(items[0].split()) > 1: return None
+    for it in items:
+        words = it.lower().split()
+        if not _PLAIN_ITEM.match(it) or len(words) > MAX_ITEM_WORDS or _PROSE_WORDS.intersection(words): return None
+    return items
+
+def _category(text, categories):
+    """Cocokkan nama kategori (case-insensitive) ke daftar kategori yang dikenal; None jika tidak ada."""
+    name = text.strip().strip("'\"").strip()
+    known = {c.lower(): c for c in categories if c}
+    return known.get(name.lower())
+
+def parse_instruction(text, categories=None):
+    """
+    Kenali instruksi mekanis sederhana (EN/ID) -> spec. Return None jika bukan edit mekanis
+    (instruksi tersebut tetap dikirim ke AI). categories: kategori yang dikenal selain STOCK_CATEGORIES
+    (mis. kategori yang sudah ada di history); kategori di luar daftar -> AI.
+    """
+    t = (text or "").strip()
+    m = re.match(r"(?i)^(?:replace|ganti)\s+keywords?\s+" + _QUOTED + r"\s+(?:with|to|dengan|jadi|menjadi)\s+" + _QUOTED + r"\s*\.?$", t)
+    if m: return {"replace_keywords": {m.group(1): m.group(2)}}
+    m = re.match(r"(?i)^(?:add|tambah(?:kan)?)\s+keywords?\s*:?\s*(.+)$", t)
+    if m:
+        items = _items(m.group(1))
+        return {"add_keywords": items} if items else None
+    m = re.match(r"(?i)^(?:remove|delete|hapus)\s+keywords?\s*:?\s*(.+)$", t)
+    if m:
+        items = _items(m.group(1))
+        return {"remove_keywords": items} if items else None
+    m = re.match(r"(?i)^(?:append|add)\s+(?:suffix\s+)?" + _QUOTED + r"\s+to\s+(?:the\s+)?title\s*\.?$", t)
+    if m: return {"title_template": "{title} " + m.group(1).replace("{", "{{").replace("}", "}}")}
+    m = re.match(r"(?i)^(?:prepend|add\s+prefix)\s+" + _QUOTED + r"\s+to\s+(?:the\s+)?title\s*\.?$", t)
+    if m: return {"title_template": m.group(1).replace("{", "{{").replace("}", "}}") + " {title}"}
+    m = re.match(r"(?i)^(?:set|change|ubah|ganti)\s+(?:the\s+)?(?:category|kategori)\s+(?:to\s+|jadi\s+|menjadi\s+)?(.+?)\s*\.?$", t)
+    if m:
+        cat = _category(m.group(1), list(STOCK_CATEGORIES) + list(categories or []))
+        return {"category": cat} if cat else None
+    return None
+
+def describe_spec(spec):
+    """Ringkasan spec yang mudah dibaca (untuk konfirmasi sebelum diterapkan)."""
+    parts = []
+    if spec.get("add_keywords"): parts.append("add keywords: " + ", ".join(spec["add_keywords"]))
+    if spec.get("remove_keywords"): parts.append("remove keywords: " + ", ".join(spec["remove_keywords"]))
+    for old, new in (spec.get("replace_keywords") or {}).items(): parts.append(f"replace keyword: {old} → {new}")
+    if spec.get("title_template"): parts.append(f"title: {spec['title_template']}")
+    if spec.get("desc_template"): parts.append(f"description: {spec['desc_template']}")
+    if spec.get("category"): parts.append(f"category: {spec['category']}")
+    return "; ".join(parts)
+
+# --- 2. RUN ---
+
+def run_bulk_edit(history_ids, spec, progress_cb=None):
+    """
+    Terapkan spec ke semua id: tulis metadata file per chunk, lalu update DB hanya untuk file
+    yang berhasil ditulis (baris dengan file hilang/gagal dibiarkan, supaya DB tetap sama dengan file).
+    Return dict {updated, unchanged, failed: [(nama, pesan)], seconds}.
+    """
+    start = time.perf_counter()
+    rows = get_history_rows(history_ids)
+    changes = []
+    for r in rows:
+        upd = apply_spec_to_row(r, spec)
+        if upd: changes.append((r, upd))
+    report = {"updated": 0, "unchanged": len(rows) - len(changes), "failed": [], "seconds": 0.0}
+    if changes: get_exiftool_pool(changes[0][0]['output_path'])  # ukuran pool ditentukan sekali per operasi
+
+    for i in range(0, len(changes), WRITE_CHUNK):
+        chunk = changes[i:i + WRITE_CHUNK]
+        writes = [{"path": os.path.join(r['output_path'], r['new_filename']), "title": u['title'], "desc": u['description'], "keywords": u['keywords']} for r, u in chunk]
+        present = fs_cache.check_paths([w['path'] for w in writes])
+        exists = [present[w['path']] is not None for w in writes]
+        results = apply_metadata_updates([w for w, e in zip(writes, exists) if e])
+        results_iter = iter(results)
+        ok_updates = []
+        for (r, u), e in zip(chunk, exists):
+            if not e:
+                report["failed"].append((r['new_filename'], "Moved/Deleted")); continue
+            res = next(results_iter)
+            if res['ok']: ok_updates.append(u)
+            else: report["failed"].append((r['new_filename'], res['msg']))
+        if ok_updates: report["updated"] += update_history_rows(ok_updates)
+        if progress_cb: progress_cb(min(i + WRITE_CHUNK, len(changes)), len(changes))
+
+    report["seconds"] = time.perf_counter() - start
+    return report
@@ -32,6 +32,54 @@ if os.name == 'nt' and not os.path.exists(EXIFTOOL_PATH):
     print(f"⚠️ Warning: ExifTool binary not found at {EXIFTOOL_PATH}. Metadata writing might fail.")
     EXIFTOOL_PATH = None 
 
+# Jumlah file sukses yang dikumpulkan sebelum metadata di-flush ke pool ExifTool
+METADATA_BATCH_SIZE = 8
+
+# JPEG biasa ditulis in-process (XMP/IPTC/EXIF) tanpa round-trip ExifTool; False = selalu ExifTool
+NATIVE_JPEG_WRITER = True
+
+# Strategi metadata video per ekstensi: "embed" (rewrite penuh via ExifTool),
+# "sidecar" (hanya .xmp), "inplace" (sidecar + box XMP ditulis in-place, hanya MP4/MOV)
+VIDEO_METADATA_MODES = {".mp4": "inplace", ".mov": "inplace", ".avi": "sidecar", ".mkv": "sidecar"}
+
+# Koreksi text-only: jumlah asset yang digabung dalam satu request AI
+TEXT_REGEN_BATCH_SIZE = 8
+
+# Kategori stock yang diminta di prompt (juga daftar kategori sah untuk bulk edit lokal)
+STOCK_CATEGORIES = ["People", "Nature", "Business", "Food", "Travel", "Architecture", "Animals", "Lifestyle", "Technology", "Abstract"]
+
+# Cache thumbnail gallery (content-addressed, LRU berbatas ukuran)
+THUMBNAIL_CACHE_DIR = os.path.join(os.getcwd(), ".cache", "thumbnails")
+THUMBNAIL_CACHE_MAX_MB = 512
+THUMBNAIL_SIZE = 384
+
+# Preview AI (JPEG 1024px) yang dipakai ulang saat regenerate/retry
+PREVIEW_CACHE_DIR = os.path.join(os.getcwd(), ".cache", "previews")
+PREVIEW_CACHE_MAX_MB = 1024
+
+# Job latar belakang: log lengkap per job ke file, UI hanya menampilkan ring buffer event terakhir
+JOB_LOG_DIR = os.path.join(os.getcwd(), "logs", "jobs")
+JOB_EVENT_RING = 500
+JOB_POLL_INTERVAL = 2.0   # detik; interval refresh panel progres
+
+# Report CSV agency: baris di-buffer lalu di-flush ke file .part setiap N hasil
+REPORT_FLUSH_ROWS = 25
+
+# Import metadata yang sudah ada di file (dan "Skip Existing Files" di batch)
+IMPORT_MIN_KEYWORDS = 5     # metadata dianggap lengkap: title + description + minimal N keyword
+IMPORT_READ_CHUNK = 500     # file per pemanggilan `exiftool -json` / per bulk insert
+
+# Tracing per tahap (span) untuk batch: bisa di-toggle dari sidebar, hasil Chrome trace JSON per job
+TRACE_ENABLED = False
+TRACE_DIR = os.path.join(os.getcwd(), "logs", "traces")
+TRACE_MAX_EVENTS = 200_000  # batas span per sesi (sisanya dihitung sebagai dropped)
+
+# Metrik live (format Prometheus) di http://METRICS_HOST:METRICS_PORT/metrics
+METRICS_ENABLED = True
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9464
+METRICS_RATE_WINDOW = 300   # detik; jendela untuk images/min
+
 # Pricing Configuration (Estimasi per 1M token)
 MODEL_PRICES = {
     "default": {"in": 0.10, "out": 0.40},
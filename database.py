@@ -1,16 +1,205 @@
 import sqlite3
+import csv
+import os
 import datetime
 import pandas as pd
 import threading
+import queue
+import time
+from concurrent.futures import Future
 from config import DB_FILE
+from tracing import span
 
-# Global Lock untuk keamanan thread
-db_lock = threading.Lock()
+# --- CONNECTION LAYER (WAL + Reader Reuse + Group Commit Writer) ---
+# Semua tulisan lewat satu thread writer yang menggabungkan banyak insert/update
+# ke satu transaksi (group commit), jadi tidak ada lagi fsync per gambar.
+# Pembacaan memakai koneksi per-thread yang dipakai ulang; dengan WAL, reader
+# tidak terblokir oleh batch yang sedang menulis.
 
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute('''
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-32000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+]
+
+WRITE_BATCH_MAX = 256        # maksimal job per transaksi
+WRITE_FLUSH_LATENCY = 0.05   # detik; batas tunggu sebelum batch di-commit
+
+def _connect():
+    conn = sqlite3.connect(DB_FILE, timeout=5.0)
+    for p in PRAGMAS:
+        conn.execute(p)
+    return conn
+
+_local = threading.local()
+
+def _reader():
+    """Koneksi baca milik thread ini (dibuat sekali, dipakai ulang)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _connect()
+        conn.row_factory = sqlite3.Row
+        _local.conn = conn
+    return conn
+
+class _GroupCommitWriter:
+    """Thread tunggal pemilik koneksi tulis. Job = callable(conn) -> hasil."""
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.version = 0  # naik setiap batch yang mengubah data ter-commit (invalidasi cache)
+
+    def _ensure_started(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self.thread.start()
+
+    def submit(self, fn, mutates=True):
+        self._ensure_started()
+        fut = Future()
+        self.jobs.put((fn, fut, mutates))
+        return fut
+
+    def _run(self):
+        conn = _connect()
+        conn.row_factory = sqlite3.Row
+        conn.isolation_level = None  # kontrol transaksi manual (BEGIN/SAVEPOINT/COMMIT)
+        while True:
+            batch = [self.jobs.get()]
+            deadline = time.monotonic() + WRITE_FLUSH_LATENCY
+            while len(batch) < WRITE_BATCH_MAX:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0: break
+                try: batch.append(self.jobs.get(timeout=remaining))
+                except queue.Empty: break
+
+            results = []
+            try:
+                with span("db_write_batch", cat="db", jobs=len(batch)):
+                    conn.execute("BEGIN")
+                    for i, (fn, fut, _) in enumerate(batch):
+                        # Savepoint per job: satu job gagal tidak membatalkan job lain di batch
+                        conn.execute(f"SAVEPOINT job{i}")
+                        try:
+                            results.append((fut, fn(conn), None))
+                            conn.execute(f"RELEASE job{i}")
+                        except Exception as e:
+                            conn.execute(f"ROLLBACK TO job{i}")
+                            conn.execute(f"RELEASE job{i}")
+                            results.append((fut, None, e))
+                    conn.execute("COMMIT")
+                if any(m for _, _, m in batch): self.version += 1
+            except Exception as e:
+                try: conn.execute("ROLLBACK")
+                except Exception: pass
+                results = [(fut, None, e) for _, fut, _ in batch]
+
+            for fut, value, err in results:
+                if err is not None: fut.set_exception(err)
+                else: fut.set_result(value)
+
+_writer = _GroupCommitWriter()
+
+def submit_write(fn, wait=False, mutates=True):
+    """Antrikan job tulis. wait=True -> blok sampai batch-nya ter-commit dan return hasilnya.
+    mutates=False: job tidak mengubah data history/keyword (versi cache tidak dinaikkan)."""
+    fut = _writer.submit(fn, mutates)
+    return fut.result() if wait else fut
+
+def flush_writes(timeout=None):
+    """Tunggu semua tulisan yang sudah diantrikan ter-commit."""
+    return _writer.submit(lambda conn: None, mutates=False).result(timeout=timeout)
+
+def pending_writes():
+    """Jumlah job tulis yang masih antri di writer (metrik kedalaman antrian)."""
+    return _writer.jobs.qsize()
+
+def get_data_version():
+    """Counter yang naik setiap kali data ter-commit; dipakai sebagai kunci cache."""
+    return _writer.version
+
+def _log_write_error(label):
+    def _cb(fut):
+        err = fut.exception()
+        if err is not None: print(f"{label}: {err}")
+    return _cb
+
+# --- FULL-TEXT SEARCH (FTS5) ---
+# Index external-content atas tabel history; disinkronkan oleh trigger, jadi
+# tidak ada kode tulis yang perlu tahu soal FTS. Prefix index 2/3 huruf membuat
+# pencarian "bea*" tetap instan di ratusan ribu baris.
+
+FTS_COLUMNS = ("new_filename", "title", "description", "keywords", "category")
+FTS_ENABLED = False
+
+def _ensure_fts(conn):
+    """Buat tabel FTS + trigger, lalu backfill (rebuild) dari baris history yang sudah ada."""
+    cols = ", ".join(FTS_COLUMNS)
+    new_cols = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+    old_cols = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+    try:
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+                {cols}, content='history', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"[WARN] FTS5 tidak tersedia, search pakai LIKE: {e}")
+        return
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS history_fts_ai AFTER INSERT ON history BEGIN
+            INSERT INTO history_fts(rowid, {cols}) VALUES (new.id, {new_cols});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS history_fts_ad AFTER DELETE ON history BEGIN
+            INSERT INTO history_fts(history_fts, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS history_fts_au AFTER UPDATE ON history BEGIN
+            INSERT INTO history_fts(history_fts, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            INSERT INTO history_fts(rowid, {cols}) VALUES (new.id, {new_cols});
+        END
+    """)
+    conn.execute("INSERT INTO history_fts(history_fts) VALUES ('rebuild')")
+
+def build_fts_query(search_query):
+    """Input bebas user -> query FTS5 aman: tiap kata di-quote dan jadi prefix ("kata"*), digabung AND."""
+    terms = [t.replace('"', '') for t in search_query.split()]
+    return " ".join(f'"{t}"*' for t in terms if t)
+
+# --- KEYWORD INDEX HELPERS ---
+
+def normalize_keywords(keywords):
+    """List atau string 'a, b' -> list keyword unik (lowercase, spasi dirapikan), urutan dipertahankan."""
+    if not keywords: return []
+    if isinstance(keywords, str): keywords = keywords.split(",")
+    seen, out = set(), []
+    for k in keywords:
+        k = " ".join(str(k).split()).lower()
+        if k and k not in seen:
+            seen.add(k); out.append(k)
+    return out
+
+def _index_keywords(conn, history_id, keywords, category):
+    conn.execute("DELETE FROM asset_keywords WHERE history_id = ?", (history_id,))
+    conn.executemany("INSERT OR IGNORE INTO asset_keywords (keyword, history_id, category) VALUES (?, ?, ?)",
+                     [(kw, history_id, category or '') for kw in normalize_keywords(keywords)])
+
+# --- SCHEMA MIGRATIONS (PRAGMA user_version) ---
+# Tambah migrasi baru di akhir list; jangan ubah migrasi yang sudah pernah dirilis.
+# Setiap migrasi dijalankan sekali, di dalam transaksi writer, lalu user_version dinaikkan.
+
+def _m001_base_tables(conn):
+    conn.execute('''
         CREATE TABLE IF NOT EXISTS history (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             timestamp TEXT,
@@ -23,7 +212,7 @@ def init_db():
             output_path TEXT
         )
     ''')
-    c.execute('''
+    conn.execute('''
         CREATE TABLE IF NOT EXISTS prompt_history (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             timestamp TEXT,
@@ -33,137 +222,720 @@ def init_db():
             generated_result TEXT
         )
     ''')
-    conn.commit()
-    conn.close()
-
-def add_history_entry(filename, new_filename, title, desc, keywords, category, output_path):
-    with db_lock:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        try:
-            c.execute('''
-                INSERT INTO history (timestamp, filename, new_filename, title, description, keywords, category, output_path)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (ts, filename, new_filename, title, desc, keywords, category, output_path))
-            conn.commit()
-        except Exception as e:
-            print(f"DB Insert Error: {e}")
-        finally:
-            conn.close()
+
+def _m003_history_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_new_filename ON history(new_filename)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history(timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_category ON history(category)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_output_path ON history(output_path)")
+
+def _m004_asset_keywords(conn):
+    # Inverted index keyword -> asset. category disalin ke sini supaya query per kategori
+    # tidak perlu join ke history. keyword_stats = jumlah per (kategori, keyword), dijaga trigger,
+    # jadi top-N cukup membaca index tanpa GROUP BY atas jutaan baris.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS asset_keywords (
+            keyword TEXT NOT NULL,
+            history_id INTEGER NOT NULL,
+            category TEXT NOT NULL DEFAULT '',
+            PRIMARY KEY (keyword, history_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS keyword_stats (
+            category TEXT NOT NULL,
+            keyword TEXT NOT NULL,
+            n INTEGER NOT NULL,
+            PRIMARY KEY (category, keyword)
+        ) WITHOUT ROWID
+    ''')
+    # Backfill dari string keywords yang sudah ada (sebelum index sekunder & trigger: bulk insert jauh lebih cepat)
+    cursor = conn.execute("SELECT id, keywords, COALESCE(category, '') FROM history")
+    while True:
+        chunk = cursor.fetchmany(5000)
+        if not chunk: break
+        conn.executemany("INSERT OR IGNORE INTO asset_keywords (keyword, history_id, category) VALUES (?, ?, ?)",
+                         [(kw, hid, cat) for hid, kws, cat in chunk for kw in normalize_keywords(kws)])
+    conn.execute("INSERT INTO keyword_stats (category, keyword, n) SELECT category, keyword, COUNT(*) FROM asset_keywords GROUP BY category, keyword")
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_asset_keywords_history ON asset_keywords(history_id, keyword)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_keyword_stats_rank ON keyword_stats(category, n DESC)")
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS history_keywords_ad AFTER DELETE ON history BEGIN
+            DELETE FROM asset_keywords WHERE history_id = old.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS asset_keywords_ai AFTER INSERT ON asset_keywords BEGIN
+            INSERT INTO keyword_stats (category, keyword, n) VALUES (new.category, new.keyword, 1)
+            ON CONFLICT(category, keyword) DO UPDATE SET n = n + 1;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS asset_keywords_ad AFTER DELETE ON asset_keywords BEGIN
+            UPDATE keyword_stats SET n = n - 1 WHERE category = old.category AND keyword = old.keyword;
+            DELETE FROM keyword_stats WHERE category = old.category AND keyword = old.keyword AND n <= 0;
+        END
+    ''')
+
+def _m005_file_telemetry(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS file_telemetry (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            history_id INTEGER,
+            timestamp TEXT,
+            filename TEXT,
+            status TEXT,
+            file_type TEXT,
+            provider TEXT,
+            model TEXT,
+            retries INTEGER,
+            tokens_in INTEGER,
+            tokens_out INTEGER,
+            bytes_uploaded INTEGER,
+            load_ms REAL,
+            ai_ms REAL,
+            finalize_ms REAL,
+            total_ms REAL,
+            blur_score REAL,
+            file_size INTEGER,
+            content_hash TEXT,
+            width INTEGER,
+            height INTEGER
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_telemetry_history ON file_telemetry(history_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_telemetry_model_ts ON file_telemetry(model, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_telemetry_timestamp ON file_telemetry(timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_telemetry_hash ON file_telemetry(content_hash)")
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS history_telemetry_ad AFTER DELETE ON history BEGIN
+            UPDATE file_telemetry SET history_id = NULL WHERE history_id = old.id;
+        END
+    ''')
+
+def _m006_jobs(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT,
+            status TEXT,
+            params TEXT,
+            total INTEGER DEFAULT 0,
+            done INTEGER DEFAULT 0,
+            ok INTEGER DEFAULT 0,
+            skipped INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            message TEXT,
+            created_at TEXT,
+            updated_at TEXT
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs(created_at)")
+
+def _m007_history_batch_id(conn):
+    # Batch asal tiap baris history, supaya report agency bisa dibuat ulang per batch dari DB
+    conn.execute("ALTER TABLE history ADD COLUMN batch_id TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_batch ON history(batch_id)")
+
+def _m008_content_index(conn):
+    # Index isi file (ukuran + hash parsial + SHA-256) untuk "Skip Existing Files".
+    # Baris lama diisi dari telemetri (tanpa hash parsial: langsung dikonfirmasi dengan SHA-256).
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS content_index (
+            history_id INTEGER PRIMARY KEY,
+            file_size INTEGER NOT NULL,
+            partial_hash TEXT,
+            full_hash TEXT NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_content_size ON content_index(file_size)")
+    conn.execute('''
+        INSERT OR IGNORE INTO content_index (history_id, file_size, full_hash)
+        SELECT history_id, file_size, content_hash FROM file_telemetry
+        WHERE history_id IS NOT NULL AND file_size IS NOT NULL AND content_hash IS NOT NULL
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS history_content_ad AFTER DELETE ON history BEGIN
+            DELETE FROM content_index WHERE history_id = old.id;
+        END
+    ''')
+
+def _m009_sampled_content_hash(conn):
+    # Video/vektor tidak lagi di-SHA-256 penuh setiap diproses: telemetri menyimpan hash sampel,
+    # dan full_hash di content_index boleh kosong (dihitung hanya saat hash sampel bertabrakan).
+    conn.execute("ALTER TABLE file_telemetry ADD COLUMN partial_hash TEXT")
+    conn.execute("DROP TRIGGER IF EXISTS history_content_ad")
+    conn.execute('''
+        CREATE TABLE content_index_new (
+            history_id INTEGER PRIMARY KEY,
+            file_size INTEGER NOT NULL,
+            partial_hash TEXT,
+            full_hash TEXT
+        )
+    ''')
+    conn.execute("INSERT INTO content_index_new SELECT history_id, file_size, partial_hash, full_hash FROM content_index")
+    conn.execute("DROP TABLE content_index")
+    conn.execute("ALTER TABLE content_index_new RENAME TO content_index")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_content_size ON content_index(file_size)")
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS history_content_ad AFTER DELETE ON history BEGIN
+            DELETE FROM content_index WHERE history_id = old.id;
+        END
+    ''')
+
+MIGRATIONS = [
+    (1, "base tables", _m001_base_tables),
+    (2, "history full-text index", _ensure_fts),
+    (3, "history lookup indexes", _m003_history_indexes),
+    (4, "asset keyword index", _m004_asset_keywords),
+    (5, "per-file telemetry", _m005_file_telemetry),
+    (6, "background jobs", _m006_jobs),
+    (7, "history batch id", _m007_history_batch_id),
+    (8, "content hash index", _m008_content_index),
+    (9, "sampled content hash", _m009_sampled_content_hash),
+]
+
+def _migrate(conn):
+    """Jalankan migrasi yang belum diterapkan. Return versi skema akhir."""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, name, fn in MIGRATIONS:
+        if version <= current: continue
+        print(f"[DB] Migrasi {version}: {name}")
+        fn(conn)
+        conn.execute(f"PRAGMA user_version = {version}")
+        current = version
+    return current
+
+def init_db():
+    global FTS_ENABLED
+    def _setup(conn):
+        before = conn.execute("PRAGMA user_version").fetchone()[0]
+        migrated = _migrate(conn) != before
+        return migrated, conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='history_fts'").fetchone() is not None
+    # Dipanggil di setiap rerun Streamlit: cache hanya diinvalidasi jika ada migrasi yang benar-benar jalan
+    migrated, FTS_ENABLED = submit_write(_setup, wait=True, mutates=False)
+    if migrated: _writer.version += 1
+
+def add_history_entry(filename, new_filename, title, desc, keywords, category, output_path, keyword_list=None, telemetry=None, batch_id=None):
+    """Diantrikan ke writer (group commit); panggil flush_writes() jika perlu dibaca segera.
+    keyword_list: list clean_kw dari processor (jika None, keywords string dipecah per koma).
+    telemetry: dict telemetri dari processor, disimpan di file_telemetry dan ditautkan ke baris ini.
+    batch_id: ID job batch asal (dipakai untuk membuat ulang report agency)."""
+    ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    def _insert(conn):
+        cur = conn.execute('''
+            INSERT INTO history (timestamp, filename, new_filename, title, description, keywords, category, output_path, batch_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (ts, filename, new_filename, title, desc, keywords, category, output_path, batch_id))
+        _index_keywords(conn, cur.lastrowid, keyword_list if keyword_list is not None else keywords, category)
+        if telemetry:
+            _insert_telemetry(conn, telemetry, cur.lastrowid, "success", ts)
+            _index_content(conn, cur.lastrowid, telemetry)
+        return cur.lastrowid
+    fut = submit_write(_insert)
+    fut.add_done_callback(_log_write_error("DB Insert Error"))
+    return fut
+
+def add_history_entries(entries, batch_id=None):
+    """
+    Bulk insert (satu transaksi writer) untuk import metadata yang sudah ada di file.
+    entries: list dict {filename, new_filename, title, description, keywords (list), category, output_path}.
+    Return future berisi jumlah baris.
+    """
+    ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    def _insert(conn):
+        for e in entries:
+            kw = e.get('keywords') or []
+            cur = conn.execute('''
+                INSERT INTO history (timestamp, filename, new_filename, title, description, keywords, category, output_path, batch_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (ts, e['filename'], e['new_filename'], e['title'], e['description'], ", ".join(kw), e['category'], e['output_path'], batch_id))
+            _index_keywords(conn, cur.lastrowid, kw, e['category'])
+        return len(entries)
+    fut = submit_write(_insert)
+    fut.add_done_callback(_log_write_error("DB Bulk Insert Error"))
+    return fut
+
+# --- CONTENT INDEX (Skip Existing Files) ---
+
+def _index_content(conn, history_id, telemetry):
+    # full_hash boleh kosong: video/vektor dengan hash sampel yang belum bertabrakan dengan isi lain
+    if (telemetry.get("content_hash") or telemetry.get("partial_hash")) and telemetry.get("file_size") is not None:
+        conn.execute("INSERT OR REPLACE INTO content_index (history_id, file_size, partial_hash, full_hash) VALUES (?, ?, ?, ?)",
+                     (history_id, telemetry["file_size"], telemetry.get("partial_hash"), telemetry.get("content_hash")))
+
+def find_content_candidates(file_size):
+    """Baris history yang isinya berukuran sama: list dict (partial_hash, full_hash, new_filename, output_path)."""
+    try:
+        with span("db_content_lookup", cat="db"):
+            rows = _reader().execute('''
+                SELECT c.partial_hash, c.full_hash, h.new_filename, h.output_path
+                FROM content_index c JOIN history h ON h.id = c.history_id
+                WHERE c.file_size = ?
+            ''', (file_size,)).fetchall()
+        return [dict(r) for r in rows]
+    except Exception:
+        return []
+
+def get_history_filenames(output_path):
+    """Set new_filename yang sudah tercatat untuk satu folder (cek duplikat import, O(1) per file)."""
+    try:
+        return {r[0] for r in _reader().execute("SELECT new_filename FROM history WHERE output_path = ?", (output_path,))}
+    except Exception:
+        return set()
 
 # [BARU] Fungsi Update Data setelah Regenerate
-def update_history_entry(old_filename_in_db, new_filename, title, desc, keywords):
-    with db_lock:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        try:
-            # Update data berdasarkan nama file yang tersimpan di DB sebelumnya
-            c.execute('''
-                UPDATE history 
-                SET new_filename = ?, title = ?, description = ?, keywords = ?
-                WHERE new_filename = ?
-            ''', (new_filename, title, desc, keywords, old_filename_in_db))
-            conn.commit()
-        except Exception as e:
-            print(f"DB Update Error: {e}")
-        finally:
-            conn.close()
+def update_history_entry(old_filename_in_db, new_filename, title, desc, keywords, keyword_list=None):
+    def _update(conn):
+        targets = conn.execute("SELECT id, category FROM history WHERE new_filename = ?", (old_filename_in_db,)).fetchall()
+        # Update data berdasarkan nama file yang tersimpan di DB sebelumnya
+        conn.execute('''
+            UPDATE history 
+            SET new_filename = ?, title = ?, description = ?, keywords = ?
+            WHERE new_filename = ?
+        ''', (new_filename, title, desc, keywords, old_filename_in_db))
+        for row in targets:
+            _index_keywords(conn, row['id'], keyword_list if keyword_list is not None else keywords, row['category'])
+    try:
+        submit_write(_update, wait=True)
+    except Exception as e:
+        print(f"DB Update Error: {e}")
 
-# [BARU] Ambil Data dengan Pagination & Search (Untuk Gallery Minimalis)
-def get_paginated_history(page=1, per_page=12, search_query=""):
-    with db_lock:
-        conn = sqlite3.connect(DB_FILE)
-        conn.row_factory = sqlite3.Row # Agar bisa akses kolom by name
-        offset = (page - 1) * per_page
-        
-        try:
-            cursor = conn.cursor()
-            
-            if search_query:
+def update_history_rows(updates):
+    """
+    Update banyak baris sekaligus dalam satu transaksi (bulk edit lokal).
+    updates: list dict {id, title, description, keywords (list), category}. Return jumlah baris.
+    """
+    def _update(conn):
+        conn.executemany('''
+            UPDATE history SET title = ?, description = ?, keywords = ?, category = ? WHERE id = ?
+        ''', [(u['title'], u['description'], ", ".join(u['keywords']), u['category'], u['id']) for u in updates])
+        for u in updates:
+            _index_keywords(conn, u['id'], u['keywords'], u['category'])
+        return len(updates)
+    return submit_write(_update, wait=True)
+
+# --- GALLERY QUERIES (Keyset Pagination + Cached Count) ---
+
+_count_cache = {}
+
+def count_history(search_query=""):
+    """Total baris (atau hasil search), di-cache sampai ada tulisan baru (get_data_version)."""
+    version = get_data_version()
+    hit = _count_cache.get(search_query)
+    if hit and hit[0] == version: return hit[1]
+    cursor = _reader().cursor()
+    try:
+        fts_q = build_fts_query(search_query) if search_query else ""
+        if search_query and FTS_ENABLED:
+            if not fts_q: return 0
+            # Count cukup dari index FTS, tanpa menyentuh tabel history
+            cursor.execute("SELECT COUNT(*) FROM history_fts WHERE history_fts MATCH ?", (fts_q,))
+        elif search_query:
+            q = f"%{search_query}%"
+            cursor.execute("SELECT COUNT(*) FROM history WHERE new_filename LIKE ? OR title LIKE ?", (q, q))
+        else:
+            cursor.execute("SELECT COUNT(*) FROM history")
+        total = cursor.fetchone()[0]
+    except Exception as e:
+        print(f"DB Count Error: {e}")
+        return 0
+    if len(_count_cache) > 256: _count_cache.clear()
+    _count_cache[search_query] = (version, total)
+    return total
+
+def get_history_page(search_query="", per_page=12, cursor=None):
+    """
+    Ambil satu halaman gallery. Return (rows, next_cursor); next_cursor None = halaman terakhir.
+    - Tanpa search : keyset pada id (cursor = id terakhir halaman sebelumnya), biaya sama di halaman berapa pun.
+    - Dengan search: urutan relevansi bm25, cursor = offset (hasil match sudah dibatasi index FTS).
+    """
+    conn = _reader()
+    try:
+        if search_query:
+            offset = cursor or 0
+            fts_q = build_fts_query(search_query)
+            if FTS_ENABLED:
+                if not fts_q: return [], None
+                rows = conn.execute('''
+                    SELECT h.* FROM history_fts f JOIN history h ON h.id = f.rowid
+                    WHERE history_fts MATCH ?
+                    ORDER BY bm25(history_fts, 4.0, 3.0, 1.0, 2.0, 1.0), h.id DESC
+                    LIMIT ? OFFSET ?
+                ''', (fts_q, per_page + 1, offset)).fetchall()
+            else:
                 q = f"%{search_query}%"
-                # Hitung total untuk pagination
-                cursor.execute("SELECT COUNT(*) FROM history WHERE new_filename LIKE ? OR title LIKE ?", (q, q))
-                total_items = cursor.fetchone()[0]
-                
-                # Ambil data
-                cursor.execute("SELECT * FROM history WHERE new_filename LIKE ? OR title LIKE ? ORDER BY id DESC LIMIT ? OFFSET ?", (q, q, per_page, offset))
+                rows = conn.execute("SELECT * FROM history WHERE new_filename LIKE ? OR title LIKE ? ORDER BY id DESC LIMIT ? OFFSET ?", (q, q, per_page + 1, offset)).fetchall()
+            next_cursor = offset + per_page if len(rows) > per_page else None
+        else:
+            if cursor is None:
+                rows = conn.execute("SELECT * FROM history ORDER BY id DESC LIMIT ?", (per_page + 1,)).fetchall()
             else:
-                cursor.execute("SELECT COUNT(*) FROM history")
-                total_items = cursor.fetchone()[0]
-                
-                cursor.execute("SELECT * FROM history ORDER BY id DESC LIMIT ? OFFSET ?", (per_page, offset))
-            
-            rows = cursor.fetchall()
-            return rows, total_items
-        except Exception as e:
-            print(f"DB Fetch Error: {e}")
-            return [], 0
-        finally:
-            conn.close()
+                rows = conn.execute("SELECT * FROM history WHERE id < ? ORDER BY id DESC LIMIT ?", (cursor, per_page + 1)).fetchall()
+            next_cursor = rows[per_page - 1]['id'] if len(rows) > per_page else None
+        return rows[:per_page], next_cursor
+    except Exception as e:
+        print(f"DB Fetch Error: {e}")
+        return [], None
+
+def get_history_ids(search_query="", limit=None):
+    """Semua id yang cocok dengan search gallery (untuk 'select all matching' lintas halaman)."""
+    where, params = _history_where({"search": search_query})
+    sql = f"SELECT id FROM history{where} ORDER BY id DESC" + (" LIMIT ?" if limit else "")
+    try:
+        return [r[0] for r in _reader().execute(sql, params + ([limit] if limit else []))]
+    except Exception as e:
+        print(f"DB Fetch Error: {e}")
+        return []
+
+def get_history_rows(ids, chunk=500):
+    """Baris history untuk daftar id (dibaca per chunk agar tidak melebihi batas parameter SQLite)."""
+    ids = list(ids)
+    rows = []
+    for i in range(0, len(ids), chunk):
+        part = ids[i:i + chunk]
+        rows += _reader().execute(f"SELECT * FROM history WHERE id IN ({','.join('?' * len(part))}) ORDER BY id DESC", part).fetchall()
+    return rows
+
+# [BARU] Ambil Data dengan Pagination & Search (Untuk Gallery Minimalis)
+def get_paginated_history(page=1, per_page=12, search_query=""):
+    """Versi berbasis nomor halaman (OFFSET), untuk pemanggil yang butuh lompat ke halaman tertentu."""
+    conn = _reader()
+    offset = (page - 1) * per_page
+    try:
+        total_items = count_history(search_query)
+        if search_query:
+            rows, _ = get_history_page(search_query, per_page, offset)
+        else:
+            rows = conn.execute("SELECT * FROM history ORDER BY id DESC LIMIT ? OFFSET ?", (per_page, offset)).fetchall()
+        return rows, total_items
+    except Exception as e:
+        print(f"DB Fetch Error: {e}")
+        return [], 0
+
+# --- HISTORY LOG (Server-side Paging, Projection, Filter & Sort) ---
+
+HISTORY_COLUMNS = ["id", "timestamp", "filename", "new_filename", "title", "description", "keywords", "category", "output_path"]
+EXPORT_CHUNK_ROWS = 5000
+
+def _history_where(filters):
+    """filters: dict {search, category, date_from, date_to, output_path, batch_id} -> (sql WHERE, params)."""
+    clauses, params = [], []
+    filters = filters or {}
+    search = (filters.get("search") or "").strip()
+    if search:
+        fts_q = build_fts_query(search)
+        if FTS_ENABLED and fts_q:
+            clauses.append("id IN (SELECT rowid FROM history_fts WHERE history_fts MATCH ?)"); params.append(fts_q)
+        else:
+            q = f"%{search}%"
+            clauses.append("(new_filename LIKE ? OR title LIKE ?)"); params += [q, q]
+    if filters.get("category"):
+        clauses.append("category = ?"); params.append(filters["category"])
+    if filters.get("date_from"):
+        clauses.append("timestamp >= ?"); params.append(str(filters["date_from"]))
+    if filters.get("date_to"):
+        # timestamp disimpan 'YYYY-MM-DD HH:MM:SS'; batas atas inklusif sampai akhir hari
+        clauses.append("timestamp <= ?"); params.append(f"{filters['date_to']} 23:59:59")
+    if filters.get("output_path"):
+        # Folder output beserta subfoldernya (Photo/Abstract, dst.)
+        root = str(filters["output_path"]).rstrip("/\\")
+        clauses.append("(output_path = ? OR substr(output_path, 1, ?) IN (?, ?))")
+        params += [root, len(root) + 1, root + "/", root + "\\"]
+    if filters.get("batch_id"):
+        clauses.append("batch_id = ?"); params.append(filters["batch_id"])
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+def _select_list(columns):
+    cols = [c for c in (columns or HISTORY_COLUMNS) if c in HISTORY_COLUMNS]
+    return ", ".join(cols or HISTORY_COLUMNS)
+
+def _order_by(sort_by, descending):
+    col = sort_by if sort_by in HISTORY_COLUMNS else "id"
+    direction = "DESC" if descending else "ASC"
+    # id sebagai tie-breaker supaya urutan stabil antar halaman
+    return f" ORDER BY {col} {direction}" + (f", id {direction}" if col != "id" else "")
+
+def count_history_filtered(filters=None):
+    """Seperti count_history, tapi untuk kombinasi filter History Log (ikut cache data-version)."""
+    key = ("filters",) + tuple(sorted((k, str(v)) for k, v in (filters or {}).items() if v))
+    version = get_data_version()
+    hit = _count_cache.get(key)
+    if hit and hit[0] == version: return hit[1]
+    where, params = _history_where(filters)
+    try:
+        total = _reader().execute(f"SELECT COUNT(*) FROM history{where}", params).fetchone()[0]
+    except Exception as e:
+        print(f"DB Count Error: {e}")
+        return 0
+    if len(_count_cache) > 256: _count_cache.clear()
+    _count_cache[key] = (version, total)
+    return total
+
+def query_history(columns=None, filters=None, sort_by="id", descending=True, limit=50, offset=0):
+    """Satu halaman History Log sebagai DataFrame kecil; hanya kolom yang diminta yang dibaca."""
+    where, params = _history_where(filters)
+    sql = f"SELECT {_select_list(columns)} FROM history{where}{_order_by(sort_by, descending)} LIMIT ? OFFSET ?"
+    try:
+        return pd.read_sql_query(sql, _reader(), params=params + [limit, offset])
+    except Exception as e:
+        print(f"DB Fetch Error: {e}")
+        return pd.DataFrame()
+
+def get_history_categories():
+    try:
+        return [r[0] for r in _reader().execute("SELECT DISTINCT category FROM history WHERE category IS NOT NULL AND category != '' ORDER BY category")]
+    except Exception:
+        return []
+
+def export_history_csv(path, columns=None, filters=None, sort_by="id", descending=True, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Streaming export ke CSV per chunk (fetchmany), tanpa membangun DataFrame penuh. Return jumlah baris."""
+    where, params = _history_where(filters)
+    cols = _select_list(columns)
+    sql = f"SELECT {cols} FROM history{where}{_order_by(sort_by, descending)}"
+    tmp_path = path + ".part"
+    written = 0
+    # Koneksi terpisah: export panjang tidak menahan cursor milik reader UI
+    conn = _connect()
+    try:
+        cursor = conn.execute(sql, params)
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow([c.strip() for c in cols.split(",")])
+            while True:
+                chunk = cursor.fetchmany(chunk_rows)
+                if not chunk: break
+                writer.writerows(chunk)
+                written += len(chunk)
+        os.replace(tmp_path, path)
+        return written
+    finally:
+        conn.close()
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+
+def iter_history(filters=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield dict baris history (urut id) per chunk fetchmany; memori konstan berapa pun ukuran katalog."""
+    where, params = _history_where(filters)
+    cols = HISTORY_COLUMNS + ["batch_id"]
+    conn = _connect()
+    try:
+        cursor = conn.execute(f"SELECT {', '.join(cols)} FROM history{where} ORDER BY id", params)
+        while True:
+            chunk = cursor.fetchmany(chunk_rows)
+            if not chunk: break
+            for row in chunk: yield dict(zip(cols, row))
+    finally:
+        conn.close()
+
+# --- FILE TELEMETRY ---
+
+TELEMETRY_FIELDS = ["filename", "file_type", "provider", "model", "retries", "tokens_in", "tokens_out", "bytes_uploaded",
+                    "load_ms", "ai_ms", "finalize_ms", "total_ms", "blur_score", "file_size", "content_hash", "partial_hash", "width", "height"]
+LATENCY_STAGES = ("load_ms", "ai_ms", "finalize_ms", "total_ms")
+
+def _insert_telemetry(conn, telemetry, history_id, status, ts):
+    cols = ["history_id", "timestamp", "status"] + TELEMETRY_FIELDS
+    values = [history_id, ts, status] + [telemetry.get(f) for f in TELEMETRY_FIELDS]
+    conn.execute(f"INSERT INTO file_telemetry ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})", values)
+
+def add_file_telemetry(telemetry, status):
+    """Telemetri untuk file yang tidak masuk history (skipped / error). Async seperti add_history_entry."""
+    if not telemetry: return None
+    ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    fut = submit_write(lambda conn: _insert_telemetry(conn, telemetry, None, status, ts))
+    fut.add_done_callback(_log_write_error("DB Telemetry Error"))
+    return fut
+
+def _since_clause(hours):
+    if not hours: return "", []
+    since = (datetime.datetime.now() - datetime.timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S")
+    return " AND timestamp >= ?", [since]
+
+def get_latency_percentiles(stage="ai_ms", hours=None):
+    """p50/p95 (nearest-rank) per model untuk satu stage. Return list dict {model, n, p50, p95, avg}."""
+    if stage not in LATENCY_STAGES: raise ValueError(f"Unknown stage: {stage}")
+    since_sql, params = _since_clause(hours)
+    sql = f'''
+        WITH ranked AS (
+            SELECT model, {stage} AS v,
+                   ROW_NUMBER() OVER (PARTITION BY model ORDER BY {stage}) AS rn,
+                   COUNT(*) OVER (PARTITION BY model) AS n
+            FROM file_telemetry WHERE {stage} IS NOT NULL{since_sql}
+        )
+        SELECT model, n,
+               MIN(CASE WHEN rn >= 0.50 * n THEN v END) AS p50,
+               MIN(CASE WHEN rn >= 0.95 * n THEN v END) AS p95,
+               AVG(v) AS avg
+        FROM ranked GROUP BY model ORDER BY n DESC
+    '''
+    try:
+        return [dict(r) for r in _reader().execute(sql, params)]
+    except Exception as e:
+        print(f"DB Telemetry Error: {e}")
+        return []
+
+def get_token_stats(hours=None):
+    """Rata-rata token & byte upload per gambar, per model (hanya panggilan AI yang sukses)."""
+    since_sql, params = _since_clause(hours)
+    try:
+        return [dict(r) for r in _reader().execute(f'''
+            SELECT model, COUNT(*) AS images,
+                   AVG(tokens_in) AS avg_tokens_in, AVG(tokens_out) AS avg_tokens_out,
+                   SUM(tokens_in) AS total_tokens_in, SUM(tokens_out) AS total_tokens_out,
+                   AVG(bytes_uploaded) AS avg_bytes_uploaded, AVG(retries) AS avg_retries
+            FROM file_telemetry WHERE status = 'success'{since_sql}
+            GROUP BY model ORDER BY images DESC
+        ''', params)]
+    except Exception as e:
+        print(f"DB Telemetry Error: {e}")
+        return []
+
+def get_throughput_per_hour(hours=24):
+    """File per jam (ok/skipped/error) dan MB yang diproses. Return list dict, jam terlama dulu."""
+    since_sql, params = _since_clause(hours)
+    try:
+        return [dict(r) for r in _reader().execute(f'''
+            SELECT substr(timestamp, 1, 13) || ':00' AS hour,
+                   COUNT(*) AS files,
+                   SUM(status = 'success') AS ok,
+                   SUM(status = 'skipped') AS skipped,
+                   SUM(status = 'error') AS failed,
+                   SUM(file_size) / 1048576.0 AS mb,
+                   AVG(total_ms) AS avg_total_ms
+            FROM file_telemetry WHERE 1 = 1{since_sql}
+            GROUP BY hour ORDER BY hour
+        ''', params)]
+    except Exception as e:
+        print(f"DB Telemetry Error: {e}")
+        return []
+
+# --- KEYWORD QUERIES (asset_keywords) ---
+
+def get_assets_by_keyword(keyword, limit=100, columns=None):
+    """Semua asset dengan tag persis `keyword` (terbaru dulu), lewat primary key (keyword, history_id)."""
+    kw = " ".join(keyword.split()).lower()
+    cols = ", ".join(f"h.{c.strip()}" for c in _select_list(columns).split(","))
+    try:
+        return _reader().execute(f'''
+            SELECT {cols} FROM asset_keywords k JOIN history h ON h.id = k.history_id
+            WHERE k.keyword = ? ORDER BY k.history_id DESC LIMIT ?
+        ''', (kw, limit)).fetchall()
+    except Exception as e:
+        print(f"DB Keyword Error: {e}")
+        return []
+
+def get_keyword_cooccurrence(keyword, limit=20):
+    """Keyword yang paling sering muncul bersama `keyword`. Return list (keyword, jumlah)."""
+    kw = " ".join(keyword.split()).lower()
+    try:
+        return [tuple(r) for r in _reader().execute('''
+            SELECT b.keyword, COUNT(*) AS n
+            FROM asset_keywords a JOIN asset_keywords b ON b.history_id = a.history_id AND b.keyword != a.keyword
+            WHERE a.keyword = ?
+            GROUP BY b.keyword ORDER BY n DESC, b.keyword LIMIT ?
+        ''', (kw, limit))]
+    except Exception as e:
+        print(f"DB Keyword Error: {e}")
+        return []
+
+def get_top_keywords(category=None, limit=20):
+    """Top-N keyword (global atau per kategori) dari keyword_stats. Return list (keyword, jumlah)."""
+    try:
+        if category:
+            rows = _reader().execute("SELECT keyword, n FROM keyword_stats WHERE category = ? ORDER BY n DESC, keyword LIMIT ?", (category, limit))
+        else:
+            rows = _reader().execute("SELECT keyword, SUM(n) AS total FROM keyword_stats GROUP BY keyword ORDER BY total DESC, keyword LIMIT ?", (limit,))
+        return [tuple(r) for r in rows]
+    except Exception as e:
+        print(f"DB Keyword Error: {e}")
+        return []
+
+def get_top_keywords_by_category(limit=10):
+    """{kategori: [(keyword, jumlah), ...]} untuk semua kategori."""
+    try:
+        cats = [r[0] for r in _reader().execute("SELECT DISTINCT category FROM keyword_stats WHERE category != ''")]
+    except Exception:
+        return {}
+    return {c: get_top_keywords(c, limit) for c in cats}
+
+# --- BACKGROUND JOBS ---
+
+JOB_FIELDS = ["id", "kind", "status", "params", "total", "done", "ok", "skipped", "failed", "message", "created_at", "updated_at"]
+JOB_ACTIVE_STATUSES = ("queued", "running", "paused", "cancelling")
+
+def save_job(job):
+    """Upsert snapshot job (dict dengan JOB_FIELDS; params sudah berupa JSON string). Async."""
+    values = [job.get(f) for f in JOB_FIELDS]
+    sql = f"INSERT OR REPLACE INTO jobs ({', '.join(JOB_FIELDS)}) VALUES ({', '.join('?' * len(JOB_FIELDS))})"
+    fut = submit_write(lambda conn: conn.execute(sql, values), mutates=False)  # tabel jobs bukan bagian cache history
+    fut.add_done_callback(_log_write_error("DB Job Error"))
+    return fut
+
+def get_jobs(limit=20, kind=None):
+    """Job terbaru dulu. Return list dict."""
+    sql, params = f"SELECT {', '.join(JOB_FIELDS)} FROM jobs", []
+    if kind:
+        sql += " WHERE kind = ?"; params.append(kind)
+    sql += " ORDER BY created_at DESC LIMIT ?"; params.append(limit)
+    try:
+        return [dict(zip(JOB_FIELDS, r)) for r in _reader().execute(sql, params)]
+    except Exception:
+        return []
+
+def mark_interrupted_jobs():
+    """Job yang masih 'aktif' di DB saat proses baru start berarti prosesnya mati di tengah jalan."""
+    ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    marks = ', '.join('?' * len(JOB_ACTIVE_STATUSES))
+    return submit_write(lambda conn: conn.execute(f"UPDATE jobs SET status = 'interrupted', updated_at = ? WHERE status IN ({marks})",
+                                                  (ts, *JOB_ACTIVE_STATUSES)).rowcount, wait=True, mutates=False)
 
 def get_history_df():
-    with db_lock:
-        conn = sqlite3.connect(DB_FILE)
-        try:
-            df = pd.read_sql_query("SELECT * FROM history ORDER BY id DESC", conn)
-            return df
-        except:
-            return pd.DataFrame()
-        finally:
-            conn.close()
+    try:
+        return pd.read_sql_query("SELECT * FROM history ORDER BY id DESC", _reader())
+    except:
+        return pd.DataFrame()
 
 def clear_history():
-    with db_lock:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("DELETE FROM history")
-        conn.commit()
-        conn.close()
+    def _clear(conn):
+        # Trigger sinkronisasi (FTS, keyword index) dilepas sementara: mengosongkan semua tabel
+        # sekaligus jauh lebih cepat daripada menjalankan trigger per baris. DDL ikut transaksi.
+        triggers = conn.execute("SELECT name, sql FROM sqlite_master WHERE type='trigger' AND tbl_name IN ('history', 'asset_keywords')").fetchall()
+        for name, _ in triggers: conn.execute(f"DROP TRIGGER {name}")
+        conn.execute("DELETE FROM history")
+        for table in ("asset_keywords", "keyword_stats", "content_index"):
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone():
+                conn.execute(f"DELETE FROM {table}")
+        if FTS_ENABLED: conn.execute("INSERT INTO history_fts(history_fts) VALUES ('delete-all')")
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='file_telemetry'").fetchone():
+            conn.execute("UPDATE file_telemetry SET history_id = NULL WHERE history_id IS NOT NULL")
+        for _, sql in triggers: conn.execute(sql)
+    submit_write(_clear, wait=True)
 
 def add_prompt_history(idea, style, model, result):
-    with db_lock:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        try:
-            c.execute('''
-                INSERT INTO prompt_history (timestamp, idea, style, model, generated_result)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (ts, idea, style, model, result))
-            conn.commit()
-        except Exception as e:
-            print(f"DB Prompt Insert Error: {e}")
-        finally:
-            conn.close()
+    ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    def _insert(conn):
+        conn.execute('''
+            INSERT INTO prompt_history (timestamp, idea, style, model, generated_result)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (ts, idea, style, model, result))
+    try:
+        submit_write(_insert, wait=True)
+    except Exception as e:
+        print(f"DB Prompt Insert Error: {e}")
 
 def get_prompt_history_df():
-    with db_lock:
-        conn = sqlite3.connect(DB_FILE)
-        try:
-            df = pd.read_sql_query("SELECT * FROM prompt_history ORDER BY id DESC", conn)
-            return df
-        except:
-            return pd.DataFrame()
-        finally:
-            conn.close()
+    try:
+        return pd.read_sql_query("SELECT * FROM prompt_history ORDER BY id DESC", _reader())
+    except:
+        return pd.DataFrame()
 
 def clear_prompt_history():
-    with db_lock:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("DELETE FROM prompt_history")
-        conn.commit()
-        conn.close()
+    submit_write(lambda conn: conn.execute("DELETE FROM prompt_history"), wait=True)
 
 def get_recent_history(limit=5):
-    with db_lock:
-        conn = sqlite3.connect(DB_FILE)
-        conn.row_factory = sqlite3.Row
-        try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM history ORDER BY id DESC LIMIT ?", (limit,))
-            rows = cursor.fetchall()
-            return rows
-        except: return []
-        finally: conn.close()
\ No newline at end of file
+    try:
+        cursor = _reader().cursor()
+        cursor.execute("SELECT * FROM history ORDER BY id DESC LIMIT ?", (limit,))
+        return cursor.fetchall()
+    except: return []
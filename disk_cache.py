@@ -0,0 +1,106 @@
+# disk_cache.py
+"""
+Cache file di disk dengan kunci konten (hash) dan batas ukuran total (eviksi LRU).
+
+Layout: <root>/<2 huruf awal key>/<key><suffix>. Waktu akses disimpan di mtime file
+(os.utime saat hit), jadi urutan LRU tetap benar setelah aplikasi di-restart.
+Index ukuran/akses dibangun sekali dari disk saat cache pertama kali dipakai.
+"""
+import os
+import time
+import tempfile
+import threading
+
+class DiskLRUCache:
+    def __init__(self, root, max_bytes, suffix=""):
+        self.root = root
+        self.max_bytes = int(max_bytes)
+        self.suffix = suffix
+        self.lock = threading.Lock()
+        self._index = None   # key -> [size, last_access]
+        self._total = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + self.suffix)
+
+    def _load_index(self):
+        if self._index is not None: return
+        self._index, self._total = {}, 0
+        if not os.path.isdir(self.root): return
+        for shard in os.scandir(self.root):
+            if not shard.is_dir(): continue
+            for entry in os.scandir(shard.path):
+                if not entry.is_file() or not entry.name.endswith(self.suffix) or entry.name.startswith("."): continue
+                st = entry.stat()
+                key = entry.name[:len(entry.name) - len(self.suffix)] if self.suffix else entry.name
+                self._index[key] = [st.st_size, st.st_mtime]
+                self._total += st.st_size
+
+    # --- 1. API ---
+
+    def get(self, key):
+        """Path file cache jika ada (dan tandai sebagai baru diakses), selain itu None."""
+        path = self._path(key)
+        with self.lock:
+            self._load_index()
+            meta = self._index.get(key)
+            if meta is None or not os.path.exists(path):
+                if meta is not None:
+                    self._total -= meta[0]; del self._index[key]
+                self.misses += 1
+                return None
+            now = time.time()
+            meta[1] = now
+            self.hits += 1
+        try: os.utime(path, (now, now))
+        except OSError: pass
+        return path
+
+    def put(self, key, data):
+        """Simpan bytes secara atomik (tmp + rename). Return path."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as f: f.write(data)
+            os.replace(tmp, path)
+        except Exception:
+            try: os.remove(tmp)
+            except OSError: pass
+            raise
+        with self.lock:
+            self._load_index()
+            old = self._index.get(key)
+            if old: self._total -= old[0]
+            self._index[key] = [len(data), time.time()]
+            self._total += len(data)
+            self._evict_locked(keep=key)
+        return path
+
+    def discard(self, key):
+        with self.lock:
+            self._load_index()
+            meta = self._index.pop(key, None)
+            if meta: self._total -= meta[0]
+        try: os.remove(self._path(key))
+        except OSError: pass
+
+    def _evict_locked(self, keep=None):
+        if self._total <= self.max_bytes: return
+        # Buang yang paling lama tidak diakses sampai turun ke 90% kuota (hindari eviksi tiap put)
+        target = self.max_bytes * 0.9
+        for key, (size, _) in sorted(self._index.items(), key=lambda kv: kv[1][1]):
+            if self._total <= target: break
+            if key == keep: continue  # entry yang baru ditulis selalu dipertahankan
+            try: os.remove(self._path(key))
+            except OSError: pass
+            del self._index[key]
+            self._total -= size
+            self.evictions += 1
+
+    def get_stats(self):
+        with self.lock:
+            self._load_index()
+            return {"entries": len(self._index), "bytes": self._total, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
@@ -0,0 +1,321 @@
+# exiftool_pool.py
+"""
+Pool proses ExifTool `-stay_open` yang hidup selama aplikasi berjalan.
+
+Sebelumnya setiap file memicu `exiftool.ExifToolHelper` baru (startup Perl per gambar).
+Di sini beberapa proses dibuka sekali, lalu penulisan metadata dikirim per batch lewat
+argfile (satu blok `-execute` per file) dengan laporan sukses/gagal per file.
+"""
+import os
+import sys
+import time
+import atexit
+import queue
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from config import EXIFTOOL_PATH, BASE_WORK_DIR
+
+# Parameter default yang sama dengan pemanggilan set_tags() sebelumnya
+DEFAULT_WRITE_PARAMS = ["-overwrite_original", "-codedcharacterset=utf8", "-sep", ", "]
+MAX_FILES_PER_ARGFILE = 64
+
+# --- 1. DISK-AWARE SIZING ---
+
+def _is_wsl_mount(path):
+    # Drive Windows di WSL (/mnt/c, /mnt/d) diakses lewat 9P: IO paralel justru saling antre
+    return sys.platform.startswith("linux") and os.path.abspath(path).startswith("/mnt/")
+
+def _is_rotational(path):
+    """True jika path berada di HDD (Linux: /sys/dev/block/MAJ:MIN/queue/rotational)."""
+    try:
+        st_dev = os.stat(path).st_dev
+        base = f"/sys/dev/block/{os.major(st_dev)}:{os.minor(st_dev)}"
+        for cand in (os.path.join(base, "queue", "rotational"), os.path.join(base, "..", "queue", "rotational")):
+            if os.path.exists(cand):
+                with open(cand) as f: return f.read().strip() == "1"
+    except Exception: pass
+    return False
+
+def suggest_pool_size(target_dir=None):
+    """
+    Ukuran pool mengikuti disk tujuan, bukan kuota API:
+    HDD / drive WSL (9P) -> 1 proses, SSD lokal -> hingga 4 proses.
+    """
+    path = target_dir if target_dir and os.path.exists(target_dir) else BASE_WORK_DIR
+    if _is_wsl_mount(path) or _is_rotational(path): return 1
+    return max(1, min(4, (os.cpu_count() or 2) // 2))
+
+def resolve_executable():
+    if EXIFTOOL_PATH: return EXIFTOOL_PATH
+    return "exiftool" if os.name != 'nt' else None
+
+# --- 2. SINGLE STAY-OPEN WORKER ---
+
+class ExifToolWorker:
+    """Satu proses `exiftool -stay_open True -@ -` dengan protokol {readyN}."""
+
+    def __init__(self, executable):
+        self.executable = executable
+        self.proc = None
+        self.seq = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        if self.proc and self.proc.poll() is None: return
+        kwargs = {}
+        if os.name == 'nt': kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
+        self.proc = subprocess.Popen(
+            [self.executable, "-stay_open", "True", "-@", "-"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            encoding="utf-8", errors="replace", bufsize=1, **kwargs
+        )
+
+    def _read_until(self, stream, marker):
+        lines = []
+        while True:
+            line = stream.readline()
+            if not line: raise RuntimeError("ExifTool process terminated unexpectedly")
+            if line.rstrip("\r\n") == marker: return "".join(lines)
+            lines.append(line)
+
+    def execute(self, args):
+        """
+        Kirim satu perintah, return (stdout, stderr). stderr dikuras di thread terpisah selama stdout
+        dibaca: chunk dengan banyak warning tidak boleh memenuhi pipe stderr lalu membuat kedua proses macet.
+        Jika pembacaan terputus, proses ditutup supaya perintah berikutnya tidak membaca sisa output lama.
+        """
+        with self.lock:
+            self.start()
+            self.seq += 1
+            marker = f"{{ready{self.seq}}}"
+            payload = "\n".join(args) + f"\n-echo4\n{marker}\n-execute{self.seq}\n"
+            err_box = {}
+            def _drain_stderr(stream):
+                try: err_box["err"] = self._read_until(stream, marker)
+                except Exception as e: err_box["exc"] = e
+            reader = threading.Thread(target=_drain_stderr, args=(self.proc.stderr,), name="exiftool-stderr", daemon=True)
+            try:
+                reader.start()
+                self.proc.stdin.write(payload)
+                self.proc.stdin.flush()
+                out = self._read_until(self.proc.stdout, marker)
+                reader.join()
+            except BaseException:
+                self.close()
+                raise
+            if "exc" in err_box:
+                self.close()
+                raise err_box["exc"]
+            return out, err_box["err"]
+
+    def close(self):
+        if not self.proc: return
+        try:
+            if self.proc.poll() is None:
+                self.proc.stdin.write("-stay_open\nFalse\n")
+                self.proc.stdin.flush()
+                self.proc.wait(timeout=5)
+        except Exception:
+            try: self.proc.kill()
+            except Exception: pass
+        self.proc = None
+
+# --- 3. ARGFILE BATCH HELPERS ---
+
+def _clean_arg(value):
+    # Satu argumen = satu baris di argfile
+    return str(value).replace("\r", " ").replace("\n", " ")
+
+def build_tag_args(tags):
+    """Konversi dict tag -> argumen `-TAG=value` (list ditulis satu per item, seperti set_tags)."""
+    args = []
+    for tag, value in tags.items():
+        if isinstance(value, (list, tuple)):
+            for v in value: args.append(f"-{tag}={_clean_arg(v)}")
+        else:
+            args.append(f"-{tag}={_clean_arg(value)}")
+    return args
+
+def _item_marker(idx):
+    return f"{{item{idx}}}"
+
+def _split_by_markers(text, count):
+    """Pisahkan output gabungan per file berdasarkan marker {itemN} (dari -echo1/-echo2)."""
+    chunks = [""] * count
+    current = None
+    for line in text.splitlines():
+        s = line.strip()
+        if s.startswith("{item") and s.endswith("}"):
+            try: current = int(s[5:-1]); continue
+            except ValueError: pass
+        if s == "{ready}": continue  # marker -execute internal di mode stay_open
+        if current is not None and 0 <= current < count:
+            chunks[current] += line + "\n"
+    return chunks
+
+def _parse_item_result(out, err):
+    errors = [l.strip() for l in err.splitlines() if l.strip().startswith("Error")]
+    warnings = [l.strip() for l in err.splitlines() if l.strip().startswith("Warning")]
+    written = ("files updated" in out or "files created" in out) and not out.strip().startswith("0 image files updated")
+    unchanged = "unchanged" in out
+    ok = not errors and (written or unchanged)
+    msg = "; ".join(errors) if errors else ("; ".join(warnings) if warnings else out.strip())
+    return ok, msg
+
+# --- 4. POOL ---
+
+class ExifToolPool:
+    """Pool worker ExifTool + metrik throughput penulisan metadata."""
+
+    def __init__(self, size=1, executable=None):
+        self.executable = executable or resolve_executable()
+        self.workers = []
+        self.idle = queue.Queue()
+        self.stats_lock = threading.Lock()
+        self.stats = {"files_ok": 0, "files_failed": 0, "batches": 0, "bytes": 0, "busy_seconds": 0.0}
+        self.resize(size)
+
+    @property
+    def size(self):
+        return len(self.workers)
+
+    def resize(self, size):
+        size = max(1, int(size))
+        while len(self.workers) < size:
+            w = ExifToolWorker(self.executable)
+            self.workers.append(w)
+            self.idle.put(w)
+        # Pengurangan: cukup tutup worker idle yang berlebih
+        while len(self.workers) > size:
+            try: w = self.idle.get_nowait()
+            except queue.Empty: break
+            self.workers.remove(w)
+            w.close()
+
+    def _write_chunk(self, worker, chunk):
+        """Tulis satu chunk (<= MAX_FILES_PER_ARGFILE) lewat satu argfile."""
+        lines = []
+        for idx, item in enumerate(chunk):
+            if idx > 0: lines.append("-execute")
+            lines += ["-echo1", _item_marker(idx), "-echo2", _item_marker(idx)]
+            lines += item.get("params", DEFAULT_WRITE_PARAMS)
+            lines += build_tag_args(item["tags"])
+            if item.get("target"):
+                lines += ["-o", _clean_arg(item["target"])]
+            lines.append(_clean_arg(item["path"]))
+
+        fd, argfile = tempfile.mkstemp(prefix="et_args_", suffix=".txt", dir=BASE_WORK_DIR if os.path.isdir(BASE_WORK_DIR) else None)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f: f.write("\n".join(lines) + "\n")
+            out, err = worker.execute(["-@", argfile])
+        finally:
+            try: os.remove(argfile)
+            except OSError: pass
+
+        outs = _split_by_markers(out, len(chunk))
+        errs = _split_by_markers(err, len(chunk))
+        results = []
+        for idx, item in enumerate(chunk):
+            ok, msg = _parse_item_result(outs[idx], errs[idx])
+            results.append({"path": item["path"], "target": item.get("target"), "ok": ok, "msg": msg})
+        return results
+
+    def _run_on_worker(self, chunks):
+        worker = self.idle.get()
+        try:
+            results = []
+            for chunk in chunks:
+                try: results += self._write_chunk(worker, chunk)
+                except Exception as e:
+                    # Proses mati / protokol rusak: restart worker, tandai chunk gagal
+                    worker.close()
+                    results += [{"path": it["path"], "target": it.get("target"), "ok": False, "msg": str(e)} for it in chunk]
+            return results
+        finally:
+            self.idle.put(worker)
+
+    def write_batch(self, items):
+        """
+        items: list dict {"path", "tags", opsional "target" (tulis ke file baru via -o), "params"}.
+        Return list hasil per file dengan urutan yang sama: {"path", "target", "ok", "msg"}.
+        """
+        if not items: return []
+        if not self.executable:
+            return [{"path": it["path"], "target": it.get("target"), "ok": False, "msg": "ExifTool not found"} for it in items]
+
+        start = time.perf_counter()
+        # Bagi rata ke worker, lalu potong per argfile
+        n = min(self.size, len(items))
+        shards = [items[i::n] for i in range(n)]
+        shard_chunks = [[s[j:j + MAX_FILES_PER_ARGFILE] for j in range(0, len(s), MAX_FILES_PER_ARGFILE)] for s in shards]
+
+        if n == 1:
+            shard_results = [self._run_on_worker(shard_chunks[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=n) as exe:
+                shard_results = list(exe.map(self._run_on_worker, shard_chunks))
+
+        # Kembalikan ke urutan input
+        ordered = [None] * len(items)
+        for i, res_list in enumerate(shard_results):
+            for j, r in enumerate(res_list): ordered[i + j * n] = r
+
+        elapsed = time.perf_counter() - start
+        with self.stats_lock:
+            self.stats["batches"] += 1
+            self.stats["busy_seconds"] += elapsed
+            for r in ordered:
+                if r["ok"]:
+                    self.stats["files_ok"] += 1
+                    try: self.stats["bytes"] += os.path.getsize(r["target"] or r["path"])
+                    except OSError: pass
+                else:
+                    self.stats["files_failed"] += 1
+        return ordered
+
+    def execute(self, args):
+        """Perintah mentah (mis. baca -json) di worker yang sedang idle."""
+        worker = self.idle.get()
+        try: return worker.execute(args)
+        except Exception:
+            # Protokol terputus: restart worker (sama seperti _run_on_worker) agar sisa output tidak terbaca caller berikutnya
+            worker.close()
+            raise
+        finally: self.idle.put(worker)
+
+    def get_stats(self):
+        with self.stats_lock:
+            s = dict(self.stats)
+        total = s["files_ok"] + s["files_failed"]
+        s["workers"] = self.size
+        s["files_per_sec"] = total / s["busy_seconds"] if s["busy_seconds"] > 0 else 0.0
+        s["mb_per_sec"] = s["bytes"] / 1_048_576 / s["busy_seconds"] if s["busy_seconds"] > 0 else 0.0
+        return s
+
+    def close(self):
+        for w in self.workers: w.close()
+
+# --- 5. SHARED POOL (milik aplikasi, dipakai lintas rerun Streamlit) ---
+
+_shared_pool = None
+_shared_lock = threading.Lock()
+
+def get_shared_pool(size=None):
+    """Pool bersama; size hanya dipakai saat pool pertama kali dibuat (tidak di-resize per panggilan)."""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = ExifToolPool(size or suggest_pool_size())
+            atexit.register(_shared_pool.close)
+        return _shared_pool
+
+def size_shared_pool(target_dir=None):
+    """Sesuaikan ukuran pool bersama dengan disk tujuan. Dipanggil sekali per batch/operasi, bukan per flush."""
+    size = suggest_pool_size(target_dir)
+    pool = get_shared_pool(size)
+    with _shared_lock:
+        if size != pool.size: pool.resize(size)
+    return pool
@@ -0,0 +1,88 @@
+# export_engine.py
+"""
+Export seluruh katalog (tabel history) ke layout CSV agency dan/atau Parquet.
+
+Baris di-stream dari SQLite per chunk (database.iter_history) dan ditulis langsung ke
+semua format yang dipilih dalam satu pass, jadi memori konstan berapa pun ukuran katalog.
+Filter sama dengan halaman History (search, category, date_from/date_to) plus output_path.
+Parquet opsional: butuh pyarrow (pip install pyarrow).
+"""
+import os
+import time
+import datetime
+
+from database import iter_history, HISTORY_COLUMNS, EXPORT_CHUNK_ROWS
+from report_writer import ReportWriter, AGENCIES, record_from_history
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PARQUET = True
+except ImportError:
+    pa = pq = None
+    HAS_PARQUET = False
+
+PARQUET = "Parquet"
+EXPORT_FORMATS = list(AGENCIES) + [PARQUET]
+PARQUET_COLUMNS = HISTORY_COLUMNS + ["batch_id"]
+
+class _ParquetSink:
+    """Tulis baris history ke satu file Parquet, satu row group per chunk (.part sampai close)."""
+    def __init__(self, path, chunk_rows):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.schema = pa.schema([(c, pa.int64() if c == "id" else pa.string()) for c in PARQUET_COLUMNS])
+        self.writer = pq.ParquetWriter(path + ".part", self.schema, compression="zstd")
+        self.buffer = []
+
+    def add(self, row):
+        self.buffer.append(row)
+        if len(self.buffer) >= self.chunk_rows: self.flush()
+
+    def flush(self):
+        if not self.buffer: return
+        self.writer.write_table(pa.Table.from_pylist(self.buffer, schema=self.schema))
+        self.buffer.clear()
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        os.replace(self.path + ".part", self.path)
+        return self.path
+
+    def abort(self):
+        try: self.writer.close()
+        except Exception: pass
+        try: os.remove(self.path + ".part")
+        except OSError: pass
+
+def export_catalog(out_dir, formats=None, filters=None, chunk_rows=EXPORT_CHUNK_ROWS, progress=None):
+    """
+    formats: subset EXPORT_FORMATS (default semua agency CSV). progress(rows): callback per chunk.
+    Return dict {paths: {format: path}, rows, seconds, rows_per_sec}.
+    """
+    formats = [f for f in (formats or list(AGENCIES)) if f in EXPORT_FORMATS]
+    if PARQUET in formats and not HAS_PARQUET:
+        raise RuntimeError("Export Parquet butuh pyarrow (pip install pyarrow).")
+    os.makedirs(out_dir, exist_ok=True)
+    prefix = f"Catalog_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    agencies = [f for f in formats if f in AGENCIES]
+    csv_writer = ReportWriter(out_dir, prefix, agencies, flush_rows=chunk_rows) if agencies else None
+    parquet = _ParquetSink(os.path.join(out_dir, f"{prefix}.parquet"), chunk_rows) if PARQUET in formats else None
+
+    t0 = time.perf_counter()
+    rows = 0
+    try:
+        for row in iter_history(filters, chunk_rows):
+            if csv_writer: csv_writer.add(record_from_history(row))
+            if parquet: parquet.add(row)
+            rows += 1
+            if progress and rows % chunk_rows == 0: progress(rows)
+        paths = csv_writer.finalize() if csv_writer else {}
+        if parquet: paths[PARQUET] = parquet.close()
+    except Exception:
+        if csv_writer: csv_writer.abort()
+        if parquet: parquet.abort()
+        raise
+    seconds = time.perf_counter() - t0
+    return {"paths": paths, "rows": rows, "seconds": seconds, "rows_per_sec": rows / seconds if seconds > 0 else 0.0}
@@ -0,0 +1,124 @@
+# finalize.py
+"""
+Perencana finalisasi output: memilih cara termurah memindahkan/menyalin file
+berdasarkan filesystem sumber & tujuan, dan mencatat jumlah byte yang benar-benar ditulis.
+
+Alur lama: copy2 ke TEMP_DIR -> rewrite ExifTool (salinan penuh lagi) -> move ke output
+(sering lintas filesystem) -> move original ke done/. File 200MB bisa tertulis 3-4 kali.
+Sekarang penulis metadata menulis langsung ke tujuan (satu kali tulis), sedangkan
+file yang tidak perlu di-rewrite memakai reflink/hardlink/rename jika memungkinkan.
+"""
+import os
+import shutil
+
+# Strategi output
+DIRECT_WRITE = "direct_write"   # penulis metadata membaca sumber, menulis file baru di tujuan
+REFLINK = "reflink"             # clone copy-on-write (btrfs/xfs), 0 byte data
+HARDLINK = "hardlink"           # link ke inode yang sama, 0 byte (hanya jika tidak ada edit in-place)
+RENAME = "rename"               # perpindahan di device yang sama, 0 byte
+COPY = "copy"                   # salinan penuh
+
+FICLONE = 0x40049409  # ioctl Linux untuk reflink
+
+def _device_of(path):
+    """st_dev untuk file atau folder (folder induk jika file belum ada)."""
+    probe = path
+    while probe and not os.path.exists(probe):
+        parent = os.path.dirname(probe)
+        if parent == probe: break
+        probe = parent
+    try: return os.stat(probe).st_dev
+    except OSError: return None
+
+def same_device(a, b):
+    da, db = _device_of(a), _device_of(b)
+    return da is not None and da == db
+
+def try_reflink(src, dst):
+    """
+    Clone CoW via FICLONE. Return True jika berhasil (Linux + filesystem yang mendukung).
+    dst dibuat eksklusif: file yang sudah ada tidak pernah ditimpa, dan saat gagal hanya
+    file yang dibuat oleh panggilan ini yang dihapus.
+    """
+    if os.name == 'nt': return False
+    try: import fcntl
+    except ImportError: return False
+    created = False
+    try:
+        with open(src, "rb") as fs, open(dst, "xb") as fd:
+            created = True
+            fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+        shutil.copystat(src, dst)
+        return True
+    except OSError:
+        if created:
+            try: os.remove(dst)
+            except OSError: pass
+        return False
+
+# --- 1. PLANNER ---
+
+def unique_output_name(dest_dir, name, reserved=()):
+    """
+    Nama di dest_dir yang belum dipakai file lain (termasuk sidecar .xmp) dan belum dipesan
+    item lain di batch yang sama: foto.jpg -> foto_1.jpg, foto_2.jpg, ...
+    """
+    stem, ext = os.path.splitext(name)
+    candidate, n = name, 0
+    while True:
+        path = os.path.join(dest_dir, candidate)
+        if path not in reserved and not os.path.exists(path) and not os.path.exists(os.path.splitext(path)[0] + ".xmp"):
+            return candidate
+        n += 1
+        candidate = f"{stem}_{n}{ext}"
+
+def plan_finalize(src_path, dest_path, done_path=None, rewrite=True, allow_hardlink=False):
+    """
+    Tentukan strategi untuk output dan untuk file original.
+    - rewrite=True  : metadata di-embed -> DIRECT_WRITE (sumber tidak diubah, tujuan ditulis sekali).
+    - rewrite=False : konten identik -> REFLINK/HARDLINK jika satu device, selain itu COPY.
+    Original dipindah ke done/ dengan RENAME jika satu device, selain itu COPY (+hapus sumber).
+    """
+    plan = {"output": DIRECT_WRITE, "original": None}
+    if not rewrite:
+        if same_device(src_path, dest_path):
+            plan["output"] = [REFLINK, HARDLINK, COPY] if allow_hardlink else [REFLINK, COPY]
+        else:
+            plan["output"] = [COPY]
+    if done_path:
+        plan["original"] = RENAME if same_device(src_path, done_path) else COPY
+    return plan
+
+# --- 2. EXECUTION ---
+
+def place_output(src_path, dest_path, plan):
+    """Jalankan strategi output non-rewrite. Return (strategi_terpakai, bytes_written)."""
+    for strategy in plan["output"]:
+        if strategy == REFLINK and try_reflink(src_path, dest_path):
+            return REFLINK, 0
+        if strategy == HARDLINK:
+            try:
+                os.link(src_path, dest_path)
+                return HARDLINK, 0
+            except OSError: continue
+        if strategy == COPY:
+            shutil.copy2(src_path, dest_path)
+            return COPY, os.path.getsize(dest_path)
+    raise RuntimeError(f"No finalize strategy succeeded for {src_path}")
+
+def relocate_original(src_path, done_path, plan):
+    """Pindahkan original ke done/. Return bytes_written (0 untuk rename)."""
+    if plan.get("original") == RENAME:
+        try:
+            os.replace(src_path, done_path)
+            return 0
+        except OSError:
+            pass  # mis. beda mount point meski st_dev sama -> fallback copy
+    size = os.path.getsize(src_path)
+    shutil.move(src_path, done_path)
+    return size
+
+def describe(result):
+    """Ringkasan singkat untuk log UI, mis. 'direct_write+rename · 12.3 MB ditulis'."""
+    mb = result.get("bytes_written", 0) / 1_048_576
+    return f"{result.get('output')}+{result.get('original') or '-'} · {mb:.1f} MB ditulis"
@@ -0,0 +1,65 @@
+# fs_cache.py
+"""
+Cache keberadaan/stat file untuk kartu gallery.
+
+Di WSL, setiap os.stat ke /mnt/<drive> adalah round-trip 9P yang lambat, dan gallery
+dulu melakukan os.path.exists per kartu di setiap rerun Streamlit. Sekarang semua path
+satu halaman dicek sekaligus secara paralel, hasilnya disimpan dengan TTL pendek, dan
+operasi move/rename milik aplikasi sendiri langsung meng-invalidasi entry terkait.
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+FS_CACHE_TTL = 15.0       # detik; perubahan dari luar aplikasi terlihat paling lambat setelah ini
+FS_CHECK_WORKERS = 16     # stat paralel (I/O-bound, aman walau ada GIL)
+
+_lock = threading.Lock()
+_entries = {}             # path -> (expires_at, stat_result | None)
+_executor = None
+
+def _stat(path):
+    try: return os.stat(path)
+    except OSError: return None
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=FS_CHECK_WORKERS, thread_name_prefix="fs-stat")
+        return _executor
+
+def check_paths(paths):
+    """Stat semua path dalam satu pass paralel (yang belum ter-cache/kedaluwarsa saja). Return {path: stat|None}."""
+    now = time.monotonic()
+    result, missing = {}, []
+    with _lock:
+        for p in dict.fromkeys(paths):
+            hit = _entries.get(p)
+            if hit and hit[0] > now: result[p] = hit[1]
+            else: missing.append(p)
+    if missing:
+        stats = list(_get_executor().map(_stat, missing)) if len(missing) > 1 else [_stat(missing[0])]
+        expires = time.monotonic() + FS_CACHE_TTL
+        with _lock:
+            if len(_entries) > 20000: _entries.clear()
+            for p, st in zip(missing, stats):
+                _entries[p] = (expires, st)
+                result[p] = st
+    return result
+
+def get_stat(path):
+    return check_paths([path])[path]
+
+def exists(path):
+    return get_stat(path) is not None
+
+def invalidate(*paths):
+    """Panggil setelah aplikasi memindah/me-rename/menulis file (src dan dst)."""
+    with _lock:
+        for p in paths:
+            if p: _entries.pop(p, None)
+
+def clear():
+    with _lock: _entries.clear()
@@ -7,40 +7,16 @@ from PIL import Image, ImageStat
 from xml.sax.saxutils import escape  # [PENTING] Untuk keamanan XML
 
 # --- 1. GPU AUTO-DETECT ---
-try:
-    import cupy as cp
-    HAS_GPU = True
-    print("[INFO] NVIDIA GPU Detected: Acceleration Enabled")
-except ImportError:
-    import numpy as cp
-    HAS_GPU = False
-    print("[WARN] GPU Not Found: Running on CPU mode")
+# Deteksi CuPy & pemilihan CPU/GPU per operasi dipindah ke compute_backend
+# (benchmark sekali per ukuran input, bukan asumsi "ada CuPy = selalu GPU").
+from compute_backend import HAS_GPU, run_kernel
 
 # --- 2. SPEED OPTIMIZED BLUR DETECTION (FFT) ---
 
 def calculate_fft_score(img_array, size=30): 
     h, w = img_array.shape
     if h < size*2 or w < size*2: return 0.0
-    
-    (cX, cY) = (int(w / 2.0), int(h / 2.0))
-
-    if HAS_GPU:
-        gpu_img = cp.asarray(img_array)
-        fft = cp.fft.fft2(gpu_img)
-        fftShift = cp.fft.fftshift(fft)
-        fftShift[cY - size:cY + size, cX - size:cX + size] = 0 
-        fftShift = cp.fft.ifftshift(fftShift)
-        recon = cp.fft.ifft2(fftShift)
-        magnitude = cp.log(cp.abs(recon) + 1) 
-        return float(cp.mean(magnitude)) * 20
-    else:
-        fft = np.fft.fft2(img_array)
-        fftShift = np.fft.fftshift(fft)
-        fftShift[cY - size:cY + size, cX - size:cX + size] = 0
-        fftShift = np.fft.ifftshift(fftShift)
-        recon = np.fft.ifft2(fftShift)
-        magnitude = np.log(np.abs(recon) + 1)
-        return np.mean(magnitude) * 20
+    return run_kernel("fft_blur", img_array)
 
 def detect_blur(image_path, threshold=0.0):
     if threshold <= 0: return 0.0
@@ -109,13 +85,7 @@ def analyze_background_type(image_path):
         
         samples_cpu = np.concatenate([c.reshape(-1, 3) for c in corners])
 
-        if HAS_GPU:
-            samples_gpu = cp.asarray(samples_cpu)
-            std_dev = float(cp.std(samples_gpu, axis=0).mean())
-            mean_color = cp.asnumpy(cp.mean(samples_gpu, axis=0))
-        else:
-            std_dev = np.std(samples_cpu, axis=0).mean()
-            mean_color = np.mean(samples_cpu, axis=0)
+        std_dev, mean_color = run_kernel("std_mean", samples_cpu.astype(np.float64))
         
         if std_dev < 20.0: 
             if mean_color[0]>240 and mean_color[1]>240 and mean_color[2]>240: 
@@ -131,29 +101,35 @@ def analyze_background_type(image_path):
 
 # --- 4. HELPERS ---
 
-def create_xmp_sidecar(path_without_ext, title, desc, keywords):
+def build_xmp_packet(title, desc, keywords, rating=None):
     """
-    [SECURE VERSION] Membuat file XMP dengan XML Escaping.
+    [SECURE VERSION] Menyusun paket XMP (dc:title, dc:description, dc:subject) dengan XML Escaping.
     Mencegah error jika text mengandung karakter '&', '<', '>'.
+    Dipakai untuk sidecar .xmp maupun embed langsung ke JPEG (jpeg_metadata).
     """
-    try:
-        # 1. Bersihkan input dari karakter ilegal XML
-        safe_title = escape(str(title)) if title else ""
-        safe_desc = escape(str(desc)) if desc else ""
-        
-        # 2. Loop keywords dan escape satu per satu
-        safe_keywords_list = []
-        if keywords:
-            for k in keywords:
-                safe_k = escape(str(k).strip())
-                if safe_k:
-                    safe_keywords_list.append(f"<rdf:li>{safe_k}</rdf:li>")
-        
-        rdf_keywords = "\n".join(safe_keywords_list)
+    # 1. Bersihkan input dari karakter ilegal XML
+    safe_title = escape(str(title)) if title else ""
+    safe_desc = escape(str(desc)) if desc else ""
+    
+    # 2. Loop keywords dan escape satu per satu
+    safe_keywords_list = []
+    if keywords:
+        for k in keywords:
+            safe_k = escape(str(k).strip())
+            if safe_k:
+                safe_keywords_list.append(f"<rdf:li>{safe_k}</rdf:li>")
+    
+    rdf_keywords = "\n".join(safe_keywords_list)
+    rating_attr = f" xmlns:xmp='http://ns.adobe.com/xap/1.0/' xmp:Rating='{int(rating)}'" if rating is not None else ""
+
+    # 3. Construct XML
+    return f"""<?xpacket begin='' id='W5M0MpCehiHzreSzNTczkc9d'?>
+<x:xmpmeta xmlns:x='adobe:ns:meta/'><rdf:RDF xmlns:rdf='http://www.w3.org/1999/02/22-rdf-syntax-ns#'><rdf:Description rdf:about='' xmlns:dc='http://purl.org/dc/elements/1.1/'{rating_attr}><dc:title><rdf:Alt><rdf:li xml:lang='x-default'>{safe_title}</rdf:li></rdf:Alt></dc:title><dc:description><rdf:Alt><rdf:li xml:lang='x-default'>{safe_desc}</rdf:li></rdf:Alt></dc:description><dc:subject><rdf:Bag>{rdf_keywords}</rdf:Bag></dc:subject></rdf:Description></rdf:RDF></x:xmpmeta><?xpacket end='w'?>"""
 
-        # 3. Construct XML
-        xmp = f"""<?xpacket begin='' id='W5M0MpCehiHzreSzNTczkc9d'?>
-<x:xmpmeta xmlns:x='adobe:ns:meta/'><rdf:RDF xmlns:rdf='http://www.w3.org/1999/02/22-rdf-syntax-ns#'><rdf:Description rdf:about='' xmlns:dc='http://purl.org/dc/elements/1.1/'><dc:title><rdf:Alt><rdf:li xml:lang='x-default'>{safe_title}</rdf:li></rdf:Alt></dc:title><dc:description><rdf:Alt><rdf:li xml:lang='x-default'>{safe_desc}</rdf:li></rdf:Alt></dc:description><dc:subject><rdf:Bag>{rdf_keywords}</rdf:Bag></dc:subject></rdf:Description></rdf:RDF></x:xmpmeta><?xpacket end='w'?>"""
+def create_xmp_sidecar(path_without_ext, title, desc, keywords):
+    """Membuat file sidecar .xmp di samping file aset."""
+    try:
+        xmp = build_xmp_packet(title, desc, keywords)
         
         output_path = f"{path_without_ext}.xmp"
         with open(output_path, "w", encoding="utf-8") as f: 
@@ -282,13 +258,9 @@ def compute_dhash(image_path, hash_size=16):
         # Structure Hash (dHash Grayscale 16-bit)
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         resized_gray = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
-        diff = resized_gray[:, 1:] > resized_gray[:, :-1]
         
-        # Konversi array boolean ke integer
-        # Flatten dan hitung decimal value
-        structure_hash = 0
-        for i, v in enumerate(diff.flatten()):
-            if v: structure_hash += (2 ** i)
+        # Konversi array boolean ke integer (bit i = 2**i, backend via compute_backend)
+        structure_hash = run_kernel("dhash", resized_gray)
         
         # Color Signature (9x9 Low Res Grid - Flattened)
         resized_color = cv2.resize(img, (9, 9), interpolation=cv2.INTER_AREA)
@@ -0,0 +1,226 @@
+# job_manager.py
+"""
+Job latar belakang untuk batch panjang (Metadata Auto).
+
+Batch dulu berjalan di thread script Streamlit: rerun, klik widget, atau tab ditutup
+memutus/menelantarkan loop, dan "Stop" mematikan seluruh proses (os.kill).
+Sekarang batch berjalan di thread daemon milik proses server; UI hanya mem-poll status.
+
+- Setiap job punya ID, counter progres, throughput/ETA, dan ring buffer event terakhir
+  (JOB_EVENT_RING) untuk UI; log lengkap per file ditulis ke JOB_LOG_DIR/<id>.log.
+  Snapshot disimpan ke tabel `jobs` (throttled) sehingga riwayat/progres tetap ada setelah restart.
+- Pause/resume/cancel kooperatif: job memeriksa pause_event/cancel_event sebelum memulai
+  item baru, request yang sedang berjalan diselesaikan (drain) lalu hasilnya tetap difinalisasi.
+- Job yang masih "aktif" di DB saat proses baru start ditandai 'interrupted'.
+"""
+import os
+import json
+import time
+import uuid
+import datetime
+import threading
+import traceback
+from collections import deque
+
+from config import JOB_LOG_DIR, JOB_EVENT_RING
+from database import save_job, get_jobs, mark_interrupted_jobs
+
+QUEUED, RUNNING, PAUSED, CANCELLING = "queued", "running", "paused", "cancelling"
+DONE, CANCELLED, FAILED, INTERRUPTED, RESUMED = "done", "cancelled", "failed", "interrupted", "resumed"
+ACTIVE = (QUEUED, RUNNING, PAUSED, CANCELLING)
+PERSIST_INTERVAL = 1.0   # detik; batas frekuensi tulis snapshot progres ke DB
+SECRET_PARAMS = ("api_key",)
+
+def _now():
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def _public(value):
+    """Salinan params tanpa secret (api_key) di level mana pun, untuk disimpan ke DB."""
+    if isinstance(value, dict): return {k: _public(v) for k, v in value.items() if k not in SECRET_PARAMS}
+    return value
+
+class Job:
+    def __init__(self, kind, params, total=0):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.params = params
+        self.status = QUEUED
+        self.total = total
+        self.done = self.ok = self.skipped = self.failed = 0
+        self.message = ""
+        self.events = deque(maxlen=JOB_EVENT_RING)   # (jam, level, teks) terakhir untuk UI
+        self.log_path = os.path.join(JOB_LOG_DIR, f"{self.id}.log")
+        self._log_file = None
+        self._started = None      # monotonic saat mulai jalan
+        self._paused_at = None
+        self._paused_total = 0.0
+        self.result = {}
+        self.created_at = self.updated_at = _now()
+        self.lock = threading.Lock()
+        self.cancel_event = threading.Event()
+        self.pause_event = threading.Event()
+        self._last_persist = 0.0
+
+    # --- Dipanggil dari thread job ---
+
+    def log(self, level, text):
+        now = datetime.datetime.now()
+        with self.lock:
+            self.events.append((now.strftime("%H:%M:%S"), level, text))
+            try:
+                if self._log_file is None:
+                    os.makedirs(JOB_LOG_DIR, exist_ok=True)
+                    self._log_file = open(self.log_path, "a", encoding="utf-8")
+                self._log_file.write(f"{now:%Y-%m-%d %H:%M:%S}\t{level.upper()}\t{text}\n")
+            except OSError as e:
+                print(f"[JOBS] Log file gagal ditulis: {e}")
+
+    def close_log(self):
+        with self.lock:
+            if self._log_file is not None:
+                self._log_file.close(); self._log_file = None
+
+    def recent_events(self, n=None):
+        with self.lock:
+            events = list(self.events)
+        return events[-n:] if n else events
+
+    def count(self, ok=0, skipped=0, failed=0, done=None):
+        """Tambah counter. done default = jumlah ok+skipped+failed yang ditambahkan."""
+        with self.lock:
+            self.ok += ok; self.skipped += skipped; self.failed += failed
+            self.done += (ok + skipped + failed) if done is None else done
+        self.persist()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    # --- Snapshot & persistensi ---
+
+    def elapsed(self):
+        """Detik berjalan, tidak termasuk waktu pause."""
+        if self._started is None: return 0.0
+        paused = self._paused_total + (time.monotonic() - self._paused_at if self._paused_at else 0.0)
+        return max(0.0, time.monotonic() - self._started - paused)
+
+    def snapshot(self):
+        with self.lock:
+            snap = {"id": self.id, "kind": self.kind, "status": self.status, "total": self.total, "done": self.done,
+                    "ok": self.ok, "skipped": self.skipped, "failed": self.failed, "message": self.message,
+                    "created_at": self.created_at, "updated_at": self.updated_at, "result": dict(self.result),
+                    "log_path": self.log_path}
+        elapsed = self.elapsed()
+        snap["elapsed"] = elapsed
+        snap["rate"] = snap["done"] / elapsed if elapsed > 0 else 0.0   # file/detik
+        remaining = max(0, snap["total"] - snap["done"])
+        snap["eta"] = remaining / snap["rate"] if snap["rate"] > 0 else None
+        return snap
+
+    def persist(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_persist < PERSIST_INTERVAL: return
+        self._last_persist = now
+        self.updated_at = _now()
+        row = self.snapshot()
+        with self.lock:
+            if self._log_file is not None: self._log_file.flush()
+        row["params"] = json.dumps(_public(self.params), default=str)
+        save_job(row)
+
+    def _set_status(self, status, message=None):
+        with self.lock:
+            self.status = status
+            if message is not None: self.message = message
+        self.persist(force=True)
+
+# --- REGISTRY ---
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+_recovered = False
+
+def _recover_once():
+    """Sekali per proses: tandai job yang tertinggal dari proses sebelumnya."""
+    global _recovered
+    with _jobs_lock:
+        if _recovered: return
+        _recovered = True
+    try:
+        n = mark_interrupted_jobs()
+        if n: print(f"[JOBS] {n} job dari sesi sebelumnya ditandai 'interrupted'")
+    except Exception as e:
+        print(f"[JOBS] Gagal memulihkan status job: {e}")
+
+def _run(job, fn):
+    job._started = time.monotonic()
+    job._set_status(RUNNING)
+    try:
+        fn(job)
+        job._set_status(CANCELLED if job.cancelled else DONE)
+    except Exception as e:
+        traceback.print_exc()
+        job.log("error", f"Job gagal: {e}")
+        job._set_status(FAILED, str(e))
+    finally:
+        job.close_log()
+
+def start_job(kind, fn, params, total=0):
+    """Jalankan fn(job) di thread daemon. Return Job."""
+    _recover_once()
+    job = Job(kind, params, total)
+    with _jobs_lock:
+        _jobs[job.id] = job
+    job.persist(force=True)
+    threading.Thread(target=_run, args=(job, fn), name=f"job-{kind}-{job.id}", daemon=True).start()
+    return job
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+def active_jobs(kind=None):
+    with _jobs_lock:
+        return [j for j in _jobs.values() if j.status in ACTIVE and (kind is None or j.kind == kind)]
+
+def job_history(limit=20, kind=None):
+    """Riwayat dari DB (termasuk job proses sebelumnya); job yang hidup memakai snapshot in-memory."""
+    _recover_once()
+    rows = get_jobs(limit, kind)
+    for r in rows:
+        live = get_job(r["id"])
+        if live: r.update(live.snapshot())
+    return rows
+
+# --- KONTROL (dipanggil dari UI) ---
+
+def _unpause(job):
+    if job._paused_at is not None:
+        job._paused_total += time.monotonic() - job._paused_at
+        job._paused_at = None
+
+def pause_job(job_id):
+    job = get_job(job_id)
+    if job and job.status == RUNNING:
+        job.pause_event.set(); job._paused_at = time.monotonic()
+        job._set_status(PAUSED)
+
+def resume_job(job_id):
+    job = get_job(job_id)
+    if job and job.status == PAUSED:
+        job.pause_event.clear(); _unpause(job)
+        job._set_status(RUNNING)
+
+def cancel_job(job_id):
+    job = get_job(job_id)
+    if job and job.status in ACTIVE:
+        job.cancel_event.set(); job.pause_event.clear(); _unpause(job)
+        job._set_status(CANCELLING)
+
+def cancel_all():
+    for job in active_jobs():
+        cancel_job(job.id)
+
+def mark_resumed(row):
+    """Baris job 'interrupted' (dari job_history) yang sudah dilanjutkan oleh job baru."""
+    save_job({**row, "status": RESUMED, "updated_at": _now()})
@@ -0,0 +1,417 @@
+# jpeg_metadata.py
+"""
+Fast path penulisan metadata JPEG tanpa ExifTool.
+
+Segmen header (APPn/DQT/DHT/...) dibaca satu per satu, segmen XMP (APP1), IPTC (APP13)
+dan IFD0 EXIF diganti, lalu data gambar setelah SOS di-stream apa adanya (tanpa re-encode).
+Jika ada kondisi yang tidak bisa ditangani dengan aman, fungsi mengembalikan False
+dan pemanggil harus fallback ke ExifTool.
+"""
+import os
+import io
+import struct
+import hashlib
+import xml.etree.ElementTree as ET
+
+from image_ops import build_xmp_packet
+
+JPEG_EXTS = ('.jpg', '.jpeg')
+
+# Tag (kunci tags_data dari processor) yang bisa ditulis oleh fast path ini
+SUPPORTED_TAGS = {
+    "XMP:Title", "XMP:Description", "XMP:Subject", "XMP:Rating",
+    "IPTC:Headline", "IPTC:Caption-Abstract", "IPTC:Keywords",
+    "EXIF:XPTitle", "EXIF:XPKeywords", "EXIF:XPSubject", "EXIF:XPComment", "EXIF:ImageDescription",
+}
+
+XMP_SIG = b"http://ns.adobe.com/xap/1.0/\x00"
+XMP_EXT_SIG = b"http://ns.adobe.com/xmp/extension/\x00"
+EXIF_SIG = b"Exif\x00\x00"
+PS_SIG = b"Photoshop 3.0\x00"
+
+MAX_SEGMENT = 65533  # panjang payload maksimal (field length 16-bit termasuk 2 byte dirinya)
+STREAM_CHUNK = 1024 * 1024
+
+# Properti XMP yang kita tulis sendiri; XMP lain (Lightroom, kamera) -> serahkan ke ExifTool
+_OWN_XMP_PROPS = {
+    "{http://purl.org/dc/elements/1.1/}title", "{http://purl.org/dc/elements/1.1/}description",
+    "{http://purl.org/dc/elements/1.1/}subject", "{http://ns.adobe.com/xap/1.0/}Rating",
+}
+_RDF = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}"
+
+class UnsupportedJpeg(Exception):
+    """Kondisi yang sengaja tidak ditangani fast path (fallback ke ExifTool)."""
+
+# --- 1. SEGMENT PARSER ---
+
+def _read_header_segments(f):
+    """
+    Baca segmen dari SOI sampai SOS (eksklusif). Return list (marker, payload).
+    Posisi file ditinggalkan tepat di awal marker SOS.
+    """
+    if f.read(2) != b"\xff\xd8": raise UnsupportedJpeg("Not a JPEG (missing SOI)")
+    segments = []
+    while True:
+        b = f.read(1)
+        if not b: raise UnsupportedJpeg("Truncated JPEG header")
+        if b != b"\xff": raise UnsupportedJpeg("Corrupt marker stream")
+        marker = f.read(1)
+        while marker == b"\xff": marker = f.read(1)  # fill bytes
+        m = marker[0]
+        if m == 0xDA:
+            f.seek(-2, os.SEEK_CUR)
+            return segments
+        if m == 0xD9 or 0xD0 <= m <= 0xD7 or m == 0x01:
+            raise UnsupportedJpeg("Unexpected marker before SOS")
+        length = struct.unpack(">H", f.read(2))[0]
+        payload = f.read(length - 2)
+        if len(payload) != length - 2: raise UnsupportedJpeg("Truncated segment")
+        segments.append((m, payload))
+
+def _segment_bytes(marker, payload):
+    if len(payload) > MAX_SEGMENT: raise UnsupportedJpeg("Segment too large")
+    return b"\xff" + bytes([marker]) + struct.pack(">H", len(payload) + 2) + payload
+
+# --- 2. XMP ---
+
+def _xmp_is_replaceable(payload):
+    """True jika XMP lama hanya berisi properti yang memang kita tulis (aman ditimpa utuh)."""
+    try:
+        root = ET.fromstring(payload[len(XMP_SIG):].decode("utf-8", "replace").split("?>", 1)[1].rsplit("<?xpacket", 1)[0])
+    except Exception:
+        return False
+    for desc in root.iter(f"{_RDF}Description"):
+        for attr in desc.attrib:
+            if attr != f"{_RDF}about" and attr not in _OWN_XMP_PROPS: return False
+        for child in desc:
+            if child.tag not in _OWN_XMP_PROPS: return False
+    return True
+
+def build_xmp_segment(title, desc, keywords, rating=None):
+    packet = build_xmp_packet(title, desc, keywords, rating=rating)
+    # Padding whitespace standar agar editor lain bisa update in-place
+    packet = packet.replace("<?xpacket end='w'?>", (" " * 99 + "\n") * 20 + "<?xpacket end='w'?>")
+    return XMP_SIG + packet.encode("utf-8")
+
+# --- 3. IPTC (APP13 / Photoshop IRB) ---
+
+def _truncate_utf8(text, limit):
+    data = str(text).encode("utf-8")
+    if len(data) <= limit: return data
+    return data[:limit].decode("utf-8", "ignore").encode("utf-8")
+
+def _iptc_dataset(record, dataset, value):
+    if len(value) > 0x7FFF: raise UnsupportedJpeg("IPTC value too long")
+    return struct.pack(">BBBH", 0x1C, record, dataset, len(value)) + value
+
+# Dataset IIM yang ditulis ulang fast path; dataset lain (By-line, Copyright, Credit, ...) disalin apa adanya
+_IIM_REPLACED = {(1, 90), (2, 25), (2, 105), (2, 120)}
+_IIM_UTF8 = b"\x1b%G"
+
+def _parse_iim(block):
+    """Blok IIM -> list (record, dataset, value). Struktur yang tidak bisa di-round-trip -> UnsupportedJpeg."""
+    datasets, pos = [], 0
+    while pos < len(block):
+        if block[pos] != 0x1C:
+            if not block[pos:].strip(b"\x00"): break  # padding di akhir resource
+            raise UnsupportedJpeg("Unknown data in IPTC block")
+        if pos + 5 > len(block): raise UnsupportedJpeg("Truncated IPTC dataset")
+        record, dataset, size = block[pos + 1], block[pos + 2], struct.unpack(">H", block[pos + 3:pos + 5])[0]
+        if size & 0x8000: raise UnsupportedJpeg("Extended-length IPTC dataset")
+        value = block[pos + 5:pos + 5 + size]
+        if len(value) != size: raise UnsupportedJpeg("Truncated IPTC dataset")
+        datasets.append((record, dataset, value))
+        pos += 5 + size
+    return datasets
+
+def build_iptc_block(headline=None, caption=None, keywords=None, existing=None):
+    """
+    IIM record: CodedCharacterSet=UTF8, RecordVersion, Headline (+ ObjectName jika sudah ada),
+    Caption-Abstract, Keywords. existing: blok IIM lama; dataset lain disalin tanpa diubah.
+    """
+    old = _parse_iim(existing) if existing else []
+    replaced = _IIM_REPLACED | ({(2, 5)} if headline else set())
+    kept = [(r, d, v) for r, d, v in old if (r, d) not in replaced]
+    charset = next((v for r, d, v in old if (r, d) == (1, 90)), None)
+    # Dataset lama non-ASCII tanpa penanda UTF-8 akan salah dibaca setelah 1:90 = UTF-8
+    if charset != _IIM_UTF8 and any(r == 2 and d != 0 and any(b >= 0x80 for b in v) for r, d, v in kept):
+        raise UnsupportedJpeg("Existing IPTC uses a non-UTF-8 charset")
+
+    new = [(1, 90, _IIM_UTF8)]
+    if not any((r, d) == (2, 0) for r, d, _ in kept): new.append((2, 0, struct.pack(">H", 4)))
+    if headline:
+        new.append((2, 105, _truncate_utf8(headline, 256)))
+        if any((r, d) == (2, 5) for r, d, _ in old): new.append((2, 5, _truncate_utf8(headline, 64)))
+    for kw in keywords or []:
+        kw = str(kw).strip()
+        if kw: new.append((2, 25, _truncate_utf8(kw, 64)))
+    if caption: new.append((2, 120, _truncate_utf8(caption, 2000)))
+    # Urut per record/dataset (sort stabil: urutan keyword & dataset berulang tetap)
+    return b"".join(_iptc_dataset(r, d, v) for r, d, v in sorted(kept + new, key=lambda x: (x[0], x[1])))
+
+def _parse_irbs(data):
+    """Parse Photoshop Image Resource Blocks -> list (res_id, name_bytes, data)."""
+    irbs, pos = [], 0
+    while pos + 12 <= len(data) and data[pos:pos + 4] == b"8BIM":
+        res_id = struct.unpack(">H", data[pos + 4:pos + 6])[0]
+        name_len = data[pos + 6]
+        name_total = name_len + 1 + ((name_len + 1) % 2)
+        name = data[pos + 6:pos + 6 + name_total]
+        size_pos = pos + 6 + name_total
+        size = struct.unpack(">I", data[size_pos:size_pos + 4])[0]
+        body = data[size_pos + 4:size_pos + 4 + size]
+        irbs.append((res_id, name, body))
+        pos = size_pos + 4 + size + (size % 2)
+    return irbs
+
+def _irb_bytes(res_id, name, body):
+    out = b"8BIM" + struct.pack(">H", res_id) + (name or b"\x00\x00") + struct.pack(">I", len(body)) + body
+    return out + (b"\x00" if len(body) % 2 else b"")
+
+def existing_iptc_block(app13_payload):
+    """Isi resource IPTC-NAA (0x0404) dari payload APP13, atau None."""
+    if not app13_payload: return None
+    blocks = [body for res_id, _, body in _parse_irbs(app13_payload[len(PS_SIG):]) if res_id == 0x0404]
+    if len(blocks) > 1: raise UnsupportedJpeg("Multiple IPTC resources")
+    return blocks[0] if blocks else None
+
+def build_app13(existing_payload, iptc_block):
+    """Ganti resource IPTC (0x0404) + digest (0x0425), resource Photoshop lain dipertahankan."""
+    irbs = _parse_irbs(existing_payload[len(PS_SIG):]) if existing_payload else []
+    kept = [r for r in irbs if r[0] not in (0x0404, 0x0425)]
+    out = PS_SIG
+    for res_id, name, body in kept: out += _irb_bytes(res_id, name, body)
+    out += _irb_bytes(0x0404, None, iptc_block)
+    out += _irb_bytes(0x0425, None, hashlib.md5(iptc_block).digest())
+    return out
+
+# --- 4. EXIF IFD0 ---
+
+_ASCII, _BYTE = 2, 1
+TAG_IMAGE_DESCRIPTION = 0x010E
+TAG_XP = {"EXIF:XPTitle": 0x9C9B, "EXIF:XPComment": 0x9C9C, "EXIF:XPKeywords": 0x9C9E, "EXIF:XPSubject": 0x9C9F}
+
+_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8}
+
+def _value_offset(bo, raw_entry):
+    """Offset data entri IFD (tanpa 2 byte tag), atau -1 jika nilainya inline (<= 4 byte)."""
+    typ, count = struct.unpack(bo + "HI", raw_entry[:6])
+    if _TYPE_SIZES.get(typ, 1) * count <= 4: return -1
+    return struct.unpack(bo + "I", raw_entry[6:10])[0]
+
+_POINTER_TAGS = (0x8769, 0x8825, 0xA005, 0x014A)  # ExifIFD, GPS, Interop, SubIFDs
+
+def _is_trailing_own_ifd(bo, tiff, ifd_off, count, raw, next_ifd, new_entries):
+    """
+    True jika IFD0 + data nilai yang akan diganti persis menutup ujung blok TIFF
+    (pola tulisan fungsi ini sebelumnya) dan tidak ada data lain yang menunjuk ke sana.
+    """
+    if ifd_off <= 8: return False
+    if struct.unpack(bo + "I", next_ifd)[0] >= ifd_off: return False
+    end = ifd_off + 2 + count * 12 + 4
+    for tag, entry in raw.items():
+        off = _value_offset(bo, entry)
+        if tag in _POINTER_TAGS and struct.unpack(bo + "I", entry[6:10])[0] >= ifd_off: return False
+        if off < ifd_off: continue
+        if tag not in new_entries: return False
+        size = _TYPE_SIZES.get(struct.unpack(bo + "H", entry[:2])[0], 1) * struct.unpack(bo + "I", entry[2:6])[0]
+        end += size + (size % 2)
+    return end == len(tiff)
+
+def _exif_entries_from_tags(tags):
+    entries = {}
+    if "EXIF:ImageDescription" in tags:
+        entries[TAG_IMAGE_DESCRIPTION] = (_ASCII, str(tags["EXIF:ImageDescription"]).encode("utf-8") + b"\x00")
+    for key, tag_id in TAG_XP.items():
+        if key in tags:
+            entries[tag_id] = (_BYTE, str(tags[key]).encode("utf-16-le") + b"\x00\x00")
+    return entries
+
+def update_exif_ifd0(existing_payload, new_entries):
+    """
+    Tambahkan/ganti entri IFD0 tanpa memindahkan data lama: IFD0 baru ditulis di ujung
+    blok TIFF dan header diarahkan ke sana, sehingga semua offset lama (ExifIFD, GPS,
+    MakerNote, IFD1/thumbnail) tetap valid.
+    """
+    if existing_payload:
+        tiff = bytearray(existing_payload[len(EXIF_SIG):])
+        bo = {b"II": "<", b"MM": ">"}.get(bytes(tiff[:2]))
+        if not bo or struct.unpack(bo + "H", tiff[2:4])[0] != 42: raise UnsupportedJpeg("Invalid TIFF header")
+        ifd_off = struct.unpack(bo + "I", tiff[4:8])[0]
+        count = struct.unpack(bo + "H", tiff[ifd_off:ifd_off + 2])[0]
+        raw = {}
+        for i in range(count):
+            e = ifd_off + 2 + i * 12
+            raw[struct.unpack(bo + "H", tiff[e:e + 2])[0]] = bytes(tiff[e + 2:e + 12])
+        next_ifd = bytes(tiff[ifd_off + 2 + count * 12:ifd_off + 6 + count * 12])
+        # IFD0 hasil tulisan sebelumnya ada di ujung blok: potong agar segmen tidak membengkak
+        # tiap regenerate (hanya jika tidak ada entri lama yang datanya menunjuk ke area itu)
+        if _is_trailing_own_ifd(bo, tiff, ifd_off, count, raw, next_ifd, new_entries):
+            del tiff[ifd_off:]
+    else:
+        bo = "<"
+        tiff = bytearray(b"II" + struct.pack("<HI", 42, 8))
+        raw, next_ifd = {}, b"\x00\x00\x00\x00"
+
+    # Posisi IFD baru (word aligned) + area data setelahnya
+    if len(tiff) % 2: tiff += b"\x00"
+    all_tags = sorted(set(raw) | set(new_entries))
+    new_ifd_off = len(tiff)
+    data_off = new_ifd_off + 2 + len(all_tags) * 12 + 4
+    ifd = bytearray(struct.pack(bo + "H", len(all_tags)))
+    data_area = bytearray()
+    for tag in all_tags:
+        if tag in new_entries:
+            typ, value = new_entries[tag]
+            if len(value) <= 4:
+                field = value.ljust(4, b"\x00")
+            else:
+                field = struct.pack(bo + "I", data_off + len(data_area))
+                data_area += value + (b"\x00" if len(value) % 2 else b"")
+            ifd += struct.pack(bo + "HHI", tag, typ, len(value)) + field
+        else:
+            ifd += struct.pack(bo + "H", tag) + raw[tag]
+    ifd += next_ifd
+    tiff[4:8] = struct.pack(bo + "I", new_ifd_off)
+    tiff += ifd + data_area
+    return EXIF_SIG + bytes(tiff)
+
+# --- 5. PUBLIC API ---
+
+def can_write_natively(path, tags):
+    return os.path.splitext(path)[1].lower() in JPEG_EXTS and set(tags).issubset(SUPPORTED_TAGS)
+
+def _as_list(value):
+    if value is None: return []
+    if isinstance(value, (list, tuple)): return [str(v) for v in value]
+    return [v.strip() for v in str(value).split(",") if v.strip()]
+
+def write_jpeg_metadata(src_path, tags, dst_path=None):
+    """
+    Tulis XMP + IPTC + EXIF (IFD0) ke JPEG. Jika dst_path diberikan, file baru ditulis ke sana
+    (sumber tidak diubah); jika tidak, sumber diganti secara atomik.
+    Return (True, info) jika berhasil, (False, alasan) jika harus fallback ke ExifTool.
+    """
+    if not can_write_natively(src_path, tags): return False, "Unsupported format/tags"
+    out_path = dst_path or src_path
+    tmp_path = out_path + ".jpgmeta.tmp"
+    try:
+        with open(src_path, "rb") as f:
+            segments = _read_header_segments(f)
+
+            exif_payload, app13_payload = None, None
+            leading, rest = [], []
+            for marker, payload in segments:
+                if marker == 0xE1 and payload.startswith(EXIF_SIG):
+                    if exif_payload is not None: raise UnsupportedJpeg("Multiple EXIF segments")
+                    exif_payload = payload
+                elif marker == 0xE1 and payload.startswith(XMP_SIG):
+                    if not _xmp_is_replaceable(payload): raise UnsupportedJpeg("Existing XMP has foreign properties")
+                elif marker == 0xE1 and payload.startswith(XMP_EXT_SIG):
+                    raise UnsupportedJpeg("Extended XMP present")
+                elif marker == 0xED and payload.startswith(PS_SIG):
+                    if app13_payload is not None: raise UnsupportedJpeg("Multiple APP13 segments")
+                    app13_payload = payload
+                elif marker == 0xE0 and not rest:
+                    leading.append((marker, payload))  # JFIF/JFXX tetap di depan
+                else:
+                    rest.append((marker, payload))
+
+            # Susun segmen metadata baru
+            new_segments = []
+            exif_entries = _exif_entries_from_tags(tags)
+            if exif_entries or exif_payload is not None:
+                new_payload = update_exif_ifd0(exif_payload, exif_entries) if exif_entries else exif_payload
+                new_segments.append((0xE1, new_payload))
+            if any(k.startswith("XMP:") for k in tags):
+                new_segments.append((0xE1, build_xmp_segment(
+                    tags.get("XMP:Title", ""), tags.get("XMP:Description", ""),
+                    _as_list(tags.get("XMP:Subject")), rating=tags.get("XMP:Rating"))))
+            if any(k.startswith("IPTC:") for k in tags) or app13_payload is not None:
+                iptc = build_iptc_block(tags.get("IPTC:Headline"), tags.get("IPTC:Caption-Abstract"), _as_list(tags.get("IPTC:Keywords")),
+                                        existing=existing_iptc_block(app13_payload))
+                new_segments.append((0xED, build_app13(app13_payload, iptc)))
+
+            header = io.BytesIO()
+            header.write(b"\xff\xd8")
+            for marker, payload in leading + new_segments + rest:
+                header.write(_segment_bytes(marker, payload))
+
+            # Stream sisa file (SOS + entropy data + EOI) apa adanya
+            written = 0
+            with open(tmp_path, "wb") as out:
+                out.write(header.getvalue())
+                written += header.tell()
+                while True:
+                    chunk = f.read(STREAM_CHUNK)
+                    if not chunk: break
+                    out.write(chunk)
+                    written += len(chunk)
+        os.replace(tmp_path, out_path)
+        return True, {"bytes_written": written}
+    except UnsupportedJpeg as e:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        return False, str(e)
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            try: os.remove(tmp_path)
+            except OSError: pass
+        return False, f"Native JPEG writer error: {e}"
+
+# --- 6. READER (import metadata yang sudah ada) ---
+
+_DC = "{http://purl.org/dc/elements/1.1/}"
+
+def _xmp_fields(payload):
+    """dc:title / dc:description / dc:subject dari payload APP1 XMP."""
+    text = payload[len(XMP_SIG):].decode("utf-8", "replace")
+    start, end = text.find("<x:xmpmeta"), text.rfind("</x:xmpmeta>")
+    if start < 0 or end < 0: return {}
+    root = ET.fromstring(text[start:end + len("</x:xmpmeta>")])
+    out = {}
+    for desc in root.iter(f"{_RDF}Description"):
+        for prop, key in ((f"{_DC}title", "title"), (f"{_DC}description", "description")):
+            if desc.get(prop): out.setdefault(key, desc.get(prop))
+            node = desc.find(f"{prop}/{_RDF}Alt/{_RDF}li")
+            if node is not None and node.text: out.setdefault(key, node.text.strip())
+        kws = [li.text.strip() for li in desc.iterfind(f"{_DC}subject/{_RDF}Bag/{_RDF}li") if li.text and li.text.strip()]
+        if kws: out.setdefault("keywords", kws)
+    return out
+
+def _iptc_fields(payload):
+    """ObjectName/Headline, Caption-Abstract, Keywords dari APP13 (resource 0x0404)."""
+    out, kws = {}, []
+    for res_id, _, body in _parse_irbs(payload[len(PS_SIG):]):
+        if res_id != 0x0404: continue
+        pos = 0
+        while pos + 5 <= len(body) and body[pos] == 0x1C:
+            record, dataset, size = body[pos + 1], body[pos + 2], struct.unpack(">H", body[pos + 3:pos + 5])[0]
+            raw = body[pos + 5:pos + 5 + size]
+            pos += 5 + size
+            if record != 2: continue
+            try: value = raw.decode("utf-8").strip()
+            except UnicodeDecodeError: value = raw.decode("latin-1").strip()
+            if dataset == 25 and value: kws.append(value)
+            elif dataset in (5, 105) and value: out.setdefault("title", value)
+            elif dataset == 120 and value: out["description"] = value
+    if kws: out["keywords"] = kws
+    return out
+
+def read_jpeg_metadata(path):
+    """
+    Baca title/description/keywords (XMP, fallback IPTC) hanya dari header JPEG, tanpa ExifTool.
+    Return dict (bisa kosong), atau None jika bukan JPEG yang bisa diparse (pemanggil fallback ke ExifTool).
+    """
+    try:
+        with open(path, "rb") as f:
+            segments = _read_header_segments(f)
+    except (UnsupportedJpeg, OSError, struct.error):
+        return None
+    xmp, iptc = {}, {}
+    for marker, payload in segments:
+        try:
+            if marker == 0xE1 and payload.startswith(XMP_SIG) and not xmp: xmp = _xmp_fields(payload)
+            elif marker == 0xED and payload.startswith(PS_SIG) and not iptc: iptc = _iptc_fields(payload)
+        except (ET.ParseError, struct.error):
+            continue
+    return {**iptc, **xmp}
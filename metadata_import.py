@@ -0,0 +1,129 @@
+# metadata_import.py
+"""
+Import metadata yang sudah tertanam di file (XMP/IPTC title, description, keywords) ke history.
+
+- JPEG dibaca langsung dari header (jpeg_metadata.read_jpeg_metadata), tanpa proses eksternal.
+- Format lain dibaca lewat pool ExifTool stay-open: `-json` per argfile berisi ratusan file
+  (IMPORT_READ_CHUNK), chunk dibagi ke semua worker pool secara paralel.
+- Baris baru dimasukkan dengan satu bulk insert per chunk (add_history_entries).
+
+Dipakai juga oleh "Skip Existing Files" di batch: file yang metadatanya sudah lengkap
+tidak dikirim ke API, cukup dicatat ke history.
+"""
+import os
+import json
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from config import BASE_WORK_DIR, IMPORT_MIN_KEYWORDS, IMPORT_READ_CHUNK
+from database import add_history_entries, get_history_filenames, flush_writes
+from exiftool_pool import get_shared_pool
+from jpeg_metadata import read_jpeg_metadata, JPEG_EXTS
+
+IMPORT_EXTS = ('.jpg', '.jpeg', '.png', '.mp4', '.mov', '.eps', '.ai')
+IMPORT_CATEGORY = "Imported"
+SKIP_DIRS = {"done", "skipped", "_Reports"}
+READ_TAGS = ["-XMP-dc:Title", "-XMP-dc:Description", "-XMP-dc:Subject",
+             "-IPTC:ObjectName", "-IPTC:Headline", "-IPTC:Caption-Abstract", "-IPTC:Keywords"]
+
+# --- 1. SCAN & READ ---
+
+def scan_folder(root, recursive=True):
+    """Yield path file yang didukung (folder kerja done/skipped/_Reports dilewati)."""
+    try:
+        entries = list(os.scandir(root))
+    except OSError:
+        return
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            if recursive and entry.name not in SKIP_DIRS and not entry.name.startswith("."):
+                yield from scan_folder(entry.path, recursive)
+        elif entry.name.lower().endswith(IMPORT_EXTS):
+            yield entry.path
+
+def _as_list(value):
+    if value is None: return []
+    if isinstance(value, list): return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value).split(",") if v.strip()]
+
+def _from_exiftool(rec):
+    title = rec.get("Title") or rec.get("ObjectName") or rec.get("Headline")
+    desc = rec.get("Description") or rec.get("Caption-Abstract")
+    meta = {"keywords": _as_list(rec.get("Subject")) or _as_list(rec.get("Keywords"))}
+    if title: meta["title"] = str(title).strip()
+    if desc: meta["description"] = str(desc).strip()
+    return meta
+
+def _exiftool_read_chunk(paths):
+    """Satu pemanggilan `exiftool -json` untuk banyak file (lewat argfile). Return dict path -> meta."""
+    fd, argfile = tempfile.mkstemp(prefix="et_read_", suffix=".txt", dir=BASE_WORK_DIR if os.path.isdir(BASE_WORK_DIR) else None)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write("\n".join(["-json", "-charset", "filename=utf8"] + READ_TAGS + paths) + "\n")
+        out, _ = get_shared_pool().execute(["-@", argfile])
+    finally:
+        try: os.remove(argfile)
+        except OSError: pass
+    try: records = json.loads(out) if out.strip() else []
+    except ValueError: return {}
+    return {os.path.normpath(r["SourceFile"]): _from_exiftool(r) for r in records if r.get("SourceFile")}
+
+def read_metadata(paths, chunk=IMPORT_READ_CHUNK):
+    """Return dict path -> {title, description, keywords}. File yang tidak terbaca tidak ada di hasil."""
+    result, others = {}, []
+    for p in paths:
+        meta = read_jpeg_metadata(p) if p.lower().endswith(JPEG_EXTS) else None
+        if meta is None: others.append(p)
+        else: result[p] = meta
+    if others:
+        pool = get_shared_pool()
+        if not pool.executable: return result
+        chunks = [others[i:i + chunk] for i in range(0, len(others), chunk)]
+        with ThreadPoolExecutor(max_workers=max(1, min(pool.size, len(chunks)))) as exe:
+            for part, found in zip(chunks, exe.map(_exiftool_read_chunk, chunks)):
+                for p in part:
+                    meta = found.get(os.path.normpath(p))
+                    if meta is not None: result[p] = meta
+    return result
+
+def is_complete(meta):
+    """Metadata dianggap lengkap: ada title, description, dan minimal IMPORT_MIN_KEYWORDS keyword."""
+    return bool(meta and meta.get("title") and meta.get("description") and len(meta.get("keywords") or []) >= IMPORT_MIN_KEYWORDS)
+
+def split_complete(paths):
+    """(dict path -> meta untuk file yang sudah lengkap, list path sisanya yang perlu diproses AI)."""
+    metas = read_metadata(paths)
+    complete = {p: m for p, m in metas.items() if is_complete(m)}
+    return complete, [p for p in paths if p not in complete]
+
+def history_entry(path, meta, output_path=None):
+    name = os.path.basename(path)
+    return {"filename": name, "new_filename": name, "title": meta["title"], "description": meta["description"],
+            "keywords": meta["keywords"], "category": IMPORT_CATEGORY, "output_path": output_path or os.path.dirname(path)}
+
+# --- 2. JOB: IMPORT FOLDER ---
+
+def run_metadata_import(job):
+    """job.params: folder, recursive. File yang sudah ada di history (folder + nama) dilewati."""
+    p = job.params
+    files = list(scan_folder(os.path.abspath(p['folder']), p.get('recursive', True)))
+    job.total = len(files)
+    job.log("info", f"📥 {len(files):,} file ditemukan di {p['folder']}")
+    known = {}
+    for i in range(0, len(files), IMPORT_READ_CHUNK):
+        if job.cancelled: break
+        while job.pause_event.is_set() and not job.cancelled: job.cancel_event.wait(0.2)
+        batch = files[i:i + IMPORT_READ_CHUNK]
+        fresh = []
+        for path in batch:
+            folder = os.path.dirname(path)
+            if folder not in known: known[folder] = get_history_filenames(folder)
+            if os.path.basename(path) not in known[folder]: fresh.append(path)
+        metas = read_metadata(fresh)
+        entries = [history_entry(path, metas[path]) for path in fresh if is_complete(metas.get(path))]
+        if entries:
+            add_history_entries(entries, batch_id=job.id)
+            for e in entries: known[e['output_path']].add(e['new_filename'])
+        job.count(ok=len(entries), skipped=len(batch) - len(entries))
+    flush_writes()
+    job.message = f"Imported: {job.ok} | Skipped (sudah ada / tidak lengkap): {job.skipped}"
@@ -0,0 +1,241 @@
+# metrics.py
+"""
+Registry metrik live (counter, gauge, histogram) untuk batch panjang.
+
+- Diisi dari processor (request AI, 429, retry, request in-flight) dan batch_runner
+  (hasil per file: token, biaya via utils.calculate_cost, latensi per tahap dari telemetri).
+- Diekspos dalam format teks Prometheus di http://METRICS_HOST:METRICS_PORT/metrics
+  (satu thread daemon per proses) dan sebagai panel ringkas di sidebar (snapshot()).
+- Nilai hanya di memori proses: reset saat app restart (riwayat ada di file_telemetry).
+"""
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from config import METRICS_ENABLED, METRICS_HOST, METRICS_PORT, METRICS_RATE_WINDOW
+from utils import calculate_cost
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)   # detik
+STAGES = {"load_ms": "load", "ai_ms": "ai", "finalize_ms": "finalize", "total_ms": "total"}
+
+def _key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _matches(key, match):
+    labels = dict(key)
+    return all(labels.get(k) == str(v) for k, v in match.items())
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt_labels(key):
+    if not key: return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in key) + "}"
+
+# --- 1. TIPE METRIK ---
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name, self.help = name, help_text
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _key(labels)
+        with self.lock: self.values[key] = self.values.get(key, 0) + amount
+
+    def total(self, **match):
+        with self.lock:
+            return sum(v for k, v in self.values.items() if _matches(k, match))
+
+    def by(self, label, **match):
+        """Jumlah per nilai satu label, mis. by("model")."""
+        out = {}
+        with self.lock:
+            for k, v in self.values.items():
+                if _matches(k, match):
+                    name = dict(k).get(label, "")
+                    out[name] = out.get(name, 0) + v
+        return out
+
+    def lines(self):
+        with self.lock:
+            return [f"{self.name}{_fmt_labels(k)} {v}" for k, v in sorted(self.values.items())]
+
+class Gauge(Counter):
+    """Nilai naik-turun. fn (opsional): callable -> dict {labels tuple: nilai}, dievaluasi saat di-scrape."""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, fn=None):
+        super().__init__(name, help_text)
+        self.fn = fn
+
+    def set(self, value, **labels):
+        with self.lock: self.values[_key(labels)] = value
+
+    def lines(self):
+        if self.fn is None: return super().lines()
+        return [f"{self.name}{_fmt_labels(k)} {v}" for k, v in sorted(self.fn().items())]
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name, self.help = name, help_text
+        self.buckets = tuple(buckets)
+        self.values = {}   # key -> [count per bucket (+Inf terakhir), sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _key(labels)
+        with self.lock:
+            entry = self.values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value; entry[2] += 1
+
+    def mean(self, **match):
+        with self.lock:
+            rows = [e for k, e in self.values.items() if _matches(k, match)]
+        n = sum(e[2] for e in rows)
+        return sum(e[1] for e in rows) / n if n else None
+
+    def lines(self):
+        out = []
+        with self.lock:
+            for key, (counts, total, n) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, c in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += c
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    out.append(f"{self.name}_bucket{_fmt_labels(key + (('le', le),))} {cumulative}")
+                out.append(f"{self.name}_sum{_fmt_labels(key)} {total}")
+                out.append(f"{self.name}_count{_fmt_labels(key)} {n}")
+        return out
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Exposition format teks Prometheus (versi 0.0.4)."""
+        out = []
+        for m in self.metrics:
+            out += [f"# HELP {m.name} {m.help}", f"# TYPE {m.name} {m.kind}"] + m.lines()
+        return "\n".join(out) + "\n"
+
+# --- 2. METRIK APLIKASI ---
+
+_success_times = {}   # model -> deque timestamp file sukses (untuk images/min)
+_rate_lock = threading.Lock()
+
+def _images_per_minute():
+    now = time.monotonic()
+    out = {}
+    with _rate_lock:
+        for model, times in _success_times.items():
+            while times and times[0] < now - METRICS_RATE_WINDOW: times.popleft()
+            # Awal batch: bagi dengan waktu yang benar-benar berjalan (min. 10 detik), bukan jendela penuh
+            window = min(METRICS_RATE_WINDOW, max(10.0, now - times[0])) if times else METRICS_RATE_WINDOW
+            out[_key({"model": model})] = round(len(times) * 60 / window, 2)
+    return out
+
+def _cost_per_image():
+    images = IMAGES.by("model", status="success")
+    return {_key({"model": m}): round(c / images[m], 6) for m, c in COST.by("model").items() if images.get(m)}
+
+REGISTRY = Registry()
+REQUESTS = REGISTRY.register(Counter("gm_ai_requests_total", "Request AI per model dan status (ok/error)"))
+RATE_LIMITED = REGISTRY.register(Counter("gm_ai_rate_limited_total", "Request AI yang ditolak karena rate limit / quota (429)"))
+RETRIES = REGISTRY.register(Counter("gm_ai_retries_total", "Percobaan ulang request AI"))
+TOKENS = REGISTRY.register(Counter("gm_tokens_total", "Token per model dan arah (in/out)"))
+COST = REGISTRY.register(Counter("gm_cost_usd_total", "Estimasi biaya USD (MODEL_PRICES) per model"))
+IMAGES = REGISTRY.register(Counter("gm_images_total", "File selesai per model dan status (success/skipped/error)"))
+STAGE_LATENCY = REGISTRY.register(Histogram("gm_stage_seconds", "Latensi per tahap per file (load/ai/finalize/total)"))
+QUEUE_DEPTH = REGISTRY.register(Gauge("gm_queue_depth", "Kedalaman antrian (ai_inflight, finalize_pending, batch_remaining, db_writes)"))
+IMAGES_PER_MIN = REGISTRY.register(Gauge("gm_images_per_minute", "File sukses per menit dalam jendela METRICS_RATE_WINDOW", fn=_images_per_minute))
+COST_PER_IMAGE = REGISTRY.register(Gauge("gm_cost_per_image_usd", "Rata-rata estimasi biaya per file sukses", fn=_cost_per_image))
+
+# --- 3. PENCATATAN (dipanggil processor / batch_runner) ---
+
+def record_request(model, ok, rate_limited=False):
+    REQUESTS.inc(model=model, status="ok" if ok else "error")
+    if rate_limited: RATE_LIMITED.inc(model=model)
+
+def record_retry(model):
+    RETRIES.inc(model=model)
+
+@contextmanager
+def inflight(queue):
+    QUEUE_DEPTH.inc(queue=queue)
+    try: yield
+    finally: QUEUE_DEPTH.inc(-1, queue=queue)
+
+def set_queue(queue, depth):
+    QUEUE_DEPTH.set(depth, queue=queue)
+
+def record_file(telemetry, status, model=None):
+    """Satu file selesai (success/skipped/error): token, biaya, latensi per tahap."""
+    tel = telemetry or {}
+    model = tel.get("model") or model or "unknown"
+    IMAGES.inc(model=model, status=status)
+    tokens_in, tokens_out = tel.get("tokens_in") or 0, tel.get("tokens_out") or 0
+    if tokens_in or tokens_out:
+        TOKENS.inc(tokens_in, model=model, direction="in")
+        TOKENS.inc(tokens_out, model=model, direction="out")
+        COST.inc(calculate_cost(model, tokens_in, tokens_out), model=model)
+    for field, stage in STAGES.items():
+        if tel.get(field) is not None: STAGE_LATENCY.observe(tel[field] / 1000, stage=stage)
+    if status == "success":
+        with _rate_lock: _success_times.setdefault(model, deque()).append(time.monotonic())
+
+def snapshot():
+    """Ringkasan untuk panel sidebar."""
+    images = IMAGES.total(status="success")
+    cost = COST.total()
+    return {"requests": REQUESTS.total(), "rate_limited": RATE_LIMITED.total(), "retries": RETRIES.total(),
+            "tokens_in": TOKENS.total(direction="in"), "tokens_out": TOKENS.total(direction="out"),
+            "images": images, "images_per_min": sum(_images_per_minute().values()), "cost": cost,
+            "cost_per_image": cost / images if images else None, "ai_mean_s": STAGE_LATENCY.mean(stage="ai"),
+            "queues": QUEUE_DEPTH.by("queue")}
+
+# --- 4. ENDPOINT HTTP ---
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404); return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Sekali per proses (aman dipanggil di setiap rerun Streamlit). Return URL atau None."""
+    global _server
+    with _server_lock:
+        if _server is None and METRICS_ENABLED:
+            try:
+                _server = ThreadingHTTPServer((host, port), _Handler)
+                threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+                print(f"[METRICS] Prometheus endpoint: http://{host}:{port}/metrics")
+            except OSError as e:
+                print(f"[METRICS] Endpoint tidak bisa dibuka di {host}:{port}: {e}")
+                _server = False
+        return f"http://{host}:{port}/metrics" if _server else None
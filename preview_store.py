@@ -0,0 +1,78 @@
+# preview_store.py
+"""
+Store preview AI (`ai_input_data`) berbasis konten di DiskLRUCache.
+
+Pass pertama menyimpan JPEG 1024px yang dikirim ke AI (hasil decode + blur check + resize,
+frame video, atau render Ghostscript untuk vector) beserta meta kecil (tech specs, blur score).
+Regenerate dan retry membaca dari sini, jadi biayanya tinggal panggilan API.
+Kunci = sampled hash file; setelah finalisasi/rewrite metadata, hash file berubah,
+jadi entry di-alias ke kunci file output (carry_over).
+"""
+import json
+import os
+import threading
+
+from config import PREVIEW_CACHE_DIR, PREVIEW_CACHE_MAX_MB
+from disk_cache import DiskLRUCache
+from utils import sampled_file_hash
+
+PREVIEW_VERSION = "p1024q80"  # naikkan jika resolusi/kualitas preview berubah
+
+_cache = DiskLRUCache(PREVIEW_CACHE_DIR, PREVIEW_CACHE_MAX_MB * 1024 * 1024)
+_memo_lock = threading.Lock()
+_key_memo = {}   # (path, size, mtime_ns) -> key
+
+def preview_key(path, stat=None):
+    """Kunci cache untuk isi file saat ini (None jika file tidak ada)."""
+    try:
+        st = stat or os.stat(path)
+    except OSError:
+        return None
+    sig = (path, st.st_size, st.st_mtime_ns)
+    with _memo_lock:
+        key = _key_memo.get(sig)
+    if key: return key
+    key = f"{sampled_file_hash(path)}_{PREVIEW_VERSION}"
+    with _memo_lock:
+        if len(_key_memo) > 4096: _key_memo.clear()
+        _key_memo[sig] = key
+    return key
+
+# --- 1. API ---
+
+def get_preview(key):
+    """Return (bytes, meta) atau None. Meta boleh kosong jika file .json sudah ter-evict."""
+    if not key: return None
+    path = _cache.get(key + ".jpg")
+    if not path: return None
+    try:
+        with open(path, "rb") as f: data = f.read()
+    except OSError:
+        return None
+    meta = {}
+    meta_path = _cache.get(key + ".json")
+    if meta_path:
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f: meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+    return data, meta
+
+def put_preview(key, data, meta=None):
+    if not key or not data: return
+    try:
+        _cache.put(key + ".jpg", data)
+        _cache.put(key + ".json", json.dumps(meta or {}).encode("utf-8"))
+    except OSError as e:
+        print(f"[WARN] Preview cache gagal ditulis: {e}")
+
+def carry_over(key, new_path):
+    """Alias entry `key` ke isi file baru (output final / file setelah rewrite metadata)."""
+    cached = get_preview(key)
+    if not cached: return None
+    new_key = preview_key(new_path)
+    if new_key and new_key != key: put_preview(new_key, *cached)
+    return new_key
+
+def get_cache_stats():
+    return _cache.get_stats()
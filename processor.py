@@ -13,7 +13,12 @@ from PIL import Image
 from config import BASE_WORK_DIR
 from image_ops import create_xmp_sidecar
 from ai_engine import run_gemini_engine, run_openai_compatible_engine
-from utils import clean_filename
+from utils import clean_filename, file_sha256, sampled_file_hash
+from preview_store import preview_key, get_preview, put_preview
+from database import find_content_candidates
+from tracing import span
+from rate_limiter import is_rate_limit_error
+import metrics
 
 # --- HELPER: In-Memory Blur ---
 def detect_blur_in_memory(cv2_image, threshold=5.0):
@@ -24,6 +29,23 @@ def detect_blur_in_memory(cv2_image, threshold=5.0):
         return cv2.Laplacian(gray, cv2.CV_64F).var()
     except: return 0.0
 
+def build_metadata_tags(title, description, keywords):
+    """Mapping tag XMP/IPTC/EXIF standar dari title, deskripsi, dan list keyword (dipakai AI & bulk edit lokal)."""
+    return {
+        "XMP:Title": title,
+        "XMP:Description": description, 
+        "XMP:Subject": keywords,
+        "IPTC:Headline": title,
+        "IPTC:Caption-Abstract": description,
+        "IPTC:Keywords": keywords,
+        "EXIF:XPTitle": title,         
+        "EXIF:XPKeywords": ";".join(keywords),  
+        "EXIF:XPSubject": description,
+        "EXIF:XPComment": description,
+        "EXIF:ImageDescription": description,
+        "XMP:Rating": 5
+    }
+
 def determine_file_type(filename):
     ext = os.path.splitext(filename)[1].lower().strip()
     if ext in ['.jpg', '.jpeg', '.png', '.tiff', '.webp']: return "Photo"
@@ -31,8 +53,80 @@ def determine_file_type(filename):
     if ext in ['.eps', '.ai', '.svg']: return "Vector"
     return "Other"
 
+# --- HELPER: AI Response -> Hasil Standar ---
+def build_success_result(response, filename, source_path, ftype, rename=True):
+    """Rapikan JSON dari AI (title/desc/keywords) jadi dict hasil standar pipeline. Dipakai path gambar & text-only."""
+    raw_kw = response.get("keywords", [])
+    if isinstance(raw_kw, str): raw_kw = raw_kw.split(',')
+    clean_kw = [k.strip().lower() for k in raw_kw if len(k) > 2][:49]
+    
+    title = response.get("title", "").strip()
+    clean_title = title.replace('"', '').replace("'", "")
+    category = response.get("category", "Uncategorized")
+    
+    raw_ai_desc = response.get('description', '')
+    if clean_title.lower() in raw_ai_desc.lower()[:len(clean_title)+5]:
+        combined_desc = raw_ai_desc 
+    else:
+        combined_desc = f"{clean_title}. {raw_ai_desc}"
+        
+    final_subject_desc = combined_desc[:190].strip()
+    if final_subject_desc.endswith(('.', ',')): 
+        final_subject_desc = final_subject_desc[:-1] + "."
+    elif not final_subject_desc.endswith('.'):
+        final_subject_desc += "."
+
+    flat_kw_comma = ", ".join(clean_kw)
+    
+    final_name = filename
+    if rename:
+        ext = os.path.splitext(filename)[1].lower()
+        safe_title = clean_filename(clean_title)[:50]
+        # UUID tetap dipakai untuk memastikan nama file unik secara fisik
+        final_name = f"{safe_title}_{str(uuid.uuid4())[:4]}{ext}"
+
+    # --- METADATA MAPPING ---
+    tags_to_write = build_metadata_tags(clean_title, final_subject_desc, clean_kw)
+
+    return {
+        "status": "success", 
+        "file": filename,
+        "original_path": source_path, 
+        "new_name": final_name,
+        "file_type": ftype, 
+        "category": category,
+        "tags_data": tags_to_write, 
+        "meta_title": clean_title, 
+        "meta_desc": final_subject_desc, 
+        "meta_kw": flat_kw_comma,
+        "keyword_list": clean_kw,
+        "preview_bytes": None 
+    }
+
+# --- HELPER: Skip Existing (content hash index) ---
+def _sampled_collisions(candidates, partial_hash):
+    """Kandidat berukuran sama yang tidak bisa dibedakan lewat hash sampel (atau belum punya hash sampel)."""
+    return [c for c in candidates if c["partial_hash"] in (None, partial_hash)]
+
+def find_processed_copy(source_path, file_size):
+    """
+    Cari isi file yang sama di history tanpa decode: ukuran -> hash parsial (sampled) -> SHA-256 penuh
+    hanya jika ada kandidat. Return (baris history atau None, dict hash yang sudah dihitung).
+    """
+    hashes = {}
+    candidates = find_content_candidates(file_size)
+    if not candidates: return None, hashes
+    hashes["partial_hash"] = sampled_file_hash(source_path)
+    hits = _sampled_collisions(candidates, hashes["partial_hash"])
+    if not hits: return None, hashes
+    # Entri tanpa SHA-256 (video/vektor yang hash sampelnya unik saat diindex): ukuran + hash sampel yang sama
+    sampled_only = next((c for c in hits if c["full_hash"] is None), None)
+    if sampled_only: return sampled_only, hashes
+    hashes["content_hash"] = file_sha256(source_path)
+    return next((c for c in hits if c["full_hash"] == hashes["content_hash"]), None), hashes
+
 # --- MAIN PROCESSOR (Metadata Generator Only) ---
-def process_single_file(filename, provider, model, api_key, base_url, max_retries, options, full_prompt, source_dir, custom_temp_dir=None, blur_threshold=10.0, user_correction=None):
+def process_single_file(filename, provider, model, api_key, base_url, max_retries, options, full_prompt, source_dir, custom_temp_dir=None, blur_threshold=10.0, user_correction=None, limiter=None):
     thread_id = str(uuid.uuid4())[:8]
     source_path = os.path.join(source_dir, filename)
     ftype = determine_file_type(filename)
@@ -47,35 +141,76 @@ def process_single_file(filename, provider, model, api_key, base_url, max_retrie
     if not os.path.exists(source_path): 
         return {"status": "error", "msg": "File not found"}
 
+    # [BARU] Telemetri per file (disimpan ke tabel file_telemetry oleh pemanggil)
+    t_start = time.perf_counter()
+    telemetry = {"filename": filename, "provider": provider, "model": model, "file_type": ftype,
+                 "file_size": os.path.getsize(source_path), "retries": 0}
+
+    # [BARU] Skip Existing: file yang isinya sudah ada di history (diantrikan ulang, di-rename, dicopy) dilewati
+    if options.get("skip_existing"):
+        with span("skip_check", file=filename):
+            match, hashes = find_processed_copy(source_path, telemetry["file_size"])
+        telemetry.update(hashes)
+        if match:
+            telemetry["load_ms"] = telemetry["total_ms"] = (time.perf_counter() - t_start) * 1000
+            return {"status": "skipped", "reason": "duplicate", "file": filename, "telemetry": telemetry,
+                    "msg": f"Already processed as {match['new_filename']} ({match['output_path']})"}
+
     try:
         # --- 1. SMART LOADING (RAM Optimized) ---
         ai_input_data = None 
         tech_specs = {"context_str": "", "tags": [], "bg_type": "Complex"}
+
+        # [BARU] Preview store: pakai ulang preview dari pass sebelumnya (regenerate/retry)
+        with span("preview_lookup", file=filename):
+            pkey = preview_key(source_path)
+            cached = get_preview(pkey)
+        if cached:
+            pmeta = cached[1]
+            # Foto yang dulu diproses tanpa blur check harus di-load penuh jika sekarang blur check aktif
+            if pmeta.get("tech_specs") and not (ftype == "Photo" and options.get("blur_check", True) and pmeta.get("blur_score") is None):
+                ai_input_data = cached[0]
+                tech_specs = pmeta["tech_specs"]
+                for k in ("content_hash", "width", "height", "blur_score"):
+                    if pmeta.get(k) is not None: telemetry[k] = pmeta[k]
         
+        if ai_input_data:
+            blur_score = telemetry.get("blur_score")
+            if ftype == "Photo" and options.get("blur_check", True) and blur_score < blur_threshold:
+                telemetry["load_ms"] = telemetry["total_ms"] = (time.perf_counter() - t_start) * 1000
+                return {"status": "skipped", "reason": "blurry", "file": filename, "msg": f"Blurry (Score: {blur_score:.1f})", "telemetry": telemetry}
+
         # [ALUR FOTO - RAM MODE]
-        if ftype == "Photo":
-            with open(source_path, "rb") as f: file_bytes = f.read()
-            img_pil = Image.open(io.BytesIO(file_bytes)).convert("RGB")
+        elif ftype == "Photo":
+            with span("decode", file=filename):
+                with open(source_path, "rb") as f: file_bytes = f.read()
+                telemetry["content_hash"] = telemetry.get("content_hash") or file_sha256(source_path, data=file_bytes)
+                img_pil = Image.open(io.BytesIO(file_bytes)).convert("RGB")
+            telemetry["width"], telemetry["height"] = img_pil.size
             
             # Blur Check (Di RAM)
             if options.get("blur_check", True):
-                img_np = np.array(img_pil) 
-                img_cv2 = cv2.cvtColor(img_np, cv2.COLOR_RGB2BGR)
-                blur_score = detect_blur_in_memory(img_cv2)
+                with span("blur", file=filename):
+                    img_np = np.array(img_pil) 
+                    img_cv2 = cv2.cvtColor(img_np, cv2.COLOR_RGB2BGR)
+                    blur_score = detect_blur_in_memory(img_cv2)
+                telemetry["blur_score"] = float(blur_score)
                 
                 if blur_score < blur_threshold:
                     del file_bytes, img_pil, img_np, img_cv2
                     gc.collect()
-                    return {"status": "skipped", "file": filename, "msg": f"Blurry (Score: {blur_score:.1f})"}
+                    telemetry["load_ms"] = telemetry["total_ms"] = (time.perf_counter() - t_start) * 1000
+                    return {"status": "skipped", "reason": "blurry", "file": filename, "msg": f"Blurry (Score: {blur_score:.1f})", "telemetry": telemetry}
                 del img_np, img_cv2 
             
             # Resize (Di RAM)
-            img_pil.thumbnail((1024, 1024))
+            with span("encode", file=filename):
+                img_pil.thumbnail((1024, 1024))
             
-            # Save ke Buffer Memory
-            img_byte_arr = io.BytesIO()
-            img_pil.save(img_byte_arr, format="JPEG", quality=80)
-            ai_input_data = img_byte_arr.getvalue()
+                # Save ke Buffer Memory
+                img_byte_arr = io.BytesIO()
+                img_pil.save(img_byte_arr, format="JPEG", quality=80)
+                ai_input_data = img_byte_arr.getvalue()
             
             # Tech Specs
             w, h = img_pil.size
@@ -87,20 +222,23 @@ def process_single_file(filename, provider, model, api_key, base_url, max_retrie
 
         # [ALUR VIDEO]
         elif ftype == "Video":
-            cap = cv2.VideoCapture(source_path)
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            cap.set(cv2.CAP_PROP_POS_FRAMES, total_frames // 2)
-            ret, frame = cap.read()
-            cap.release()
+            with span("video_frame", file=filename):
+                cap = cv2.VideoCapture(source_path)
+                total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                cap.set(cv2.CAP_PROP_POS_FRAMES, total_frames // 2)
+                ret, frame = cap.read()
+                cap.release()
             
             if not ret: return {"status": "error", "file": filename, "msg": "Video corrupt"}
             
             h, w, _ = frame.shape
-            if w > 1024:
-                scale = 1024 / w
-                frame = cv2.resize(frame, (1024, int(h * scale)))
+            telemetry["width"], telemetry["height"] = w, h
+            with span("encode", file=filename):
+                if w > 1024:
+                    scale = 1024 / w
+                    frame = cv2.resize(frame, (1024, int(h * scale)))
             
-            success, encoded_img = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
+                success, encoded_img = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
             if success:
                 ai_input_data = encoded_img.tobytes()
                 tech_specs["context_str"] = "This is a Stock Footage/Video."
@@ -114,7 +252,8 @@ def process_single_file(filename, provider, model, api_key, base_url, max_retrie
             # WSL: Gunakan 'gs' (Linux)
             args = ["gs", "-dNOPAUSE", "-dBATCH", "-sDEVICE=jpeg", "-dEPSCrop", "-r150", 
                    f"-sOutputFile={preview_path}", source_path]
-            subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            with span("vector_render", file=filename):
+                subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
             if os.path.exists(preview_path):
                 with open(preview_path, "rb") as f:
                     ai_input_data = f.read()
@@ -126,6 +265,15 @@ def process_single_file(filename, provider, model, api_key, base_url, max_retrie
 
         if not ai_input_data:
              return {"status": "error", "file": filename, "msg": "Failed to prepare image data"}
+        if not cached or cached[0] is not ai_input_data:
+            with span("preview_store", file=filename):
+                put_preview(pkey, ai_input_data, {"tech_specs": tech_specs, **{k: telemetry.get(k) for k in ("content_hash", "width", "height", "blur_score")}})
+        if "partial_hash" not in telemetry: telemetry["partial_hash"] = sampled_file_hash(source_path)
+        # Video/vektor: telemetri cukup hash sampel. SHA-256 penuh (baca seluruh file) hanya jika hash sampel
+        # bertabrakan dengan isi lain di content_index, supaya Skip Existing tetap bisa membedakannya.
+        if not telemetry.get("content_hash") and _sampled_collisions(find_content_candidates(telemetry["file_size"]), telemetry["partial_hash"]):
+            with span("content_hash", file=filename): telemetry["content_hash"] = file_sha256(source_path)
+        telemetry["load_ms"] = (time.perf_counter() - t_start) * 1000
 
         # --- 2. AI INFERENCE (FIXED LOGIC FOR UNIQUE BATCH) ---
         
@@ -156,82 +304,45 @@ def process_single_file(filename, provider, model, api_key, base_url, max_retrie
         
         response = None
         last_err = ""
+        usage = {}
+        t_ai = time.perf_counter()
         
         for attempt in range(max_retries + 1):
             try:
-                if attempt > 0: time.sleep(2 * attempt)
-                if provider == "Google Gemini (Native)":
-                    response = run_gemini_engine(model, api_key, ai_input_data, final_prompt)
-                else:
-                    response = run_openai_compatible_engine(model, api_key, base_url, ai_input_data, final_prompt)
+                if attempt > 0:
+                    metrics.record_retry(model)
+                    with span("retry_backoff", file=filename, attempt=attempt): time.sleep(2 * attempt)
+                    # Percobaan pertama sudah antre di run_concurrent; retry juga wajib lewat limiter bersama
+                    if limiter is not None:
+                        with span("limiter_wait", cat="queue"): limiter.acquire()
+                telemetry["retries"] = attempt
+                with span("ai_call", file=filename, model=model, attempt=attempt), metrics.inflight("ai_inflight"):
+                    if provider == "Google Gemini (Native)":
+                        response = run_gemini_engine(model, api_key, ai_input_data, final_prompt, usage=usage)
+                    else:
+                        response = run_openai_compatible_engine(model, api_key, base_url, ai_input_data, final_prompt, usage=usage)
+                metrics.record_request(model, ok=bool(response))
                 if response: break
-            except Exception as e: last_err = str(e)
+            except Exception as e:
+                last_err = str(e)
+                throttled = is_rate_limit_error(e)
+                metrics.record_request(model, ok=False, rate_limited=throttled)
+                # 429/quota: semua worker langsung mundur, jangan tunggu retry habis
+                if throttled and limiter is not None: limiter.backoff()
         
+        telemetry["ai_ms"] = (time.perf_counter() - t_ai) * 1000
+        telemetry.update(usage)
         if not response:
-            return {"status": "error", "file": filename, "msg": f"AI Fail: {last_err}"}
+            telemetry["total_ms"] = (time.perf_counter() - t_start) * 1000
+            return {"status": "error", "file": filename, "msg": f"AI Fail: {last_err}", "telemetry": telemetry}
 
         # --- 3. DATA PREPARATION ---
-        raw_kw = response.get("keywords", [])
-        if isinstance(raw_kw, str): raw_kw = raw_kw.split(',')
-        clean_kw = [k.strip().lower() for k in raw_kw if len(k) > 2][:49]
-        
-        title = response.get("title", "").strip()
-        clean_title = title.replace('"', '').replace("'", "")
-        category = response.get("category", "Uncategorized")
-        
-        raw_ai_desc = response.get('description', '')
-        if clean_title.lower() in raw_ai_desc.lower()[:len(clean_title)+5]:
-            combined_desc = raw_ai_desc 
-        else:
-            combined_desc = f"{clean_title}. {raw_ai_desc}"
-            
-        final_subject_desc = combined_desc[:190].strip()
-        if final_subject_desc.endswith(('.', ',')): 
-            final_subject_desc = final_subject_desc[:-1] + "."
-        elif not final_subject_desc.endswith('.'):
-            final_subject_desc += "."
-
-        flat_kw_windows = ";".join(clean_kw)
-        flat_kw_comma = ", ".join(clean_kw)
-        
-        final_name = filename
-        if options.get("rename", True):
-            ext = os.path.splitext(filename)[1].lower()
-            safe_title = clean_filename(clean_title)[:50]
-            # UUID tetap dipakai untuk memastikan nama file unik secara fisik
-            final_name = f"{safe_title}_{str(uuid.uuid4())[:4]}{ext}"
-
-        # --- METADATA MAPPING ---
-        tags_to_write = {
-            "XMP:Title": clean_title,
-            "XMP:Description": final_subject_desc, 
-            "XMP:Subject": clean_kw,
-            "IPTC:Headline": clean_title,
-            "IPTC:Caption-Abstract": final_subject_desc,
-            "IPTC:Keywords": clean_kw,
-            "EXIF:XPTitle": clean_title,         
-            "EXIF:XPKeywords": flat_kw_windows,  
-            "EXIF:XPSubject": final_subject_desc,
-            "EXIF:XPComment": final_subject_desc,
-            "EXIF:ImageDescription": final_subject_desc,
-            "XMP:Rating": 5
-        }
-
+        result = build_success_result(response, filename, source_path, ftype, rename=options.get("rename", True))
+        result["preview_key"] = pkey
         gc.collect()
-
-        return {
-            "status": "success", 
-            "file": filename,
-            "original_path": source_path, 
-            "new_name": final_name,
-            "file_type": ftype, 
-            "category": category,
-            "tags_data": tags_to_write, 
-            "meta_title": clean_title, 
-            "meta_desc": final_subject_desc, 
-            "meta_kw": flat_kw_comma,
-            "preview_bytes": None 
-        }
+        telemetry["total_ms"] = (time.perf_counter() - t_start) * 1000
+        result["telemetry"] = telemetry
+        return result
 
     except Exception as e:
         if 'preview_path' in locals() and os.path.exists(preview_path):
@@ -0,0 +1,110 @@
+# rate_limiter.py
+"""
+Executor bersama untuk semua panggilan AI (batch Metadata Auto & Bulk Actions gallery).
+
+- RateLimiter: token bucket bersama lintas thread (request/detik + burst), plus jeda global
+  (backoff) saat provider membalas 429 / quota habis, supaya semua worker ikut mundur.
+- run_concurrent: jalankan fn(item) paralel di belakang limiter, yield hasil sesuai urutan selesai,
+  exception per item ditangkap (kegagalan sebagian tidak menghentikan batch).
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from tracing import span
+
+THROTTLE_BACKOFF = 20.0   # detik jeda global setelah sinyal 429/quota
+THROTTLE_MARKERS = ("429", "quota", "rate limit", "resource has been exhausted", "too many requests")
+
+def is_rate_limit_error(msg):
+    m = str(msg or "").lower()
+    return any(k in m for k in THROTTLE_MARKERS)
+
+class RateLimiter:
+    def __init__(self, rate=None, burst=1):
+        """rate: request per detik (None/0 = tanpa batas). burst: token maksimum yang boleh menumpuk."""
+        self.lock = threading.Lock()
+        self.rate = rate or None
+        self.burst = max(1, int(burst))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.throttle_events = 0
+
+    def configure(self, rate=None, burst=1):
+        with self.lock:
+            self.rate = rate or None
+            self.burst = max(1, int(burst))
+            self.tokens = min(self.tokens, self.burst)
+
+    def acquire(self, cancel_event=None):
+        """Blok sampai boleh mengirim satu request. Return False jika dibatalkan via cancel_event."""
+        while True:
+            if cancel_event is not None and cancel_event.is_set(): return False
+            with self.lock:
+                now = time.monotonic()
+                wait = self.paused_until - now
+                if wait <= 0:
+                    if self.rate is None: return True
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return True
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(min(wait, 0.5))
+
+    def backoff(self, seconds=None):
+        """Jeda global: semua worker menunggu sebelum request berikutnya."""
+        seconds = THROTTLE_BACKOFF if seconds is None else seconds
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+            self.throttle_events += 1
+
+def rate_from_settings(num_workers, request_delay):
+    """Setara perilaku lama (tiap worker sleep `request_delay` sebelum request): workers / delay req/detik."""
+    if not request_delay or request_delay <= 0: return None
+    return max(1, num_workers) / request_delay
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(name, rate=None, burst=1):
+    """Limiter bersama per nama (mis. provider). Dipanggil ulang dengan rate baru -> dikonfigurasi ulang."""
+    with _limiters_lock:
+        lim = _limiters.get(name)
+        if lim is None:
+            lim = _limiters[name] = RateLimiter(rate, burst)
+        else:
+            lim.configure(rate, burst)
+        return lim
+
+def run_concurrent(fn, items, max_workers=1, limiter=None, is_throttled=None, cancel_event=None, pause_event=None):
+    """
+    Generator: yield (item, result, error) untuk setiap item sesuai urutan selesai.
+    is_throttled(result, error) -> True memicu limiter.backoff() untuk semua worker.
+    Item yang belum mulai saat cancel_event di-set dilewati (error = "cancelled").
+    Selama pause_event di-set, item baru tidak dimulai; request yang sedang berjalan tetap selesai.
+    """
+    def _task(item):
+        while pause_event is not None and pause_event.is_set():
+            if cancel_event is not None and cancel_event.is_set(): break
+            time.sleep(0.2)
+        if cancel_event is not None and cancel_event.is_set():
+            raise RuntimeError("cancelled")
+        if limiter is not None:
+            with span("limiter_wait", cat="queue"):
+                acquired = limiter.acquire(cancel_event)
+            if not acquired: raise RuntimeError("cancelled")
+        return fn(item)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as exe:
+        futures = {exe.submit(_task, it): it for it in items}
+        for fut in as_completed(futures):
+            item = futures[fut]
+            try: result, error = fut.result(), None
+            except Exception as e: result, error = None, e
+            if limiter is not None and is_throttled is not None and is_throttled(result, error):
+                limiter.backoff()
+            yield item, result, error
@@ -0,0 +1,124 @@
+# report_writer.py
+"""
+Report CSV per agency (Master, Adobe Stock, Getty, Shutterstock) yang ditulis inkremental.
+
+Setiap hasil batch langsung di-append ke keempat CSV (buffer kecil, flush tiap
+REPORT_FLUSH_ROWS baris), jadi memori tidak tumbuh dengan ukuran batch dan data tetap ada
+di file `.part` jika proses mati. finalize() melakukan flush + fsync lalu os.replace ke nama
+final (atomik). Report batch mana pun bisa dibuat ulang dari DB (history.batch_id).
+"""
+import os
+import csv
+import datetime
+from collections import defaultdict
+
+from config import REPORT_FLUSH_ROWS
+from database import iter_history
+from processor import determine_file_type
+
+# --- 1. ROW BUILDERS ---
+
+def _master(r):
+    return {"Filename": r['new_name'], "Original": r['file'], "Title": r['title'], "Description": r['desc'], "Keywords": r['keywords'],
+            "Category": r['category'], "Type": r['file_type'], "Date": r['date'], "Time": r['time'], "Releases": "", "Country": "",
+            "Editorial": "No", "Mature Content": "No", "Illustration": r['illustration'], "Batch ID": r['batch_id'] or ""}
+
+def _adobe(r):
+    return {"Filename": r['new_name'], "Title": r['title'], "Keywords": r['keywords'], "Category": r['category'], "Releases": ""}
+
+def _getty(r):
+    return {"file name": r['new_name'], "created date": r['date'], "description": r['desc'], "country": "", "brief code": "",
+            "title": r['title'], "keywords": r['keywords']}
+
+def _shutterstock(r):
+    return {"Filename": r['new_name'], "Description": r['desc'], "Keywords": r['keywords'], "Categories": r['category'],
+            "Editorial": "No", "Mature content": "No", "illustration": r['illustration']}
+
+# Urutan sama dengan tuple lama prepare_csv_rows: (master, adobe, getty, shutterstock)
+AGENCIES = {"Master": _master, "Adobe": _adobe, "Getty": _getty, "Shutterstock": _shutterstock}
+
+def _record(new_name, original, title, desc, keywords, category, file_type, when, batch_id):
+    return {"new_name": new_name, "file": original, "title": title, "desc": desc, "keywords": keywords, "category": category,
+            "file_type": file_type, "illustration": "Yes" if file_type == "Vector" else "No",
+            "date": when.strftime("%Y-%m-%d"), "time": when.strftime("%H:%M:%S"), "batch_id": batch_id}
+
+def record_from_result(res, batch_id=None):
+    """Hasil sukses process_single_file -> record netral untuk semua agency."""
+    return _record(res['new_name'], res['file'], res['meta_title'], res['meta_desc'], res['meta_kw'], res['category'],
+                   res.get('file_type'), datetime.datetime.now(), batch_id)
+
+def record_from_history(row):
+    """Baris history (dict) -> record. Tipe file diturunkan dari ekstensi."""
+    try: when = datetime.datetime.strptime(row['timestamp'], "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError): when = datetime.datetime.now()
+    return _record(row['new_filename'], row['filename'], row['title'], row['description'], row['keywords'], row['category'],
+                   determine_file_type(row['new_filename'] or ""), when, row.get('batch_id'))
+
+# --- 2. WRITER ---
+
+class ReportWriter:
+    """
+    Satu file per agency: <out_dir>/<prefix>_<Agency>.csv (ditulis sebagai .part sampai finalize).
+    Tidak thread-safe; dipanggil dari satu thread (job batch).
+    """
+    def __init__(self, out_dir, prefix, agencies=None, flush_rows=REPORT_FLUSH_ROWS):
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.agencies = list(agencies or AGENCIES)
+        self.flush_rows = max(1, flush_rows)
+        self.rows_written = 0
+        self._buffer = []
+        self._files = {}
+        self._writers = {}
+
+    def path_for(self, agency):
+        return os.path.join(self.out_dir, f"{self.prefix}_{agency}.csv")
+
+    def _open(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        for agency in self.agencies:
+            f = open(self.path_for(agency) + ".part", "w", newline="", encoding="utf-8")
+            w = csv.DictWriter(f, fieldnames=list(AGENCIES[agency](defaultdict(str))))
+            w.writeheader()
+            self._files[agency], self._writers[agency] = f, w
+
+    def add(self, record):
+        self._buffer.append(record)
+        if len(self._buffer) >= self.flush_rows: self.flush()
+
+    def flush(self):
+        if not self._buffer: return
+        if not self._files: self._open()
+        for agency in self.agencies:
+            build = AGENCIES[agency]
+            self._writers[agency].writerows(build(r) for r in self._buffer)
+            self._files[agency].flush()
+        self.rows_written += len(self._buffer)
+        self._buffer.clear()
+
+    def finalize(self):
+        """Flush sisa buffer, fsync, rename .part -> .csv. Return dict agency -> path (kosong jika tidak ada baris)."""
+        self.flush()
+        paths = {}
+        for agency, f in self._files.items():
+            os.fsync(f.fileno()); f.close()
+            path = self.path_for(agency)
+            os.replace(path + ".part", path)
+            paths[agency] = path
+        self._files.clear(); self._writers.clear()
+        return paths
+
+    def abort(self):
+        """Tutup & hapus file .part (export yang gagal). Batch tidak memanggil ini: .part-nya sengaja disimpan."""
+        for agency, f in self._files.items():
+            f.close()
+            try: os.remove(self.path_for(agency) + ".part")
+            except OSError: pass
+        self._files.clear(); self._writers.clear(); self._buffer.clear()
+
+def regenerate_report(batch_id, out_dir, agencies=None):
+    """Buat ulang report agency untuk satu batch langsung dari DB. Return (dict agency -> path, jumlah baris)."""
+    writer = ReportWriter(out_dir, f"Batch_{batch_id}_regen", agencies)
+    for row in iter_history({"batch_id": batch_id}):
+        writer.add(record_from_history(row))
+    return writer.finalize(), writer.rows_written
@@ -0,0 +1,107 @@
+"""
+Fast path jpeg_metadata: hasil tulis native harus terbaca sama seperti hasil ExifTool,
+dan dataset IPTC milik pihak lain (By-line, Copyright, ...) tidak boleh hilang.
+Test ExifTool di-skip jika binary exiftool tidak ada.
+"""
+import io
+import json
+import shutil
+import subprocess
+
+import pytest
+from PIL import Image
+
+from jpeg_metadata import (write_jpeg_metadata, build_app13, existing_iptc_block, _parse_iim, _iptc_dataset,
+                           _read_header_segments, _segment_bytes, PS_SIG)
+from processor import build_metadata_tags
+from exiftool_pool import ExifToolPool
+
+HAS_EXIFTOOL = shutil.which("exiftool") is not None
+needs_exiftool = pytest.mark.skipif(not HAS_EXIFTOOL, reason="exiftool tidak terpasang")
+
+TITLE = "Red fox in a snowy forest"
+DESC = "Wild red fox standing in fresh snow, winter wildlife — ünïcödé"
+KEYWORDS = ["fox", "red fox", "snow", "winter", "wildlife", "forest", "animal"]
+COMPARED = ["XMP-dc:Title", "XMP-dc:Description", "XMP-dc:Subject", "IPTC:Headline", "IPTC:Caption-Abstract", "IPTC:Keywords"]
+
+def _jpeg(path, iptc_block=None):
+    buf = io.BytesIO()
+    Image.new("RGB", (32, 24), (180, 40, 20)).save(buf, "JPEG")
+    data = buf.getvalue()
+    if iptc_block is not None:
+        data = data[:2] + _segment_bytes(0xED, build_app13(None, iptc_block)) + data[2:]
+    path.write_bytes(data)
+    return str(path)
+
+def _credit_block(byline=b"Jane Photographer", copyright=b"(c) Jane"):
+    return (_iptc_dataset(1, 90, b"\x1b%G") + _iptc_dataset(2, 0, b"\x00\x04") + _iptc_dataset(2, 25, b"old keyword")
+            + _iptc_dataset(2, 80, byline) + _iptc_dataset(2, 105, b"Old headline") + _iptc_dataset(2, 116, copyright))
+
+def _iptc_of(path):
+    with open(path, "rb") as f:
+        segments = _read_header_segments(f)
+    app13 = next((p for m, p in segments if m == 0xED and p.startswith(PS_SIG)), None)
+    return _parse_iim(existing_iptc_block(app13))
+
+def _exiftool_read(path):
+    out = subprocess.run(["exiftool", "-json", "-charset", "iptc=UTF8"] + [f"-{t}" for t in COMPARED + ["IPTC:By-line", "IPTC:CopyrightNotice"]] + [path],
+                         capture_output=True, text=True, check=True).stdout
+    rec = json.loads(out)[0]
+    rec.pop("SourceFile", None)
+    return {k: v if isinstance(v, list) else [v] if k in ("Subject", "Keywords") else v for k, v in rec.items()}
+
+# --- IPTC: dataset lain dipertahankan ---
+
+def test_native_write_keeps_foreign_iptc_datasets(tmp_path):
+    path = _jpeg(tmp_path / "credit.jpg", _credit_block())
+    ok, info = write_jpeg_metadata(path, build_metadata_tags(TITLE, DESC, KEYWORDS))
+    assert ok, info
+    datasets = _iptc_of(path)
+    values = lambda r, d: [v for rr, dd, v in datasets if (rr, dd) == (r, d)]
+    assert values(2, 80) == [b"Jane Photographer"]
+    assert values(2, 116) == [b"(c) Jane"]
+    assert values(2, 105) == [TITLE.encode()]
+    assert values(2, 120) == [DESC.encode()]
+    assert values(2, 25) == [k.encode() for k in KEYWORDS]
+    assert values(1, 90) == [b"\x1b%G"] and values(2, 0) == [b"\x00\x04"]
+
+def test_non_utf8_iptc_falls_back_to_exiftool(tmp_path):
+    # Tanpa 1:90 = UTF-8, By-line latin-1 akan rusak jika ditandai UTF-8 -> fast path menolak
+    block = _iptc_dataset(2, 80, "José".encode("latin-1"))
+    path = _jpeg(tmp_path / "latin1.jpg", block)
+    before = open(path, "rb").read()
+    ok, _ = write_jpeg_metadata(path, build_metadata_tags(TITLE, DESC, KEYWORDS))
+    assert not ok
+    assert open(path, "rb").read() == before
+
+def test_extended_iptc_dataset_falls_back_to_exiftool(tmp_path):
+    block = _iptc_dataset(2, 80, b"Jane") + b"\x1c\x02\x74\x80\x04\x00\x00\x00\x04abcd"
+    path = _jpeg(tmp_path / "extended.jpg", block)
+    ok, _ = write_jpeg_metadata(path, build_metadata_tags(TITLE, DESC, KEYWORDS))
+    assert not ok
+
+# --- Kompatibilitas dengan ExifTool ---
+
+@pytest.fixture
+def exiftool_pool():
+    pool = ExifToolPool(1)
+    yield pool
+    pool.close()
+
+@needs_exiftool
+@pytest.mark.parametrize("iptc_block", [None, _credit_block()], ids=["plain", "with-credit"])
+def test_native_output_matches_exiftool(tmp_path, exiftool_pool, iptc_block):
+    tags = build_metadata_tags(TITLE, DESC, KEYWORDS)
+    native = _jpeg(tmp_path / "native.jpg", iptc_block)
+    reference = _jpeg(tmp_path / "exiftool.jpg", iptc_block)
+    ok, info = write_jpeg_metadata(native, dict(tags))
+    assert ok, info
+    [res] = exiftool_pool.write_batch([{"path": reference, "tags": dict(tags)}])
+    assert res["ok"], res["msg"]
+
+    got, expected = _exiftool_read(native), _exiftool_read(reference)
+    assert got == expected
+    assert got["Title"] == TITLE and got["Headline"] == TITLE
+    assert got["Subject"] == KEYWORDS and got["Keywords"] == KEYWORDS
+    if iptc_block is not None:
+        assert got["By-line"] == "Jane Photographer" and got["CopyrightNotice"] == "(c) Jane"
@@ -0,0 +1,120 @@
+# thumbnails.py
+"""
+Thumbnail gallery berbasis konten (sampled hash) di DiskLRUCache.
+
+Gallery hanya mengirim thumbnail kecil (WebP/JPEG, sisi terpanjang THUMBNAIL_SIZE)
+ke browser, bukan file output 20-50MB. Thumbnail dibuat saat batch finalisasi dan
+secara lazy untuk baris lama. Foto, frame tengah video, dan render vector (gs) didukung.
+"""
+import io
+import os
+import subprocess
+import tempfile
+import threading
+
+import cv2
+from PIL import Image, ImageOps, features
+
+from config import THUMBNAIL_CACHE_DIR, THUMBNAIL_CACHE_MAX_MB, THUMBNAIL_SIZE
+from disk_cache import DiskLRUCache
+from processor import determine_file_type
+from utils import sampled_file_hash
+
+THUMB_FORMAT = "WEBP" if features.check("webp") else "JPEG"
+THUMB_EXT = ".webp" if THUMB_FORMAT == "WEBP" else ".jpg"
+THUMB_QUALITY = 80
+
+_cache = DiskLRUCache(THUMBNAIL_CACHE_DIR, THUMBNAIL_CACHE_MAX_MB * 1024 * 1024, suffix=THUMB_EXT)
+_memo_lock = threading.Lock()
+_key_memo = {}    # (path, size, mtime_ns) -> cache key; hindari hash ulang tiap rerun
+_failed = set()   # (path, size, mtime_ns) yang gagal dirender; jangan dicoba ulang tiap rerun
+
+# --- 1. RENDERERS ---
+
+def _load_photo(path):
+    img = Image.open(path)
+    # draft(): decoder JPEG langsung downscale (1/2..1/8) -> jauh lebih cepat untuk file besar
+    img.draft("RGB", (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    return ImageOps.exif_transpose(img).convert("RGB")
+
+def _load_video(path):
+    cap = cv2.VideoCapture(path)
+    try:
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.set(cv2.CAP_PROP_POS_FRAMES, max(0, total // 2))
+        ok, frame = cap.read()
+    finally:
+        cap.release()
+    if not ok: return None
+    return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+def _load_vector(path):
+    if path.lower().endswith(".svg"): return None  # gs tidak membaca SVG
+    fd, out = tempfile.mkstemp(suffix=".jpg"); os.close(fd)
+    try:
+        subprocess.run(["gs", "-dNOPAUSE", "-dBATCH", "-dSAFER", "-sDEVICE=jpeg", "-dEPSCrop", "-r72",
+                        "-dFirstPage=1", "-dLastPage=1", f"-sOutputFile={out}", path],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=60)
+        if os.path.getsize(out) == 0: return None
+        with Image.open(out) as img: return img.convert("RGB")
+    except (OSError, subprocess.SubprocessError):
+        return None
+    finally:
+        try: os.remove(out)
+        except OSError: pass
+
+def make_thumbnail(path):
+    """Render thumbnail ke bytes (THUMB_FORMAT). Return None jika tipe/isi file tidak bisa dirender."""
+    ftype = determine_file_type(path)
+    if ftype == "Photo": img = _load_photo(path)
+    elif ftype == "Video": img = _load_video(path)
+    elif ftype == "Vector": img = _load_vector(path)
+    else: return None
+    if img is None: return None
+    img.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    buf = io.BytesIO()
+    img.save(buf, format=THUMB_FORMAT, quality=THUMB_QUALITY)
+    return buf.getvalue()
+
+# --- 2. CACHE API ---
+
+def _cache_key(path, sig):
+    with _memo_lock:
+        key = _key_memo.get(sig)
+    if key: return key
+    key = f"{sampled_file_hash(path)}_{THUMBNAIL_SIZE}"
+    with _memo_lock:
+        if len(_key_memo) > 4096: _key_memo.clear()
+        _key_memo[sig] = key
+    return key
+
+def get_thumbnail(path, create=True, stat=None):
+    """
+    Path thumbnail ter-cache untuk file ini, dibuat jika belum ada (create=True).
+    stat: hasil os.stat yang sudah ada (mis. dari fs_cache) agar tidak stat ulang.
+    Return None jika file tidak ada / tidak bisa dirender.
+    """
+    try:
+        st = stat or os.stat(path)
+        sig = (path, st.st_size, st.st_mtime_ns)
+        if sig in _failed: return None
+        key = _cache_key(path, sig)
+        cached = _cache.get(key)
+        if cached or not create: return cached
+        data = make_thumbnail(path)
+        if data is None:
+            _failed.add(sig)
+            return None
+        return _cache.put(key, data)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[WARN] Thumbnail gagal untuk {os.path.basename(path)}: {e}")
+        return None
+
+def ensure_thumbnail(path):
+    """Dipanggil saat finalisasi batch supaya gallery langsung dapat thumbnail."""
+    return get_thumbnail(path, create=True)
+
+def get_cache_stats():
+    return _cache.get_stats()
@@ -0,0 +1,114 @@
+# tracing.py
+"""
+Tracing ringan per tahap (span) untuk melihat ke mana waktu batch habis:
+decode, blur, encode, antrian limiter, API, ExifTool, pemindahan file, DB.
+
+- Mati secara default (TRACE_ENABLED) dan bisa di-toggle saat runtime (set_enabled).
+  Saat mati, atau tidak ada sesi aktif, span() mengembalikan context manager kosong.
+- Setiap span dicatat dengan thread ID ke semua sesi yang aktif (satu sesi per job batch).
+- Akhir sesi: Chrome trace JSON (buka di chrome://tracing atau ui.perfetto.dev) +
+  tabel ringkasan per tahap (count, total, mean, p50, p95, max).
+"""
+import os
+import json
+import time
+import threading
+from contextlib import nullcontext
+
+from config import TRACE_ENABLED, TRACE_DIR, TRACE_MAX_EVENTS
+
+_enabled = TRACE_ENABLED
+_sessions = []
+_lock = threading.Lock()
+_NOOP = nullcontext()
+
+def set_enabled(on):
+    global _enabled
+    _enabled = bool(on)
+
+def is_enabled():
+    return _enabled
+
+class TraceSession:
+    def __init__(self, label, max_events=TRACE_MAX_EVENTS):
+        self.label = label
+        self.max_events = max_events
+        self.t0 = time.perf_counter_ns()
+        self.events = []      # (name, cat, start_ns, dur_ns, tid, args)
+        self.threads = {}     # tid -> nama thread
+        self.dropped = 0
+
+    def add(self, event, thread_name):
+        if len(self.events) >= self.max_events:
+            self.dropped += 1; return
+        self.events.append(event)
+        self.threads.setdefault(event[4], thread_name)
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "t0")
+
+    def __init__(self, name, cat, args):
+        self.name, self.cat, self.args = name, cat, args
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        dur = time.perf_counter_ns() - self.t0
+        if exc_type is not None: self.args["error"] = exc_type.__name__
+        thread = threading.current_thread()
+        event = (self.name, self.cat, self.t0, dur, thread.ident, self.args)
+        with _lock:
+            for s in _sessions: s.add(event, thread.name)
+        return False
+
+def span(name, cat="batch", **args):
+    """`with span("decode", file=fname):` — no-op jika tracing mati atau tidak ada sesi."""
+    if not _enabled or not _sessions: return _NOOP
+    return _Span(name, cat, args)
+
+# --- SESI ---
+
+def start_session(label):
+    session = TraceSession(label)
+    with _lock: _sessions.append(session)
+    return session
+
+def end_session(session):
+    with _lock:
+        if session in _sessions: _sessions.remove(session)
+
+def export_chrome(session, path):
+    """Tulis Chrome trace JSON (event 'X' + nama thread). Return path."""
+    pid = os.getpid()
+    events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+              for tid, name in session.threads.items()]
+    events += [{"name": n, "cat": c, "ph": "X", "ts": (start - session.t0) / 1000, "dur": dur / 1000, "pid": pid, "tid": tid, "args": a}
+               for n, c, start, dur, tid, a in session.events]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".part", "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms",
+                   "otherData": {"label": session.label, "dropped": session.dropped}}, f, default=str)
+    os.replace(path + ".part", path)
+    return path
+
+def summarize(session):
+    """List dict per tahap, urut total waktu terbesar. Span bersarang dihitung di tahapnya masing-masing."""
+    by_stage = {}
+    for name, cat, _, dur, _, _ in session.events:
+        by_stage.setdefault((cat, name), []).append(dur / 1e6)
+    rows = []
+    for (cat, name), durs in by_stage.items():
+        durs.sort()
+        n = len(durs)
+        rows.append({"stage": name, "cat": cat, "count": n, "total_ms": round(sum(durs), 1), "mean_ms": round(sum(durs) / n, 2),
+                     "p50_ms": round(durs[n // 2], 2), "p95_ms": round(durs[min(n - 1, int(n * 0.95))], 2), "max_ms": round(durs[-1], 2)})
+    return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+def finish_session(session, out_dir=TRACE_DIR):
+    """Tutup sesi. Return (path trace JSON, ringkasan) atau (None, []) jika tidak ada span."""
+    end_session(session)
+    if not session.events: return None, []
+    path = export_chrome(session, os.path.join(out_dir, f"{session.label}.json"))
+    return path, summarize(session)
@@ -2,7 +2,8 @@ import re
 import json
 import subprocess
 import os # Tambahkan os
-from config import MODEL_PRICES
+import hashlib
+from config import MODEL_PRICES, STOCK_CATEGORIES
 
 def clean_filename(title):
     # Hapus karakter aneh file system
@@ -42,10 +43,38 @@ def extract_json(text):
     # 4. Jika gagal total, return dict kosong agar aplikasi tidak crash
     return {}
 
+def file_sha256(path, data=None, chunk_size=1024 * 1024):
+    """SHA-256 isi file. Jika bytes file sudah ada di RAM (data), tidak dibaca ulang dari disk."""
+    h = hashlib.sha256()
+    if data is not None:
+        h.update(data)
+    else:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""): h.update(chunk)
+    return h.hexdigest()
+
+def sampled_file_hash(path, block_size=64 * 1024, samples=3):
+    """
+    Hash konten murah untuk file besar: ukuran + beberapa blok (awal, tengah..., akhir).
+    Cukup untuk kunci cache (thumbnail, preview); bukan pengganti SHA-256 penuh.
+    """
+    size = os.path.getsize(path)
+    h = hashlib.sha1(str(size).encode())
+    with open(path, "rb") as f:
+        if size <= block_size * (samples + 1):
+            h.update(f.read())
+        else:
+            step = (size - block_size) // samples
+            for i in range(samples + 1):
+                f.seek(min(i * step, size - block_size))
+                h.update(f.read(block_size))
+    return h.hexdigest()
+
 def calculate_cost(model_name, tokens_in, tokens_out):
     price = MODEL_PRICES["default"]
-    for key in MODEL_PRICES:
-        if key in model_name.lower():
+    # Key paling spesifik yang cocok menang ("gemini-1.5-pro" sebelum "gemini")
+    for key in sorted(MODEL_PRICES, key=len, reverse=True):
+        if key in (model_name or "").lower():
             price = MODEL_PRICES[key]
             break
     cost = (tokens_in / 1_000_000 * price["in"]) + (tokens_out / 1_000_000 * price["out"])
@@ -84,7 +113,7 @@ def construct_prompt_template(title_rule, desc_rule):
         "title": "{title_rule}", 
         "description": "{desc_rule}", 
         "keywords": "comma separated string of 50 keywords",
-        "category": "Pick ONE: People, Nature, Business, Food, Travel, Architecture, Animals, Lifestyle, Technology, Abstract"
+        "category": "Pick ONE: {", ".join(STOCK_CATEGORIES)}"
     }}
     INSTRUCTIONS:
     1. Title: Focus on WHAT is happening. Must be under 200 characters.
@@ -0,0 +1,97 @@
+# video_metadata.py
+"""
+Strategi metadata untuk video besar (.mp4/.mov) tanpa menulis ulang data media.
+
+Mode per tipe file (lihat VIDEO_METADATA_MODES di config):
+- "embed"   : perilaku lama, ExifTool menulis ulang seluruh file.
+- "sidecar" : hanya file .xmp di samping video (create_xmp_sidecar).
+- "inplace" : sidecar + box XMP (`uuid` BE7ACFCB-...) di level teratas container ditulis
+              in-place. Box media (mdat) tidak pernah digeser, jadi offset chunk tetap valid.
+              Jika struktur container tidak aman untuk diubah, otomatis turun ke "sidecar".
+"""
+import os
+import struct
+
+from jpeg_metadata import build_xmp_segment, XMP_SIG
+
+EMBED, SIDECAR, INPLACE = "embed", "sidecar", "inplace"
+INPLACE_EXTS = ('.mp4', '.mov', '.m4v')
+
+XMP_UUID = bytes.fromhex("BE7ACFCB97A942E89C71999491E3AFAC")
+KNOWN_TOP_LEVEL = {b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"uuid", b"pnot", b"meta", b"moof", b"mfra", b"styp", b"sidx", b"pdin"}
+
+class UnsupportedContainer(Exception):
+    """Container tidak bisa diubah in-place dengan aman."""
+
+# --- 1. BOX PARSER ---
+
+def read_top_level_boxes(f, file_size):
+    """Return list dict {offset, size, type, uuid} untuk box level teratas."""
+    boxes, pos = [], 0
+    while pos < file_size:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8: raise UnsupportedContainer("Truncated box header")
+        size, btype = struct.unpack(">I4s", header)
+        header_len = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header_len = 16
+        elif size == 0:
+            raise UnsupportedContainer("Box extends to EOF (size 0)")
+        if size < header_len or pos + size > file_size: raise UnsupportedContainer(f"Invalid box size for {btype!r}")
+        if btype not in KNOWN_TOP_LEVEL: raise UnsupportedContainer(f"Unknown top-level box {btype!r}")
+        box_uuid = f.read(16) if btype == b"uuid" else None
+        boxes.append({"offset": pos, "size": size, "type": btype, "uuid": box_uuid})
+        pos += size
+    if not any(b["type"] == b"moov" for b in boxes): raise UnsupportedContainer("No moov box")
+    return boxes
+
+# --- 2. IN-PLACE XMP BOX ---
+
+def _free_box(size):
+    return struct.pack(">I4s", size, b"free") + b"\x00" * (size - 8)
+
+def write_xmp_box_inplace(path, title, desc, keywords):
+    """
+    Tulis/ganti box XMP tanpa menyentuh mdat. Return bytes yang ditulis ke disk.
+    Urutan pilihan: timpa box lama (+sisa jadi 'free') -> potong box terakhir lalu append
+    -> tandai box lama sebagai 'free' lalu append di ujung file.
+    """
+    xmp = build_xmp_segment(title, desc, keywords)[len(XMP_SIG):]
+    new_box = struct.pack(">I4s", 8 + 16 + len(xmp), b"uuid") + XMP_UUID + xmp
+    file_size = os.path.getsize(path)
+
+    with open(path, "r+b") as f:
+        boxes = read_top_level_boxes(f, file_size)
+        old = next((b for b in boxes if b["type"] == b"uuid" and b["uuid"] == XMP_UUID), None)
+
+        if old and old is boxes[-1]:
+            f.seek(old["offset"]); f.write(new_box); f.truncate()
+            return len(new_box)
+        if old and (old["size"] == len(new_box) or old["size"] - len(new_box) >= 8):
+            f.seek(old["offset"]); f.write(new_box)
+            if old["size"] > len(new_box): f.write(_free_box(old["size"] - len(new_box)))
+            return old["size"]
+        if old:
+            f.seek(old["offset"] + 4); f.write(b"free")
+        f.seek(file_size); f.write(new_box)
+        return len(new_box) + (4 if old else 0)
+
+# --- 3. STRATEGY ---
+
+def resolve_mode(path, modes):
+    """Mode efektif untuk file ini (inplace hanya untuk container ISO-BMFF/QuickTime)."""
+    ext = os.path.splitext(path)[1].lower()
+    mode = (modes or {}).get(ext, EMBED)
+    if mode == INPLACE and ext not in INPLACE_EXTS: mode = SIDECAR
+    return mode
+
+def apply_video_metadata(path, title, desc, keywords, mode):
+    """Jalankan mode non-embed pada file output. Return (mode_terpakai, bytes_written)."""
+    if mode == INPLACE:
+        try:
+            return INPLACE, write_xmp_box_inplace(path, title, desc, keywords)
+        except (UnsupportedContainer, OSError, struct.error) as e:
+            print(f"[WARN] In-place XMP gagal untuk {os.path.basename(path)}, pakai sidecar saja: {e}")
+    return SIDECAR, 0
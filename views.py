@@ -3,8 +3,7 @@ import streamlit as st
 import os
 import glob
 import time
-import shutil
-import signal
+import json
 import pandas as pd
 import datetime
 import math
@@ -12,24 +11,54 @@ import google.generativeai as genai
 from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 
 # Import local modules
-from config import MODEL_PRICES, PROMPT_PRESETS, PROVIDERS, DEFAULT_INTERNAL_OUTPUT, BASE_WORK_DIR, EXIFTOOL_PATH
-from database import get_history_df, clear_history, add_prompt_history, get_prompt_history_df, clear_prompt_history, get_paginated_history, add_history_entry
+from config import MODEL_PRICES, PROMPT_PRESETS, PROVIDERS, DEFAULT_INTERNAL_OUTPUT, BASE_WORK_DIR, EXIFTOOL_PATH, VIDEO_METADATA_MODES, JOB_POLL_INTERVAL, IMPORT_MIN_KEYWORDS
+from database import (
+    clear_history, query_history, get_history_ids, count_history_filtered, get_history_categories, export_history_csv, HISTORY_COLUMNS,
+    add_prompt_history, get_prompt_history_df, clear_prompt_history, get_history_page, count_history
+)
 
 # Import utils
 from utils import construct_prompt_template 
-from image_ops import create_xmp_sidecar, calculate_similarity_percentage
-from processor import process_single_file
+from image_ops import calculate_similarity_percentage
+from bulk_edit import run_bulk_edit, parse_instruction, describe_spec
+from thumbnails import get_thumbnail
+import fs_cache
+from job_manager import start_job, get_job, active_jobs, job_history, pause_job, resume_job, cancel_job, cancel_all, mark_resumed, ACTIVE as JOB_ACTIVE
+from batch_runner import run_metadata_batch, run_bulk_regenerate
+from report_writer import regenerate_report, AGENCIES
+from metadata_import import run_metadata_import
+from export_engine import export_catalog, EXPORT_FORMATS, PARQUET, HAS_PARQUET
+import tracing
+import metrics
 
 # Import Helpers
 from app_helpers import (
     handle_input_picker, handle_output_picker, handle_temp_picker,
     update_manual_input_path, update_manual_output_path, update_preset,
-    force_navigate, save_settings, get_file_hash_wrapper,
-    flush_metadata_queue, prepare_csv_rows, regenerate_metadata_and_rename,
-    get_hardware_status
+    force_navigate, save_settings, load_settings, get_file_hash_wrapper,
+    regenerate_metadata_and_rename, get_video_modes,
+    get_hardware_status, regenerate_text_only, needs_visual_context
 )
 
 # --- COMPONENT: SIDEBAR ---
+# --- COMPONENT: LIVE METRICS (sidebar) ---
+def _render_live_metrics():
+    """Di-poll selama ada job aktif; angka sama dengan endpoint Prometheus /metrics."""
+    snap = metrics.snapshot()
+    with st.expander("📈 Live Metrics", expanded=bool(active_jobs())):
+        c1, c2 = st.columns(2)
+        c1.metric("Images/min", f"{snap['images_per_min']:.1f}")
+        c2.metric("Cost/image", f"${snap['cost_per_image']:.5f}" if snap['cost_per_image'] is not None else "-")
+        c1.metric("Requests", f"{snap['requests']:,}")
+        c2.metric("429s", f"{snap['rate_limited']:,}")
+        q = snap['queues']
+        ai_avg = f"{snap['ai_mean_s']:.2f}s" if snap['ai_mean_s'] is not None else "-"
+        st.caption(f"Retries {snap['retries']:,} · Tokens {snap['tokens_in']:,} in / {snap['tokens_out']:,} out · "
+                   f"Total ${snap['cost']:.4f} · AI avg {ai_avg} · In-flight {q.get('ai_inflight', 0)} · "
+                   f"Finalize queue {q.get('finalize_pending', 0)} · DB queue {q.get('db_writes', 0)}")
+        url = metrics.start_server()
+        if url: st.caption(f"Prometheus: `{url}`")
+
 def render_sidebar(selected_menu):
     with st.sidebar:
         # [STATUS HARDWARE]
@@ -68,6 +97,7 @@ def render_sidebar(selected_menu):
             
             st.session_state['active_api_key_for_correction'] = active_api_key
             st.session_state['active_model_for_correction'] = final_model_name
+            st.session_state['active_provider_for_correction'] = provider_choice
             if env_var_name and not detected_key and not active_api_key: 
                 st.caption("⚠️ No API Key found.")
 
@@ -81,6 +111,8 @@ def render_sidebar(selected_menu):
             num_workers = st.slider("Threads (Parallel)", 1, 10, 1, help="Gunakan 1 Thread untuk API Limit rendah (30 RPM).") 
             request_delay = st.slider("Delay per Request (detik)", 0.0, 10.0, 2.5, step=0.5, help="Waktu jeda antar proses agar tidak kena limit.")
             
+            st.session_state['ai_num_workers'], st.session_state['ai_request_delay'] = num_workers, request_delay
+            
             retry_count = st.slider("Max Retries", 0, 5, 3)
             blur_limit = 5.0 
             
@@ -94,10 +126,22 @@ def render_sidebar(selected_menu):
             with c1: st.button("📂", key="btn_temp", on_click=handle_temp_picker, help="Change Staging Folder")
             with c2: st.caption(f"{drive_status}\n`.../{path_display}`")
             
+            # [BARU] Strategi metadata video per tipe file (hindari rewrite file multi-GB)
+            with st.expander("🎬 Video Metadata", expanded=False):
+                saved_modes = get_video_modes()
+                video_modes = {}
+                for ext in VIDEO_METADATA_MODES:
+                    choices = ["inplace", "sidecar", "embed"] if ext in (".mp4", ".mov") else ["sidecar", "embed"]
+                    current = saved_modes.get(ext) if saved_modes.get(ext) in choices else choices[0]
+                    video_modes[ext] = st.selectbox(ext, choices, index=choices.index(current), key=f"vmode_{ext}", help="inplace = box XMP tanpa rewrite media, sidecar = hanya .xmp, embed = rewrite penuh ExifTool")
+                if video_modes != saved_modes: save_settings("video_modes", video_modes)
+
             st.divider()
             opt_skip = st.checkbox("Skip Existing Files", True)
             opt_rename = st.checkbox("Auto Rename", True) 
             opt_folder = st.checkbox("Auto Sort Folders", True)
+            # [BARU] Span per tahap (decode/blur/API/ExifTool/DB...) -> Chrome trace + ringkasan di akhir batch
+            tracing.set_enabled(st.checkbox("🔬 Stage Tracing", tracing.is_enabled(), help="Bisa dinyalakan/dimatikan saat batch berjalan. File trace: logs/traces/<job>.json (chrome://tracing / Perfetto)"))
             
             settings_dict = {
                 "num_workers": num_workers, 
@@ -107,11 +151,14 @@ def render_sidebar(selected_menu):
                 "opt_skip": opt_skip, 
                 "opt_rename": opt_rename, 
                 "opt_folder": opt_folder,
+                "video_modes": video_modes,
                 "provider": provider_choice, 
                 "model": final_model_name, 
                 "api_key": active_api_key
             }
 
+        st.fragment(_render_live_metrics, run_every=JOB_POLL_INTERVAL if active_jobs() else None)()
+
         st.markdown("<div style='margin-top: 40px;'></div>", unsafe_allow_html=True)
         c_s1, c_s2 = st.columns(2)
         with c_s1: 
@@ -119,22 +166,28 @@ def render_sidebar(selected_menu):
         with c_s2: 
             if st.button("🛑 Stop", type="primary", width="stretch"): 
                 st.session_state['watching'] = False 
-                os.kill(os.getpid(), signal.SIGTERM)
+                cancel_all()  # [BARU] Batalkan job (drain request in-flight), bukan mematikan proses
+                st.toast("Stopping background jobs...")
                 
         return settings_dict
 
 # --- COMPONENT: MINIMAL CARD ---
-def render_minimal_card(row, idx):
+def render_minimal_card(row, idx, stat=None):
+    """stat: hasil fs_cache.check_paths untuk file ini (None = tidak ada)."""
     full_path = os.path.join(row['output_path'], row['new_filename'])
-    exists = os.path.exists(full_path)
+    exists = stat is not None
     
     with st.container(border=True):
         if exists:
-            try: st.image(full_path) 
-            except: st.warning("Preview Failed")
+            # Hanya thumbnail ter-cache yang dikirim ke browser, bukan file output full-res
+            thumb = get_thumbnail(full_path, stat=stat)
+            if thumb:
+                try: st.image(thumb)
+                except: st.warning("Preview Failed")
+            else: st.caption("🖼️ No preview")
         else: st.error("Moved/Deleted")
         
-        st.markdown(f"**{row['new_filename'][:25]}...**")
+        st.checkbox(f"**{row['new_filename'][:25]}...**", key=f"sel_{row['id']}", on_change=_toggle_bulk_selection, args=(row['id'],))
         st.caption(f"{row['title'][:40]}..." if row['title'] else "No Title")
         
         try:
@@ -161,76 +214,270 @@ def render_minimal_card(row, idx):
                         if not ak: st.error("API Key Missing")
                         else:
                             with st.spinner("Processing..."):
-                                suc, msg, _ = regenerate_metadata_and_rename(full_path, corr_in, ak, mod, rules)
+                                provider = st.session_state.get('active_provider_for_correction', "Google Gemini (Native)")
+                                if needs_visual_context(corr_in):
+                                    suc, msg, _ = regenerate_metadata_and_rename(full_path, corr_in, ak, mod, rules, provider=provider)
+                                else:
+                                    # Koreksi tekstual: kirim metadata tersimpan saja, tanpa gambar
+                                    _, suc, msg, _ = regenerate_text_only([row], corr_in, ak, mod, rules, provider=provider,
+                                                                          base_url=PROVIDERS.get(provider, {}).get("base_url"))[0]
                                 if suc: st.success("Updated!"); time.sleep(1); st.rerun()
                                 else: st.error(msg)
 
 # --- PAGE: GALLERY ---
+def _toggle_bulk_selection(row_id):
+    if st.session_state.get(f"sel_{row_id}"): st.session_state['bulk_selection'].add(row_id)
+    else: st.session_state['bulk_selection'].discard(row_id)
+
+def _run_bulk_regenerate(selected_ids, instr, api_key, model, provider, rules):
+    """Regenerate paralel sebagai job latar belakang (executor + limiter provider yang sama dengan batch)."""
+    params = {
+        "ids": sorted(selected_ids), "instruction": instr, "provider": provider, "model": model, "rules": rules,
+        "temp_dir": st.session_state.get('temp_folder_path', BASE_WORK_DIR),
+        "num_workers": st.session_state.get('ai_num_workers', 1), "request_delay": st.session_state.get('ai_request_delay', 0),
+        "api_key": api_key,
+    }
+    st.session_state['bulk_job_id'] = start_job("bulk_regenerate", run_bulk_regenerate, params, total=len(params['ids'])).id
+
+def _render_bulk_job():
+    """Panel progres job regenerate; setelah selesai, asset yang sukses keluar dari seleksi (yang gagal tetap terpilih)."""
+    job = get_job(st.session_state.get('bulk_job_id') or "")
+    if job is None: return
+    active = job.status in JOB_ACTIVE
+    if active: st.session_state['job_polling'] = job.id
+    st.fragment(_render_job_status, run_every=JOB_POLL_INTERVAL if active else None)(job.id)
+    if not active and st.session_state.get('bulk_job_synced') != job.id:
+        st.session_state['bulk_selection'].difference_update(job.result.get('ok_ids', []))
+        st.session_state['bulk_job_synced'] = job.id
+
+def _run_bulk_local(selected_ids, spec):
+    """Bulk edit deterministik (bulk_edit.py): DB + metadata file dalam pass batch, tanpa API."""
+    prog = st.progress(0)
+    report = run_bulk_edit(list(selected_ids), spec, progress_cb=lambda done, total: prog.progress(done / max(1, total)))
+    prog.empty()
+    msg = f"{report['updated']} updated · {report['unchanged']} unchanged · {len(report['failed'])} failed · {report['seconds']:.1f}s"
+    if report['failed']:
+        st.warning(msg)
+        with st.expander("Failures", expanded=True):
+            st.dataframe(pd.DataFrame(report['failed'], columns=["File", "Error"]), hide_index=True, width="stretch")
+    else:
+        st.success(msg); time.sleep(1.5); st.rerun()
+
+def _run_bulk_ai(selected_ids, instr):
+    ak = st.session_state.get('active_api_key_for_correction') or st.session_state.get('active_global_api_key')
+    mod = st.session_state.get('active_model_for_correction', 'gemini-1.5-flash')
+    provider = st.session_state.get('active_provider_for_correction', "Google Gemini (Native)")
+    rules = {'title': st.session_state.get('active_title_rule',''), 'desc': st.session_state.get('active_desc_rule','')}
+    if not ak: st.error("No API Key")
+    elif active_jobs("bulk_regenerate"): st.warning("A bulk regenerate job is still running.")
+    else: _run_bulk_regenerate(selected_ids, instr, ak, mod, provider, rules)
+
 def render_gallery_page():
     st.title("🖼️ Smart Gallery")
     c1, c2 = st.columns([3, 1])
     with c1:
-        sq = st.text_input("🔍 Search", value=st.session_state['gallery_search'], placeholder="Filter files...", label_visibility="collapsed")
+        sq = st.text_input("🔍 Search", value=st.session_state['gallery_search'], placeholder="Search title, keywords, filename...", label_visibility="collapsed")
         if sq != st.session_state['gallery_search']:
-            st.session_state['gallery_search'] = sq; st.session_state['gallery_page'] = 1; st.rerun()
+            st.session_state['gallery_search'] = sq; st.session_state['gallery_cursors'] = [None]; st.rerun()
     with c2:
-        _, total = get_paginated_history(1, 1, "")
-        st.metric("Total Assets", total)
+        st.metric("Total Assets", count_history(""))
 
     ITEMS_PER_PAGE = 12
-    rows, total_filtered = get_paginated_history(st.session_state['gallery_page'], ITEMS_PER_PAGE, st.session_state['gallery_search'])
-    total_pages = math.ceil(total_filtered / ITEMS_PER_PAGE) if total_filtered > 0 else 1
+    # Keyset pagination: stack cursor per halaman yang sudah dikunjungi (halaman 1 = None)
+    cursors = st.session_state['gallery_cursors']
+    page_no = len(cursors)
+    rows, next_cursor = get_history_page(st.session_state['gallery_search'], ITEMS_PER_PAGE, cursors[-1])
+    if not rows and page_no > 1:
+        cursors.pop(); st.rerun()  # data berubah & halaman ini kosong -> mundur satu
+    total_filtered = count_history(st.session_state['gallery_search'])
+    total_pages = max(page_no, math.ceil(total_filtered / ITEMS_PER_PAGE) if total_filtered > 0 else 1)
 
     if rows:
         with st.expander("⚡ Bulk Actions", expanded=False):
-            row_map = {f"{r['new_filename']}": r for r in rows}
-            sel = st.multiselect("Select files:", list(row_map.keys()), default=list(row_map.keys()))
-            c_b1, c_b2 = st.columns([4, 1])
-            with c_b1: instr = st.text_input("Instruction", placeholder="e.g. Add keyword '4K'", label_visibility="collapsed")
-            with c_b2:
-                if st.button("🚀 Run", type="primary", width="stretch"):
+            # Seleksi disimpan sebagai set id di session_state -> tetap ada saat pindah halaman
+            sel = st.session_state['bulk_selection']
+            c_s1, c_s2, c_s3, c_s4 = st.columns([2, 2, 3, 1])
+            with c_s1: st.markdown(f"**{len(sel)} selected**")
+            with c_s2:
+                if st.button("Select page", width="stretch"): sel.update(r['id'] for r in rows); st.rerun()
+            with c_s3:
+                if st.button(f"Select all matching ({total_filtered:,})", width="stretch"):
+                    sel.update(get_history_ids(st.session_state['gallery_search'])); st.rerun()
+            with c_s4:
+                if st.button("Clear", width="stretch"): sel.clear(); st.rerun()
+            tab_ai, tab_local = st.tabs(["🤖 AI Instruction", "⚡ Local Edit (no AI)"])
+            with tab_ai:
+                c_b1, c_b2 = st.columns([4, 1])
+                with c_b1: instr = st.text_input("Instruction", placeholder="e.g. Add keyword '4K'", label_visibility="collapsed")
+                with c_b2:
+                    run_bulk = st.button("🚀 Run", type="primary", width="stretch")
+                if run_bulk:
+                    st.session_state['bulk_local_pending'] = None
                     if not instr or not sel: st.warning("Incomplete.")
                     else:
-                        ak = st.session_state.get('active_api_key_for_correction') or st.session_state.get('active_global_api_key')
-                        mod = st.session_state.get('active_model_for_correction', 'gemini-1.5-flash')
-                        rules = {'title': st.session_state.get('active_title_rule',''), 'desc': st.session_state.get('active_desc_rule','')}
-                        if not ak: st.error("No API Key")
-                        else:
-                            prog = st.progress(0); txt = st.empty(); suc_cnt = 0
-                            for i, fname in enumerate(sel):
-                                r = row_map[fname]
-                                fp = os.path.join(r['output_path'], r['new_filename'])
-                                txt.caption(f"Processing: {fname}...")
-                                if os.path.exists(fp):
-                                    # [FIX] Add small delay for batch correction too
-                                    time.sleep(1.0) 
-                                    s, _, _ = regenerate_metadata_and_rename(fp, instr, ak, mod, rules)
-                                    if s: suc_cnt += 1
-                                prog.progress((i+1)/len(sel))
-                            txt.empty(); prog.empty()
-                            st.success(f"Done! {suc_cnt} updated."); time.sleep(1.5); st.rerun()
+                        spec = parse_instruction(instr, get_history_categories())
+                        # Instruksi mekanis -> usulkan edit lokal (tanpa decode gambar & API call), tunggu konfirmasi
+                        if spec: st.session_state['bulk_local_pending'] = {"instr": instr, "spec": spec}
+                        else: _run_bulk_ai(sel, instr)
+                pending = st.session_state.get('bulk_local_pending')
+                if pending and pending['instr'] == instr and sel:
+                    with st.container(border=True):
+                        st.info(f"Mechanical edit detected (0 API calls): **{describe_spec(pending['spec'])}**")
+                        c_p1, c_p2, c_p3 = st.columns(3)
+                        with c_p1: apply_local = st.button("✅ Apply locally", type="primary", width="stretch")
+                        with c_p2: send_ai = st.button("🤖 Send to AI instead", width="stretch")
+                        with c_p3:
+                            if st.button("Cancel", width="stretch"): st.session_state['bulk_local_pending'] = None; st.rerun()
+                    if apply_local:
+                        st.session_state['bulk_local_pending'] = None
+                        _run_bulk_local(sel, pending['spec'])
+                    elif send_ai:
+                        st.session_state['bulk_local_pending'] = None
+                        _run_bulk_ai(sel, instr)
+                _render_bulk_job()
+            with tab_local:
+                l1, l2 = st.columns(2)
+                with l1:
+                    add_kw = st.text_input("Add keywords", placeholder="4k, copy space")
+                    rep_old = st.text_input("Replace keyword", placeholder="old keyword")
+                    title_tpl = st.text_input("Title template", placeholder="{title} in 4K")
+                with l2:
+                    del_kw = st.text_input("Remove keywords", placeholder="no people")
+                    rep_new = st.text_input("Replace with", placeholder="new keyword")
+                    desc_tpl = st.text_input("Description template", placeholder="{description} Category: {category}.")
+                new_cat = st.selectbox("Category", ["(keep)"] + get_history_categories())
+                st.caption("Placeholders: {title} {description} {category} {filename} {keywords}")
+                if st.button("⚡ Apply Local Edit", type="primary", disabled=not sel):
+                    spec = {
+                        "add_keywords": [k for k in add_kw.split(",") if k.strip()],
+                        "remove_keywords": [k for k in del_kw.split(",") if k.strip()],
+                        "replace_keywords": {rep_old: rep_new} if rep_old.strip() and rep_new.strip() else {},
+                        "title_template": title_tpl.strip(),
+                        "desc_template": desc_tpl.strip(),
+                        "category": "" if new_cat == "(keep)" else new_cat,
+                    }
+                    if not any(spec.values()): st.warning("Nothing to change.")
+                    else: _run_bulk_local(sel, spec)
 
     st.markdown("---")
     if rows:
+        # Satu pass stat paralel (ter-cache, TTL) untuk semua kartu di halaman ini
+        stats = fs_cache.check_paths([os.path.join(r['output_path'], r['new_filename']) for r in rows])
+        for r in rows: st.session_state[f"sel_{r['id']}"] = r['id'] in st.session_state['bulk_selection']
         cols = st.columns(4)
         for i, row in enumerate(rows):
-            with cols[i%4]: render_minimal_card(row, i)
+            with cols[i%4]: render_minimal_card(row, i, stats[os.path.join(row['output_path'], row['new_filename'])])
         
         st.markdown("<br>", unsafe_allow_html=True)
         c_p1, c_p2, c_p3 = st.columns([1, 2, 1])
         with c_p1: 
-            if st.session_state['gallery_page'] > 1:
-                if st.button("⬅️ Previous", width="stretch"): st.session_state['gallery_page'] -= 1; st.rerun()
+            if page_no > 1:
+                if st.button("⬅️ Previous", width="stretch"): cursors.pop(); st.rerun()
         with c_p2: 
-            st.markdown(f"<div style='text-align:center; padding-top:5px;'>Page <b>{st.session_state['gallery_page']}</b> / <b>{total_pages}</b></div>", unsafe_allow_html=True)
+            st.markdown(f"<div style='text-align:center; padding-top:5px;'>Page <b>{page_no}</b> / <b>{total_pages}</b></div>", unsafe_allow_html=True)
         with c_p3:
-            if st.session_state['gallery_page'] < total_pages:
-                if st.button("Next ➡️", width="stretch"): st.session_state['gallery_page'] += 1; st.rerun()
+            if next_cursor is not None:
+                if st.button("Next ➡️", width="stretch"): cursors.append(next_cursor); st.rerun()
     else:
         with st.container(border=True):
             st.info("No files found.")
             if st.button("Process New Files", type="primary"): force_navigate(1)
 
+# --- COMPONENT: BACKGROUND JOB PANEL ---
+# Halaman hanya menampilkan counter agregat + ring buffer event (satu dataframe tervirtualisasi),
+# bukan satu elemen st.success per file; log lengkap ada di file log job.
+JOB_LEVEL_ICONS = {"success": "✅", "warning": "⚠️", "error": "❌", "info": "ℹ️"}
+
+def _fmt_duration(seconds):
+    if seconds is None: return "-"
+    m, s = divmod(int(seconds), 60)
+    h, m = divmod(m, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+
+def _render_job_status(job_id):
+    """Di-poll (fragment run_every) selama job aktif; hanya membaca snapshot job."""
+    job = get_job(job_id)
+    if job is None: return
+    snap = job.snapshot()
+    active = snap['status'] in JOB_ACTIVE
+
+    with st.container(border=True):
+        c_head, c_btn1, c_btn2 = st.columns([3, 1, 1])
+        with c_head: st.markdown(f"**🧵 Job `{snap['id']}`** · {snap['status'].upper()}")
+        with c_btn1:
+            if snap['status'] == "paused":
+                if st.button("▶️ Resume", key=f"job_resume_{job_id}", width="stretch"): resume_job(job_id); st.rerun(scope="fragment")
+            elif st.button("⏸️ Pause", key=f"job_pause_{job_id}", width="stretch", disabled=snap['status'] != "running"):
+                pause_job(job_id); st.rerun(scope="fragment")
+        with c_btn2:
+            if st.button("✖️ Cancel", key=f"job_cancel_{job_id}", width="stretch", disabled=not active or snap['status'] == "cancelling"):
+                cancel_job(job_id); st.rerun(scope="fragment")
+
+        st.progress(min(1.0, snap['done'] / snap['total']) if snap['total'] else 0.0)
+        m1, m2, m3, m4, m5, m6 = st.columns(6)
+        m1.metric("Processed", f"{snap['done']}/{snap['total']}")
+        m2.metric("OK", snap['ok']); m3.metric("Skipped", snap['skipped']); m4.metric("Failed", snap['failed'])
+        m5.metric("Throughput", f"{snap['rate'] * 60:.1f}/min")
+        m6.metric("ETA", _fmt_duration(snap['eta']) if active else "-")
+        events = job.recent_events()
+        if events:
+            st.dataframe(pd.DataFrame([(t, JOB_LEVEL_ICONS.get(lv, lv), msg) for t, lv, msg in reversed(events)], columns=["Time", "", "Event"]),
+                         hide_index=True, width="stretch", height=250)
+        st.caption(f"{len(events)} event terakhir · log lengkap: `{snap['log_path']}` · elapsed {_fmt_duration(snap['elapsed'])}")
+
+        if not active:
+            res = snap['result']
+            (st.success if snap['status'] == "done" else st.warning)(f"{snap['status'].capitalize()}! {snap['message']}")
+            if 'bytes_written' in res: st.caption(f"Total ditulis ke disk saat finalisasi: {res['bytes_written'] / 1_048_576:.1f} MB")
+            et_stats = res.get('exiftool')
+            if et_stats: st.caption(f"ExifTool pool: {et_stats['workers']} worker · {et_stats['files_per_sec']:.1f} file/s · {et_stats['mb_per_sec']:.1f} MB/s · {et_stats['files_failed']} gagal")
+            if res.get('trace_summary'):
+                with st.expander("🔬 Stage Timing"):
+                    st.dataframe(pd.DataFrame(res['trace_summary']), hide_index=True, width="stretch")
+                    st.caption(f"Chrome trace: `{res['trace']}`")
+
+    # Job baru selesai saat di-poll -> rerun penuh sekali supaya polling berhenti & tombol Start aktif lagi
+    if not active and st.session_state.get('job_polling') == job_id:
+        st.session_state['job_polling'] = None
+        st.rerun()
+
+def _resume_interrupted_job(row, settings):
+    """Job yang terputus (proses restart): jalankan lagi untuk file yang masih ada di folder input."""
+    params = json.loads(row['params'] or "{}")
+    files = [f for f in params.get('files', []) if os.path.exists(f)]
+    if not files: st.toast("Tidak ada file tersisa untuk job ini."); return
+    params['files'] = files
+    params['settings'] = {**params.get('settings', {}), "api_key": settings.get('api_key')}
+    st.session_state['active_job_id'] = start_job(row['kind'], run_metadata_batch, params, total=len(files)).id
+    mark_resumed(row)
+
+def render_job_panel(settings):
+    job_id = st.session_state.get('active_job_id')
+    if job_id and get_job(job_id):
+        active = get_job(job_id).status in JOB_ACTIVE
+        if active: st.session_state['job_polling'] = job_id
+        st.fragment(_render_job_status, run_every=JOB_POLL_INTERVAL if active else None)(job_id)
+
+    history = job_history(limit=10, kind="metadata_batch")
+    if not history: return
+    with st.expander("🗂️ Job History"):
+        st.dataframe(pd.DataFrame(history)[["id", "status", "done", "total", "ok", "skipped", "failed", "created_at", "updated_at"]], hide_index=True, width="stretch")
+        for row in history:
+            if row['status'] == "interrupted" and not active_jobs("metadata_batch"):
+                if st.button(f"🔁 Resume {row['id']} ({row['done']}/{row['total']})", key=f"job_rerun_{row['id']}", disabled=not settings.get('api_key')):
+                    _resume_interrupted_job(row, settings); st.rerun()
+
+        # [BARU] Report agency dibuat ulang dari DB (history.batch_id), tidak perlu file report lama
+        c_job, c_regen = st.columns([3, 1])
+        with c_job: regen_id = st.selectbox("Batch", [r['id'] for r in history], key="job_regen_id", label_visibility="collapsed")
+        with c_regen:
+            if st.button("📄 Regenerate Reports", width="stretch"):
+                row = next(r for r in history if r['id'] == regen_id)
+                out_dir = json.loads(row['params'] or "{}").get('out_dir') or DEFAULT_INTERNAL_OUTPUT
+                paths, n = regenerate_report(regen_id, os.path.join(out_dir, "_Reports"))
+                if n: st.success(f"{n:,} rows → {os.path.dirname(next(iter(paths.values())))}")
+                else: st.info("Batch ini tidak punya baris history.")
+
 # --- PAGE: METADATA AUTO ---
 def render_metadata_page(settings):
     st.title("📸 Metadata Automation")
@@ -263,6 +510,16 @@ def render_metadata_page(settings):
     OUT_DIR = st.session_state['selected_output_path'] or DEFAULT_INTERNAL_OUTPUT
     TEMP_DIR = st.session_state.get('temp_folder_path', BASE_WORK_DIR)
     
+    # [BARU] Import metadata yang sudah tertanam (file lama) ke history tanpa memanggil AI
+    with st.expander("📥 Import Existing Metadata"):
+        i1, i2, i3 = st.columns([4, 1, 1])
+        with i1: imp_dir = st.text_input("Folder", value=IN_DIR or "", key="import_folder")
+        with i2: imp_rec = st.checkbox("Subfolders", True, key="import_recursive")
+        with i3:
+            if st.button("Import", width="stretch", disabled=not (imp_dir and os.path.isdir(imp_dir)) or bool(active_jobs("metadata_import"))):
+                st.session_state['active_job_id'] = start_job("metadata_import", run_metadata_import, {"folder": imp_dir, "recursive": imp_rec}).id
+        st.caption(f"Hanya file dengan title, description dan minimal {IMPORT_MIN_KEYWORDS} keyword yang diimport (XMP/IPTC).")
+
     files = []
     if IN_DIR and os.path.exists(IN_DIR):
         for ext in ['*.jpg', '*.png', '*.mp4', '*.mov', '*.eps', '*.ai']:
@@ -291,78 +548,24 @@ def render_metadata_page(settings):
             st.caption("Default: Max")
 
         st.markdown("<br>", unsafe_allow_html=True)
-        if st.button(f"🚀 START BATCH ({limit} Files)", type="primary", width="stretch", disabled=not settings.get('api_key')):
-            
-            DONE_DIR = os.path.join(IN_DIR, "done"); os.makedirs(DONE_DIR, exist_ok=True)
-            SKIP_DIR = os.path.join(IN_DIR, "skipped"); os.makedirs(SKIP_DIR, exist_ok=True)
+        running = active_jobs("metadata_batch")
+        if st.button(f"🚀 START BATCH ({limit} Files)", type="primary", width="stretch", disabled=not settings.get('api_key') or bool(running)):
             save_settings("temp_folder", TEMP_DIR)
-
-            prompt = construct_prompt_template(st.session_state['active_title_rule'], st.session_state['active_desc_rule'])
-            opts = {"rename": settings['opt_rename'], "skip_existing": settings['opt_skip'], "blur_check": True}
-            
-            prog = st.progress(0); stat = st.empty(); logbox = st.container(border=True, height=250)
-            cnt_ok, cnt_skip, cnt_fail = 0, 0, 0
-            csv_data = []
-
-            def _process_item(fpath):
-                # [CRITICAL] RATE LIMIT DELAY
-                # Mencegah 429 Too Many Requests
-                if settings.get('request_delay', 0) > 0:
-                    time.sleep(settings['request_delay'])
-                    
-                return process_single_file(
-                    os.path.basename(fpath), settings['provider'], settings['model'], settings['api_key'], None,
-                    settings['retry_count'], opts, prompt, IN_DIR, custom_temp_dir=TEMP_DIR, blur_threshold=settings['blur_limit']
-                )
-
-            with ThreadPoolExecutor(max_workers=settings['num_workers']) as exe:
-                futures = {exe.submit(_process_item, fp): fp for fp in target_files[:limit]}
-                for i, fut in enumerate(as_completed(futures)):
-                    res = fut.result()
-                    prog.progress((i+1)/limit)
-                    
-                    with logbox:
-                        if res["status"] == "success":
-                            cnt_ok += 1
-                            ftype = res.get('file_type', 'Other')
-                            tdir = os.path.join(OUT_DIR, ftype, res['category']) if settings['opt_folder'] else os.path.join(OUT_DIR, ftype)
-                            os.makedirs(tdir, exist_ok=True)
-                            
-                            try:
-                                tmp_file = os.path.join(TEMP_DIR, res['new_name'])
-                                shutil.copy2(res['original_path'], tmp_file)
-                                flush_metadata_queue([{'SourceFile': tmp_file, **res['tags_data']}])
-                                
-                                final_path = os.path.join(tdir, res['new_name'])
-                                shutil.move(tmp_file, final_path)
-                                shutil.move(res['original_path'], os.path.join(DONE_DIR, res['file']))
-                                
-                                kw = res['tags_data'].get('XMP:Subject', [])
-                                create_xmp_sidecar(os.path.splitext(final_path)[0], res['meta_title'], res['meta_desc'], kw)
-                                
-                                st.success(f"✅ {res['new_name']}")
-                                add_history_entry(res['file'], res['new_name'], res['meta_title'], res['meta_desc'], res['meta_kw'], res['category'], tdir)
-                                csv_data.append(prepare_csv_rows(res)[0])
-                            except Exception as e: 
-                                st.error(f"IO Error: {e}"); cnt_fail += 1
-                        elif res["status"] == "skipped":
-                            cnt_skip += 1
-                            shutil.move(os.path.join(IN_DIR, res['file']), os.path.join(SKIP_DIR, res['file']))
-                            st.warning(f"Skipped: {res['file']}")
-                        else:
-                            cnt_fail += 1
-                            st.error(f"Failed: {res['file']} - {res['msg']}")
-            
-            if csv_data:
-                rep_dir = os.path.join(OUT_DIR, "_Reports"); os.makedirs(rep_dir, exist_ok=True)
-                pd.DataFrame(csv_data).to_csv(os.path.join(rep_dir, f"Batch_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"), index=False)
-                st.toast("Report Generated!")
-                
-            stat.success(f"Done! OK: {cnt_ok} | Skipped: {cnt_skip} | Failed: {cnt_fail}")
+            params = {
+                "files": target_files[:limit], "in_dir": IN_DIR, "out_dir": OUT_DIR, "temp_dir": TEMP_DIR,
+                "prompt": construct_prompt_template(st.session_state['active_title_rule'], st.session_state['active_desc_rule']),
+                "opts": {"rename": settings['opt_rename'], "skip_existing": settings['opt_skip'], "blur_check": True},
+                "settings": dict(settings),
+            }
+            # [BARU] Batch berjalan sebagai job latar belakang; halaman ini hanya mem-poll status
+            st.session_state['active_job_id'] = start_job("metadata_batch", run_metadata_batch, params, total=limit).id
+        if running: st.caption("⏳ Batch lain sedang berjalan; tunggu selesai atau batalkan dulu.")
 
     else: 
         st.info("⚠️ Select Source Folder.")
 
+    render_job_panel(settings)
+
 # --- PAGE: PROMPT ARCHITECT ---
 def render_prompt_page(settings):
     st.title("🎨 Prompt Architect")
@@ -397,11 +600,60 @@ def render_history_page():
     st.title("📜 History")
     t1, t2 = st.tabs(["Metadata", "Prompts"])
     with t1:
-        if st.button("Clear Meta"): clear_history(); st.rerun()
-        try:
-            st.dataframe(get_history_df(), width="stretch")
-        except:
-            st.dataframe(get_history_df())
+        # Filter, sort, kolom & paging dijalankan di SQL; hanya satu halaman yang dimuat ke pandas
+        f1, f2, f3, f4 = st.columns([3, 2, 2, 2])
+        with f1: h_search = st.text_input("Search", key="hist_search", placeholder="Search title, keywords, filename...")
+        with f2: h_cat = st.selectbox("Category", ["All"] + get_history_categories(), key="hist_category")
+        with f3: h_from = st.date_input("From", value=None, key="hist_from")
+        with f4: h_to = st.date_input("To", value=None, key="hist_to")
+        filters = {"search": h_search, "category": "" if h_cat == "All" else h_cat, "date_from": h_from, "date_to": h_to}
+
+        o1, o2, o3, o4 = st.columns([4, 2, 1, 1])
+        default_cols = ["timestamp", "new_filename", "title", "keywords", "category"]
+        with o1: h_cols = st.multiselect("Columns", HISTORY_COLUMNS, default=default_cols, key="hist_cols")
+        with o2: h_sort = st.selectbox("Sort by", HISTORY_COLUMNS, index=0, key="hist_sort")
+        with o3: h_desc = st.toggle("Desc", value=True, key="hist_desc")
+        with o4: h_size = st.selectbox("Rows", [25, 50, 100, 250], index=1, key="hist_page_size")
+
+        total = count_history_filtered(filters)
+        pages = max(1, math.ceil(total / h_size))
+        if st.session_state.get('hist_page', 1) > pages: st.session_state['hist_page'] = pages  # filter berubah
+        p1, p2, p3 = st.columns([2, 4, 2])
+        with p1: h_page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1, key="hist_page")
+        with p2: st.caption(f"{total:,} rows · page {h_page} / {pages}")
+        df = query_history(h_cols, filters, h_sort, h_desc, limit=h_size, offset=(h_page - 1) * h_size)
+        st.dataframe(df, width="stretch", hide_index=True)
+
+        e1, e2 = st.columns([1, 1])
+        with e1:
+            if st.button("📤 Export CSV (filtered)"):
+                out_dir = os.path.join(st.session_state.get('selected_output_path') or DEFAULT_INTERNAL_OUTPUT, "_Reports")
+                os.makedirs(out_dir, exist_ok=True)
+                out_path = os.path.join(out_dir, f"History_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+                t0 = time.time()
+                n = export_history_csv(out_path, h_cols, filters, h_sort, h_desc)
+                st.success(f"{n:,} rows → {out_path} ({time.time() - t0:.1f}s)")
+        with e2:
+            if st.button("Clear Meta"): clear_history(); st.rerun()
+
+        # [BARU] Export katalog ke layout agency / Parquet: streaming per chunk, memori konstan
+        with st.expander("📦 Catalog Export (Agency CSV / Parquet)"):
+            x1, x2 = st.columns([2, 3])
+            fmt_options = [f for f in EXPORT_FORMATS if f != PARQUET or HAS_PARQUET]
+            with x1: x_formats = st.multiselect("Formats", fmt_options, default=list(AGENCIES), key="cat_export_formats")
+            with x2: x_out = st.text_input("Output path filter", key="cat_export_outpath", placeholder="Semua folder output")
+            if not HAS_PARQUET: st.caption("Parquet tidak tersedia (pip install pyarrow).")
+            st.caption("Filter search / category / tanggal di atas ikut dipakai.")
+            if st.button("📦 Export Catalog", disabled=not x_formats):
+                out_dir = os.path.join(st.session_state.get('selected_output_path') or DEFAULT_INTERNAL_OUTPUT, "_Reports")
+                status = st.empty()
+                try:
+                    rep = export_catalog(out_dir, x_formats, {**filters, "output_path": x_out.strip()},
+                                         progress=lambda n: status.caption(f"{n:,} rows..."))
+                    status.success(f"{rep['rows']:,} rows · {rep['seconds']:.1f}s · {rep['rows_per_sec']:,.0f} rows/s")
+                    for fmt, path in rep['paths'].items(): st.caption(f"{fmt}: `{path}`")
+                except Exception as e:
+                    status.error(f"Export gagal: {e}")
     with t2:
         if st.button("Clear Prompts"): clear_prompt_history(); st.rerun()
         try: